@@ -1,90 +1,510 @@
 # src/ai_agent.py
 
+import asyncio
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
 import pandas as pd
-import requests
 from datetime import timedelta
-from dotenv import load_dotenv
+from src.ets import SEASON_LENGTHS, holt_winters_forecast
+from src.instrument import instrumented, span
+from src.llm_cache import ResponseCache, get_response_cache, replay_only
+from src.prompt_budget import estimate_tokens, format_history_lines, fit_recent_lines, summarize_history
+from src.anomalies import format_anomalies
+from src.streaming import ForecastLineParser, parse_forecast_line
 
-# Load .env variables
-load_dotenv()
+# Background threads for LLM requests raced against a deadline
+_race_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="gemini-race")
+_dotenv_loaded = False
 
-API_KEY = os.getenv("GEMINI_API_KEY")
-GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
-API_URL = f"https://api.gemini.ai/v1/flash/{GEMINI_MODEL}"
+def _load_settings(dotenv: bool = True) -> None:
+    """
+    Read Gemini and fallback settings from the environment. The .env file
+    is loaded by the first call that needs the settings, not at import
+    time, so importing the forecasting core stays cheap.
+    """
+    global _dotenv_loaded, API_KEY, GEMINI_MODEL, API_URL, OFFLINE_ENGINE, PROMPT_TOKEN_BUDGET, HEADERS
+    if dotenv:
+        if _dotenv_loaded:
+            return
+        from dotenv import load_dotenv
+        load_dotenv()
+        _dotenv_loaded = True
 
-HEADERS = {
-    "Authorization": f"Bearer {API_KEY}" if API_KEY else "",
-    "Content-Type": "application/json",
-}
+    API_KEY = os.getenv("GEMINI_API_KEY")
+    GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+    # GEMINI_API_URL points the agent at another endpoint, e.g. a local stub
+    API_URL = os.getenv("GEMINI_API_URL", f"https://api.gemini.ai/v1/flash/{GEMINI_MODEL}")
+    # Offline engine used when Gemini is unavailable: 'mean' or 'ets'
+    OFFLINE_ENGINE = os.getenv("OFFLINE_FORECAST_ENGINE", "mean")
+    PROMPT_TOKEN_BUDGET = int(os.getenv("GEMINI_PROMPT_TOKEN_BUDGET", "1500"))
+    HEADERS = {
+        "Authorization": f"Bearer {API_KEY}" if API_KEY else "",
+        "Content-Type": "application/json",
+    }
 
-def format_prompt(df: pd.DataFrame, periods: int, freq: str) -> str:
-    """Format historical expense data into a prompt for Gemini."""
-    data_str = "\n".join([f"{row['date'].strftime('%Y-%m-%d')}: {row['expense']}" for _, row in df.iterrows()])
-    prompt = (
+_load_settings(dotenv=False)
+
+def _history_text(df: pd.DataFrame, freq: str, token_budget: int = None, instructions: str = "") -> str:
+    """
+    History lines for a prompt, followed by the periods flagged by
+    screen_anomalies (the frame's 'anomalies' attr), if any.
+    """
+    anomalies = format_anomalies(df.attrs.get('anomalies'))
+    history = _fit_history(df, freq, token_budget, instructions + anomalies)
+    return f"{history}\n\n{anomalies}" if anomalies else history
+
+def _fit_history(df: pd.DataFrame, freq: str, token_budget: int = None, instructions: str = "") -> str:
+    """
+    Rows are sent verbatim while they fit in token_budget (counting the
+    instructions); past it, the most recent periods stay verbatim and older
+    ones are replaced by yearly aggregates, the seasonal profile and the
+    trend slope.
+    """
+    lines = format_history_lines(df)
+    data_str = "\n".join(lines)
+    if token_budget is None or estimate_tokens(instructions + data_str) <= token_budget:
+        return data_str
+
+    # Reserve about a quarter of the budget for the summary of older periods,
+    # then give the recent periods whatever the summary actually left
+    overhead = estimate_tokens(instructions) + 20
+    keep = max(fit_recent_lines(lines, token_budget * 3 // 4 - overhead), 1)
+    summary = summarize_history(df.iloc[:-keep], df, freq)
+    refit = max(fit_recent_lines(lines, token_budget - overhead - estimate_tokens(summary)), 1)
+    if refit != keep:
+        keep = refit
+        summary = summarize_history(df.iloc[:-keep], df, freq)
+    return (
+        f"Summary of earlier periods:\n{summary}\n\n"
+        f"Most recent periods:\n" + "\n".join(lines.iloc[-keep:])
+    )
+
+def build_prompt(df: pd.DataFrame, periods: int, freq: str, token_budget: int = None) -> tuple:
+    """
+    Format historical expense data into a prompt for Gemini within a token budget.
+
+    Rows are sent verbatim while they fit. Past the budget, the most recent
+    periods stay verbatim and older ones are replaced by yearly aggregates,
+    the seasonal profile and the trend slope.
+
+    Returns:
+        (prompt, estimated token count)
+    """
+    instructions = (
         f"Given the historical expense data below aggregated {freq}ly, "
         f"predict the expense values for the next {periods} {freq} periods. "
         f"Output only the dates and predicted expenses in the format YYYY-MM-DD: amount.\n\n"
+    )
+    data_str = _history_text(df, freq, token_budget, instructions)
+
+    prompt = (
+        f"{instructions}"
         f"Historical data:\n{data_str}\n\n"
         f"Predictions:"
     )
+    return prompt, estimate_tokens(prompt)
+
+def build_batch_prompt(frames: list, periods: int, freq: str, token_budget: int = None) -> tuple:
+    """
+    One prompt covering several independent histories, labeled S1..Sn.
+    Each history gets an equal share of token_budget.
+
+    Returns:
+        (prompt, estimated token count)
+    """
+    instructions = (
+        f"Below are {len(frames)} independent expense histories aggregated {freq}ly, labeled S1 to S{len(frames)}. "
+        f"For each one, predict the expense values for the next {periods} {freq} periods. "
+        f"Output only lines in the format LABEL | YYYY-MM-DD: amount.\n\n"
+    )
+    share = None if token_budget is None else max((token_budget - estimate_tokens(instructions)) // len(frames), 1)
+    sections = [f"S{i}:\n{_history_text(df, freq, share)}" for i, df in enumerate(frames, 1)]
+    prompt = (
+        f"{instructions}"
+        f"Historical data:\n" + "\n\n".join(sections) + "\n\n"
+        f"Predictions:"
+    )
+    return prompt, estimate_tokens(prompt)
+
+def format_prompt(df: pd.DataFrame, periods: int, freq: str, token_budget: int = None) -> str:
+    """Format historical expense data into a prompt for Gemini."""
+    prompt, _ = build_prompt(df, periods, freq, token_budget)
     return prompt
 
+@instrumented()
 def parse_response(text: str) -> pd.DataFrame:
     """Parse the Gemini API response text into a DataFrame."""
-    rows = []
+    rows = [parse_forecast_line(line) for line in text.strip().split("\n")]
+    return pd.DataFrame([row for row in rows if row is not None])
+
+def parse_batch_response(text: str) -> dict:
+    """
+    Parse a response to build_batch_prompt into {label: forecast DataFrame}.
+    """
+    by_label = {}
     for line in text.strip().split("\n"):
-        if ':' in line:
-            date_str, value_str = line.split(":", 1)
-            try:
-                date = pd.to_datetime(date_str.strip())
-                expense = float(value_str.strip())
-                rows.append({"date": date, "predicted_expense": expense})
-            except Exception:
-                continue
-    return pd.DataFrame(rows)
-
-def get_ai_forecast(df: pd.DataFrame, periods: int, freq: str) -> pd.DataFrame:
-    """Get forecast predictions from Gemini, with offline fallback."""
-    if API_KEY is None:
-        print("GEMINI_API_KEY not found. Using offline fallback.")
-        return offline_forecast(df, periods, freq)
+        if '|' in line:
+            label, rest = line.split("|", 1)
+            by_label.setdefault(label.strip(), []).append(rest)
+    return {label: parse_response("\n".join(rows)) for label, rows in by_label.items()}
+
+def _forecast_to_records(forecast_df: pd.DataFrame) -> list:
+    """JSON-serializable form of a parsed forecast for the response cache."""
+    return [
+        {"date": date.strftime('%Y-%m-%d'), "predicted_expense": float(expense)}
+        for date, expense in zip(forecast_df['date'], forecast_df['predicted_expense'])
+    ]
 
-    prompt = format_prompt(df, periods, freq)
+def _forecast_from_records(records: list) -> pd.DataFrame:
+    forecast_df = pd.DataFrame(records, columns=["date", "predicted_expense"])
+    forecast_df['date'] = pd.to_datetime(forecast_df['date'])
+    return forecast_df
 
+def _build_request(df: pd.DataFrame, periods: int, freq: str) -> tuple:
+    """Gemini payload for a history, and its response-cache key."""
+    prompt, tokens = build_prompt(df, periods, freq, token_budget=PROMPT_TOKEN_BUDGET)
+    print(f"Gemini prompt: ~{tokens} tokens for {len(df)} periods.")
+    return _payload(prompt)
+
+def _payload(prompt: str, max_tokens: int = 150, stop: list = None) -> tuple:
+    """Gemini completion payload for a prompt, and its response-cache key."""
     payload = {
         "model": GEMINI_MODEL,
         "prompt": prompt,
         "temperature": 0.3,
-        "max_tokens": 150,
+        "max_tokens": max_tokens,
         "top_p": 1,
         "n": 1,
-        "stop": ["\n\n"],
+        "stop": ["\n\n"] if stop is None else stop,
     }
+    cache_key = ResponseCache.make_key(GEMINI_MODEL, prompt, {k: v for k, v in payload.items() if k != "prompt"})
+    return payload, cache_key
+
+def _parse_result(result: dict, cache, cache_key: str) -> pd.DataFrame:
+    """Parse a Gemini response, storing non-empty forecasts in the cache."""
+    generated_text = result.get("choices", [{}])[0].get("text", "").strip()
+    forecast_df = parse_response(generated_text)
+    if cache is not None and not forecast_df.empty:
+        cache.put(cache_key, _forecast_to_records(forecast_df))
+    return forecast_df
+
+def _forecast_from_result(result: dict, df: pd.DataFrame, periods: int, freq: str, cache, cache_key: str) -> pd.DataFrame:
+    """Parse a Gemini response, caching it, or fall back when it is empty."""
+    forecast_df = _parse_result(result, cache, cache_key)
+
+    if forecast_df.empty:
+        print("Gemini returned empty response. Using incremental fallback.")
+        return offline_forecast(df, periods, freq)
+    return forecast_df
+
+@instrumented()
+def get_ai_forecast(df: pd.DataFrame, periods: int, freq: str, use_cache: bool = True) -> pd.DataFrame:
+    """
+    Get forecast predictions from Gemini, with offline fallback.
+    Parsed responses are kept in the shared response cache; pass
+    use_cache=False to bypass it. In replay mode (see
+    llm_cache.use_replay_store) only recorded responses are used.
+    """
+    _load_settings()
+    if API_KEY is None and not replay_only():
+        print("GEMINI_API_KEY not found. Using offline fallback.")
+        return offline_forecast(df, periods, freq)
+
+    payload, cache_key = _build_request(df, periods, freq)
+    cache = get_response_cache() if use_cache else None
+    if cache is not None:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return _forecast_from_records(cached)
+
+    if replay_only():
+        print("No recorded Gemini response for this prompt. Using offline fallback.")
+        return offline_forecast(df, periods, freq)
 
     try:
-        response = requests.post(API_URL, headers=HEADERS, json=payload, timeout=10)
-        response.raise_for_status()
-        result = response.json()
-        generated_text = result.get("choices", [{}])[0].get("text", "").strip()
-        forecast_df = parse_response(generated_text)
+        from src.gemini_client import get_client
+        # Single attempt: on failure the offline forecast is returned right away
+        with span('gemini_request'):
+            result = get_client().post_json(API_URL, payload, headers=HEADERS, timeout=10, retries=0)
+        return _forecast_from_result(result, df, periods, freq, cache, cache_key)
 
-        if forecast_df.empty:
-            print("Gemini returned empty response. Using incremental fallback.")
-            return offline_forecast(df, periods, freq)
+    except Exception as e:
+        print(f"Gemini API unreachable or failed: {e}")
+        return offline_forecast(df, periods, freq)
 
+@instrumented()
+def stream_ai_forecast(df: pd.DataFrame, periods: int, freq: str, on_update=None, use_cache: bool = True) -> pd.DataFrame:
+    """
+    get_ai_forecast over a streamed response: forecast lines are parsed as
+    their chunks arrive instead of after the whole generation.
+
+    Args:
+        df: Historical expenses dataframe with 'date' and 'expense' columns.
+        periods: Number of future periods to predict.
+        freq: Frequency ('M' monthly, 'Q' quarterly).
+        on_update: Optional callback(forecast DataFrame so far), called
+            whenever new rows are parsed; cached and fallback forecasts
+            arrive in a single call.
+        use_cache: Whether to read and fill the response cache.
+
+    Returns:
+        pd.DataFrame with 'date' and 'predicted_expense'; attrs
+        ['time_to_first_value'] holds the seconds until the first streamed
+        row (None when nothing was streamed).
+    """
+    _load_settings()
+    start = time.perf_counter()
+
+    def finish(forecast_df, first_value=None):
+        if on_update is not None and first_value is None:
+            on_update(forecast_df)
+        forecast_df.attrs['time_to_first_value'] = first_value
         return forecast_df
 
+    if API_KEY is None and not replay_only():
+        print("GEMINI_API_KEY not found. Using offline fallback.")
+        return finish(offline_forecast(df, periods, freq))
+
+    payload, cache_key = _build_request(df, periods, freq)
+    cache = get_response_cache() if use_cache else None
+    if cache is not None:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return finish(_forecast_from_records(cached))
+
+    if replay_only():
+        print("No recorded Gemini response for this prompt. Using offline fallback.")
+        return finish(offline_forecast(df, periods, freq))
+
+    parser = ForecastLineParser()
+    first_value = None
+    try:
+        from src.gemini_client import get_client
+        with span('gemini_stream') as record:
+            # 'stream' is left out of the cache key: both modes share answers
+            texts = get_client().post_stream(API_URL, dict(payload, stream=True), headers=HEADERS, timeout=10, retries=0)
+            for _ in _new_rows(parser, texts):
+                if first_value is None:
+                    first_value = time.perf_counter() - start
+                if on_update is not None:
+                    on_update(parser.frame())
+            if record is not None:
+                record['first_value_s'] = first_value
+    except Exception as e:
+        print(f"Gemini API unreachable or failed: {e}")
+        return finish(offline_forecast(df, periods, freq))
+
+    forecast_df = parser.frame()
+    if forecast_df.empty:
+        print("Gemini returned empty response. Using incremental fallback.")
+        return finish(offline_forecast(df, periods, freq))
+    if cache is not None:
+        cache.put(cache_key, _forecast_to_records(forecast_df))
+    return finish(forecast_df, first_value)
+
+def _new_rows(parser: ForecastLineParser, texts):
+    """Feed streamed text to parser, yielding each non-empty batch of new rows."""
+    for text in texts:
+        rows = parser.feed(text)
+        if rows:
+            yield rows
+    rows = parser.close()
+    if rows:
+        yield rows
+
+def _request_llm(payload: dict, cache_key: str, cache, timeout: float):
+    """One Gemini round trip; returns the parsed forecast, or None if unusable."""
+    from src.gemini_client import get_client
+    result = get_client().post_json(API_URL, payload, headers=HEADERS, timeout=timeout, retries=0)
+    forecast_df = _parse_result(result, cache, cache_key)
+    return None if forecast_df.empty else forecast_df
+
+def get_ai_forecast_within(
+    df: pd.DataFrame,
+    periods: int,
+    freq: str,
+    deadline: float,
+    use_cache: bool = True
+) -> tuple:
+    """
+    Forecast within a latency budget by racing Gemini against the offline model.
+
+    The LLM request starts in the background while the offline forecast is
+    computed; whichever valid result exists when the deadline hits is
+    returned. A late LLM response still lands in the response cache. In
+    replay mode only recorded responses are used, as in get_ai_forecast.
+
+    Args:
+        df: Historical expenses dataframe with 'date' and 'expense' columns.
+        periods: Number of future periods to predict.
+        freq: Frequency ('M' monthly, 'Q' quarterly).
+        deadline: Latency budget in seconds.
+        use_cache: Whether to read and fill the response cache.
+
+    Returns:
+        (forecast DataFrame, provenance dict with 'source' of 'llm',
+        'offline' or 'cached' and 'elapsed' seconds)
+    """
+    _load_settings()
+    start = time.perf_counter()
+
+    def provenance(source):
+        return {"source": source, "elapsed": time.perf_counter() - start}
+
+    if API_KEY is None and not replay_only():
+        return offline_forecast(df, periods, freq), provenance("offline")
+
+    payload, cache_key = _build_request(df, periods, freq)
+    cache = get_response_cache() if use_cache else None
+    if cache is not None:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return _forecast_from_records(cached), provenance("cached")
+
+    if replay_only():
+        print("No recorded Gemini response for this prompt. Using offline fallback.")
+        return offline_forecast(df, periods, freq), provenance("offline")
+
+    # The request keeps the usual timeout so a late answer can still fill the cache
+    future = _race_executor.submit(_request_llm, payload, cache_key, cache, max(deadline, 10))
+    fallback = offline_forecast(df, periods, freq)
+    try:
+        forecast_df = future.result(timeout=max(deadline - (time.perf_counter() - start), 0))
+    except FuturesTimeoutError:
+        print(f"Gemini missed the {deadline:.1f}s deadline. Using offline forecast.")
+        forecast_df = None
     except Exception as e:
         print(f"Gemini API unreachable or failed: {e}")
+        forecast_df = None
+
+    if forecast_df is None:
+        return fallback, provenance("offline")
+    return forecast_df, provenance("llm")
+
+async def aget_ai_forecast(df: pd.DataFrame, periods: int, freq: str, use_cache: bool = True) -> pd.DataFrame:
+    """
+    Async version of get_ai_forecast on the shared, rate-limited client.
+    Failed requests are retried with non-blocking backoff before falling back.
+    In replay mode only recorded responses are used.
+    """
+    _load_settings()
+    if API_KEY is None and not replay_only():
         return offline_forecast(df, periods, freq)
 
-def offline_forecast(df: pd.DataFrame, periods: int, freq: str) -> pd.DataFrame:
-    """Fallback forecast using historical mean and incremental dates."""
-    last_date = df['date'].max()
+    payload, cache_key = _build_request(df, periods, freq)
+    cache = get_response_cache() if use_cache else None
+    if cache is not None:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return _forecast_from_records(cached)
+
+    if replay_only():
+        print("No recorded Gemini response for this prompt. Using offline fallback.")
+        return offline_forecast(df, periods, freq)
+
+    try:
+        from src.gemini_client import get_client
+        result = await get_client().apost_json(API_URL, payload, headers=HEADERS, timeout=10)
+        return _forecast_from_result(result, df, periods, freq, cache, cache_key)
+
+    except Exception as e:
+        print(f"Gemini API unreachable or failed: {e}")
+        return offline_forecast(df, periods, freq)
+
+def get_ai_forecasts(frames: list, periods: int, freq: str, use_cache: bool = True) -> list:
+    """
+    Forecast many histories with concurrent Gemini requests.
+    Returns one forecast DataFrame per input frame, in order.
+    """
+    async def run():
+        return await asyncio.gather(*(aget_ai_forecast(df, periods, freq, use_cache) for df in frames))
+    return asyncio.run(run())
+
+async def aget_ai_forecast_batch(frames: list, periods: int, freq: str, use_cache: bool = True) -> list:
+    """
+    Forecast several histories with a single batched Gemini request.
+
+    Histories whose own prompt is already in the response cache are served
+    from it; the rest share one build_batch_prompt request, and their
+    answers are cached under their single-history keys. Histories the
+    response misses fall back to the offline forecast, as do all uncached
+    histories in replay mode.
+
+    Returns:
+        One (forecast DataFrame, source) pair per frame, in order, with
+        source 'cached', 'llm' or 'offline'.
+    """
+    _load_settings()
+    if API_KEY is None and not replay_only():
+        return [(offline_forecast(df, periods, freq), "offline") for df in frames]
+
+    cache = get_response_cache() if use_cache else None
+    results = [None] * len(frames)
+    keys = []
+    for i, df in enumerate(frames):
+        prompt, _ = build_prompt(df, periods, freq, token_budget=PROMPT_TOKEN_BUDGET)
+        keys.append(_payload(prompt)[1])
+        cached = cache.get(keys[i]) if cache is not None else None
+        if cached is not None:
+            results[i] = (_forecast_from_records(cached), "cached")
+
+    pending = [i for i, result in enumerate(results) if result is None]
+    if not pending:
+        return results
+    if replay_only():
+        print(f"No recorded Gemini response for {len(pending)} histories. Using offline fallback.")
+        for i in pending:
+            results[i] = (offline_forecast(frames[i], periods, freq), "offline")
+        return results
+
+    prompt, tokens = build_batch_prompt([frames[i] for i in pending], periods, freq, token_budget=PROMPT_TOKEN_BUDGET * len(pending))
+    print(f"Gemini batch prompt: ~{tokens} tokens for {len(pending)} histories.")
+    payload, _ = _payload(prompt, max_tokens=150 * len(pending), stop=[])
+    try:
+        from src.gemini_client import get_client
+        result = await get_client().apost_json(API_URL, payload, headers=HEADERS, timeout=10)
+        parsed = parse_batch_response(result.get("choices", [{}])[0].get("text", ""))
+    except Exception as e:
+        print(f"Gemini API unreachable or failed: {e}")
+        parsed = {}
+
+    for label, i in enumerate(pending, 1):
+        forecast_df = parsed.get(f"S{label}")
+        if forecast_df is None or forecast_df.empty:
+            results[i] = (offline_forecast(frames[i], periods, freq), "offline")
+            continue
+        if cache is not None:
+            cache.put(keys[i], _forecast_to_records(forecast_df))
+        results[i] = (forecast_df, "llm")
+    return results
+
+def forecast_dates(last_date: pd.Timestamp, periods: int, freq: str) -> list:
+    """Future period dates following last_date for the given frequency."""
     freq_map = {'M': pd.DateOffset(months=1), 'Q': pd.DateOffset(months=3)}
     date_offset = freq_map.get(freq, pd.DateOffset(months=1))
-    return pd.DataFrame({
-        "date": [last_date + date_offset * (i + 1) for i in range(periods)],
-        "predicted_expense": [df['expense'].mean()] * periods
+    return [last_date + date_offset * (i + 1) for i in range(periods)]
+
+def offline_forecast(df: pd.DataFrame, periods: int, freq: str, engine: str = None) -> pd.DataFrame:
+    """
+    Fallback forecast with incremental dates.
+    engine: 'mean' repeats the historical mean, 'ets' fits Holt-Winters
+    exponential smoothing; defaults to OFFLINE_ENGINE. The engine actually
+    used is recorded in the result's attrs['engine'].
+    """
+    if not engine:
+        _load_settings()
+        engine = OFFLINE_ENGINE
+    last_date = df['date'].max()
+    if engine == 'ets' and len(df) >= 2:
+        values = df['expense'].to_numpy(dtype=float)[None, :]
+        predicted = holt_winters_forecast(values, periods, season_length=SEASON_LENGTHS.get(freq, 12))[0]
+    else:
+        engine = 'mean'
+        predicted = [df['expense'].mean()] * periods
+    forecast_df = pd.DataFrame({
+        "date": forecast_dates(last_date, periods, freq),
+        "predicted_expense": predicted
     })
+    forecast_df.attrs['engine'] = engine
+    return forecast_df
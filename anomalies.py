@@ -0,0 +1,237 @@
+# src/anomalies.py
+
+import numpy as np
+import pandas as pd
+
+# Turns a MAD into the standard deviation of normally distributed data
+MAD_SCALE = 1.4826
+# Robust z-score past which a period is flagged
+THRESHOLD = 3.5
+# Periods per series whose median and MAD are computed exactly
+WARMUP = 6
+# Periods seen before a series can flag anything
+MIN_PERIODS = 2
+# Step of the streaming median/MAD updates, as a share of the current scale
+RATE = 0.1
+# Smallest scale, as a share of the series level, so flat series still flag
+# spikes; it is widened while a series is warming up and its MAD is unreliable
+RELATIVE_FLOOR = 0.05
+# Share of the series level a value of a season not seen before may exceed
+# its reference by before it is capped, as it may be a recurring peak
+UNSEEN_SEASON_ALLOWANCE = 1.0
+# Periods per seasonal cycle by frequency
+SEASON_LENGTHS = {'M': 12, 'Q': 4, 'W': 52, 'D': 7}
+# Past cycles whose deviation from the level each season remembers
+SEASON_HISTORY = 3
+
+class AnomalyDetector:
+    """
+    Streaming robust anomaly detector for many aligned series.
+
+    Every series keeps a running median and MAD. The first WARMUP values
+    are kept and summarized exactly; after that both statistics follow the
+    data by fixed-size sign steps (a stochastic approximation of the
+    median), so each new period costs O(1) per series and appended data
+    never needs another pass over the history. A period is flagged when its
+    distance from the median, in robust standard deviations, exceeds the
+    threshold; it is scored before it updates the statistics. The scale
+    never drops below a share of the series level (the larger of the
+    median and the mean absolute value, as mostly-zero series have a zero
+    median and MAD), and a series that has only been zero flags any
+    nonzero value. side limits flags to spikes ('upper') or dips ('lower')
+    instead of 'both'.
+
+    With season_length > 1, every season (e.g. month of year) also keeps
+    its deviation from the median over the last SEASON_HISTORY cycles, and
+    a period is only flagged when it is far from both the median and the
+    median plus its season's typical deviation, so a recurring December
+    peak is not an anomaly. Until a season has been seen once, its periods
+    are scored against the median alone and, as a recurring peak cannot be
+    told from a one-off yet, only capped once they exceed it by more than
+    UNSEEN_SEASON_ALLOWANCE times the level.
+    """
+
+    def __init__(
+        self,
+        n_series: int = 1,
+        threshold: float = THRESHOLD,
+        warmup: int = WARMUP,
+        rate: float = RATE,
+        side: str = 'both',
+        season_length: int = 1
+    ):
+        if side not in ('both', 'upper', 'lower'):
+            raise ValueError(f"Unknown anomaly side: {side}")
+        self.side = side
+        self.threshold = threshold
+        self.warmup = warmup
+        self.rate = rate
+        self.season_length = season_length
+        self.position = 0
+        self.count = np.zeros(n_series, dtype=np.int64)
+        self.median = np.zeros(n_series)
+        self.mad = np.zeros(n_series)
+        self.total_abs = np.zeros(n_series)
+        self._buffer = np.full((n_series, warmup), np.nan)
+        self._season_count = np.zeros((n_series, season_length), dtype=np.int64)
+        self._season_deviation = np.full((n_series, season_length, SEASON_HISTORY), np.nan)
+
+    def level(self) -> np.ndarray:
+        """Typical magnitude of every series: the larger of |median| and the mean absolute value."""
+        return np.maximum(np.abs(self.median), self.total_abs / np.maximum(self.count, 1))
+
+    def scale(self) -> np.ndarray:
+        """Current robust standard deviation of every series."""
+        widen = self.warmup / np.clip(self.count, 1, self.warmup)
+        return np.maximum(MAD_SCALE * self.mad, RELATIVE_FLOOR * widen * self.level())
+
+    def update(self, values: np.ndarray) -> dict:
+        """
+        Score and absorb the next periods of every series.
+
+        Args:
+            values: Array of shape (n_series, n_periods); NaNs are skipped.
+
+        Returns:
+            Dict of arrays shaped like values: 'flags' (anomalous periods),
+            'expected' (the reference each period was scored against: the
+            running median, or the median plus the season's deviation) and
+            'capped' (values with anomalies clipped to that reference plus
+            or minus threshold robust standard deviations, or the wider
+            allowance of a season not seen before).
+        """
+        values = np.asarray(values, dtype=float).reshape(len(self.count), -1)
+        flags = np.zeros(values.shape, dtype=bool)
+        expected = np.empty_like(values)
+        capped = values.copy()
+        rows = np.arange(len(self.count))
+        for t in range(values.shape[1]):
+            x = values[:, t]
+            valid = ~np.isnan(x)
+            scale = self.scale()
+            bound = self.threshold * scale
+            season = self.position % self.season_length
+            reference, seen = self._reference(x, season)
+            deviation = {'both': np.abs(x - reference), 'upper': x - reference, 'lower': reference - x}[self.side]
+            # A zero scale (a series that has only been zero) flags any change
+            flagged = valid & (self.count >= MIN_PERIODS) & (deviation > bound)
+            flags[:, t] = flagged
+            expected[:, t] = reference
+            width = np.where(seen, bound, np.maximum(bound, UNSEEN_SEASON_ALLOWANCE * self.level()))
+            cap = flagged & (deviation > width)
+            capped[cap, t] = np.clip(x[cap], (reference - width)[cap], (reference + width)[cap])
+
+            # Every season remembers its latest deviations from the median
+            if self.season_length > 1 and valid.any():
+                slot = self._season_count[rows[valid], season] % SEASON_HISTORY
+                self._season_deviation[rows[valid], season, slot] = x[valid] - self.median[valid]
+                self._season_count[valid, season] += 1
+
+            # Warm-up series: exact statistics over the values seen so far
+            warm = valid & (self.count < self.warmup)
+            if warm.any():
+                self._buffer[rows[warm], self.count[warm]] = x[warm]
+                buffer = self._buffer[warm]
+                median = np.nanmedian(buffer, axis=1)
+                self.median[warm] = median
+                self.mad[warm] = np.nanmedian(np.abs(buffer - median[:, None]), axis=1)
+
+            # Warmed-up series: one sign step towards the new value
+            steady = valid & ~warm
+            if steady.any():
+                step = self.rate * scale[steady]
+                self.median[steady] += step * np.sign(x[steady] - self.median[steady])
+                deviation = np.abs(x[steady] - self.median[steady])
+                self.mad[steady] = np.maximum(self.mad[steady] + step / MAD_SCALE * np.sign(deviation - self.mad[steady]), 0.0)
+            self.total_abs[valid] += np.abs(x[valid])
+            self.count += valid
+            self.position += 1
+        return {"flags": flags, "expected": expected, "capped": capped}
+
+    def _reference(self, x: np.ndarray, season: int) -> tuple:
+        """
+        Reference every series' next value x is scored against (the median
+        or the median plus the season's typical deviation, whichever x is
+        least anomalous against) and which series have seen the season
+        before, so are capped at the usual bound.
+        """
+        if self.season_length == 1:
+            return self.median, np.ones(len(x), dtype=bool)
+        seen = self._season_count[:, season] > 0
+        offset = np.zeros(len(x))
+        offset[seen] = np.nanmedian(self._season_deviation[seen, season], axis=1)
+        seasonal = self.median + offset
+        if self.side == 'upper':
+            reference = np.maximum(self.median, seasonal)
+        elif self.side == 'lower':
+            reference = np.minimum(self.median, seasonal)
+        else:
+            reference = np.where(np.abs(x - seasonal) < np.abs(x - self.median), seasonal, self.median)
+        return reference, seen
+
+def screen_panel(wide: pd.DataFrame, cap: bool = False, detector: AnomalyDetector = None, side: str = 'both', freq: str = 'M') -> tuple:
+    """
+    Flag (and optionally cap) anomalous periods of every column of a
+    periods x series frame in one vectorized pass.
+
+    Args:
+        wide: Period totals, one column per series, in date order.
+        cap: Replace flagged values by their capped values (in cents).
+        detector: Detector holding the state of earlier periods, for
+            screening appended periods only; a new one by default.
+        side: Which anomalies a new detector flags ('both', 'upper' for
+            spikes only, 'lower' for dips only).
+        freq: Frequency of the periods, which sets a new detector's
+            season length (SEASON_LENGTHS; none for other frequencies).
+
+    Returns:
+        (frame like wide, capped when cap is set; DataFrame of flagged
+        periods with 'series', 'date', 'expense', 'expected' and 'capped')
+    """
+    detector = detector or AnomalyDetector(n_series=wide.shape[1], side=side, season_length=SEASON_LENGTHS.get(freq, 1))
+    result = detector.update(wide.to_numpy(dtype=float).T)
+    result["capped"] = np.round(result["capped"], 2)
+    series, period = np.nonzero(result["flags"])
+    anomalies = pd.DataFrame({
+        "series": wide.columns[series],
+        "date": wide.index[period],
+        "expense": wide.to_numpy(dtype=float)[period, series],
+        "expected": result["expected"][series, period],
+        "capped": result["capped"][series, period],
+    }).sort_values(['date', 'series'], kind='stable').reset_index(drop=True)
+    if cap:
+        wide = pd.DataFrame(result["capped"].T, index=wide.index, columns=wide.columns)
+    return wide, anomalies
+
+def screen_anomalies(agg_df: pd.DataFrame, cap: bool = False, detector: AnomalyDetector = None, freq: str = 'M') -> tuple:
+    """
+    screen_panel for one aggregated series ('date' and 'expense'), as
+    returned by aggregate_expenses.
+
+    The flagged periods are also attached as the frame's 'anomalies' attr,
+    where the prompt builder picks them up.
+
+    Returns:
+        (frame like agg_df, DataFrame of flagged periods with 'date',
+        'expense', 'expected' and 'capped')
+    """
+    wide = agg_df.set_index('date')[['expense']]
+    screened, anomalies = screen_panel(wide, cap=cap, detector=detector, freq=freq)
+    anomalies = anomalies.drop(columns='series')
+    agg_df = agg_df.assign(expense=screened['expense'].to_numpy()) if cap else agg_df.copy()
+    agg_df.attrs['anomalies'] = {"capped": cap, "records": anomalies.to_dict('records')}
+    return agg_df, anomalies
+
+def format_anomalies(anomalies: dict) -> str:
+    """
+    Prompt lines for the 'anomalies' attr set by screen_anomalies, or an
+    empty string when nothing was flagged.
+    """
+    if not anomalies or not anomalies["records"]:
+        return ""
+    action = "capped in the data above" if anomalies["capped"] else "left as recorded"
+    lines = [
+        f"{pd.Timestamp(record['date']):%Y-%m-%d}: {record['expense']:.2f} (typical {record['expected']:.2f})"
+        for record in anomalies["records"]
+    ]
+    return f"Flagged one-off anomalies ({action}):\n" + "\n".join(lines)
@@ -4,11 +4,22 @@ import requests
 import time
 from datetime import datetime
 import pandas as pd
+from src.gemini_client import get_client
+from src.llm_cache import ResponseCache, get_response_cache
+from src.breakdown import TOTAL_SERIES, load_transactions, forecast_breakdown, aggregate_table, anomaly_table
+from src.prompt_budget import estimate_tokens
+from src.streaming import JSONFieldParser
 
 # --- Configuration ---
 API_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash-preview-09-2025:generateContent"
+# Same model over server-sent events, one JSON chunk per event
+STREAM_API_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash-preview-09-2025:streamGenerateContent?alt=sse"
 MODEL_NAME = "gemini-2.5-flash-preview-09-2025"
 MAX_RETRIES = 5
+PROMPT_TOKEN_BUDGET = 4000
+DEADLINE_SECONDS = 30
+# Months forecast for each horizon offered in the sidebar
+HORIZON_MONTHS = {"Next Quarter (3 months)": 3, "Next Month (1 month)": 1}
 
 # **MODIFICATION HERE: Hardcoded API Key**
 # ----------------------------------------------------------------------
@@ -19,8 +30,25 @@ HARDCODED_API_KEY = "apikey"
 
 # --- Helper Functions ---
 
-def create_prediction_prompt(historical_data, prediction_period):
-    """Generates the detailed prompt for the Gemini model."""
+def create_prediction_prompt(breakdown, prediction_period, token_budget=PROMPT_TOKEN_BUDGET):
+    """
+    Generates the prompt for the Gemini model from the locally aggregated and forecast category table.
+    The numbers are computed locally; the model is only asked to justify them and summarize insights.
+    """
+
+    # Monthly totals per category instead of raw rows; older months are rolled up to years past the budget
+    history_table = aggregate_table(breakdown['history'], token_budget * 3 // 4)
+    forecast_table = aggregate_table(breakdown['forecast'])
+
+    # Periods far from their category's running median and usual seasonal level, so the model can name them instead of guessing
+    anomalies = breakdown['anomalies']
+    anomaly_section = ""
+    if not anomalies.empty:
+        action = "capped before forecasting" if breakdown['capped'] else "included in the forecast inputs as recorded"
+        anomaly_section = f"""
+    **Flagged One-Off Anomalies ({action}; CSV format, 'Typical' is the running median, seasonally adjusted once the month has been seen):**
+    {anomaly_table(anomalies)}
+"""
 
     # Define the expected JSON schema for a structured, reliable output
     # The model will be instructed to return ONLY this JSON object.
@@ -29,25 +57,16 @@ def create_prediction_prompt(historical_data, prediction_period):
     response_schema = {
         "type": "OBJECT",
         "properties": {
-            "predicted_total_expense": {
-                "type": "NUMBER",
-                "description": "The overall predicted total expense for the next period."
-            },
-            "prediction_period": {
-                "type": "STRING",
-                "description": f"The predicted period, clearly stating if it is the next quarter or month based on user input '{prediction_period}'."
-            },
             "expense_breakdown": {
                 "type": "ARRAY",
-                "description": "A list of predicted expenses categorized by category.",
+                "description": "One justification per category of the provided forecast.",
                 "items": {
                     "type": "OBJECT",
                     "properties": {
                         "category": { "type": "STRING" },
-                        "predicted_amount": { "type": "NUMBER" },
                         "justification": { "type": "STRING", "description": "Brief reason for this category's prediction (e.g., 'Seasonal increase for holidays', 'Stable baseline', or 'Projected increase due to known factor')." }
                     },
-                    "propertyOrdering": ["category", "predicted_amount", "justification"]
+                    "propertyOrdering": ["category", "justification"]
                 }
             },
             "key_insights": {
@@ -55,29 +74,30 @@ def create_prediction_prompt(historical_data, prediction_period):
                 "description": "A concise, single paragraph (100-150 words) summarizing the key historical patterns, seasonal trends, and anomalous data points found in the provided data. This should justify the overall prediction."
             }
         },
-        "propertyOrdering": ["predicted_total_expense", "prediction_period", "expense_breakdown", "key_insights"]
+        "propertyOrdering": ["expense_breakdown", "key_insights"]
     }
 
     prompt = f"""
-    You are a world-class Financial Forecasting Agent. Your task is to analyze historical expense data, identify seasonal patterns, trends, and anomalies, and predict the expenses for the next **{prediction_period}**.
+    You are a world-class Financial Forecasting Agent. Monthly expense totals per category and a statistical forecast for the next **{prediction_period}** are given below. The forecast's categories already add up to its total; do not recompute any numbers.
 
-    **Historical Data (CSV format):**
-    {historical_data}
+    **Historical Monthly Totals per Category (CSV format):**
+    {history_table}
 
-    **Analysis and Prediction Requirements:**
-    1.  Analyze the provided data which is typically structured as 'Date,Category,Amount'.
-    2.  Calculate the total predicted expense for the next **{prediction_period}**.
-    3.  Provide a detailed breakdown of the predicted expenses by category.
-    4.  Offer a single paragraph of key insights justifying your prediction based on identified trends (e.g., Q4 holiday spending spikes, consistent monthly rent, summer travel increases, etc.).
-    5.  The final output MUST strictly adhere to the requested JSON schema. Do not include any text, markdown formatting, or explanations outside the JSON block.
+    **Forecast per Category for the next {prediction_period} (CSV format):**
+    {forecast_table}
+{anomaly_section}
+    **Requirements:**
+    1.  For every category in the forecast, give a brief justification of its predicted amount.
+    2.  Offer a single paragraph of key insights based on identified trends (e.g., Q4 holiday spending spikes, consistent monthly rent, summer travel increases, etc.).
+    3.  The final output MUST strictly adhere to the requested JSON schema. Do not include any text, markdown formatting, or explanations outside the JSON block.
     """
     
     return prompt, response_schema
 
-def call_gemini_api(api_key, prompt, response_schema):
-    """Calls the Gemini API with exponential backoff."""
-    headers = {'Content-Type': 'application/json'}
-    
+def build_payload(prompt, response_schema):
+    """
+    Request body for a structured (JSON schema) Gemini call, and its response-cache key.
+    """
     payload = {
         "contents": [{"parts": [{"text": prompt}]}],
         "config": {
@@ -85,44 +105,128 @@ def call_gemini_api(api_key, prompt, response_schema):
             "responseSchema": response_schema
         }
     }
+    return payload, ResponseCache.make_key(MODEL_NAME, prompt, payload["config"])
 
-    for i in range(MAX_RETRIES):
-        try:
-            # Use fetch directly without the API key, as the environment provides it during runtime
-            if api_key:
-                url_with_key = f"{API_URL}?key={api_key}"
-            else:
-                url_with_key = API_URL
-                
-            response = requests.post(url_with_key, headers=headers, json=payload)
-            response.raise_for_status()  # Raises HTTPError for bad responses (4xx or 5xx)
-            
-            result = response.json()
-            
-            if result.get('candidates'):
-                json_text = result['candidates'][0]['content']['parts'][0]['text']
-                # The model is forced to output JSON, but it might be wrapped in markdown backticks.
-                if json_text.startswith("```json"):
-                    json_text = json_text.strip().replace("```json", "").replace("```", "").strip()
-                return json.loads(json_text)
-            
-            # If no candidates, but no HTTP error, it might be a safety block
+def with_key(url, api_key):
+    # Use fetch directly without the API key, as the environment provides it during runtime
+    if not api_key:
+        return url
+    return f"{url}{'&' if '?' in url else '?'}key={api_key}"
+
+def warn_retry(attempt, error):
+    st.warning(f"Attempt {attempt+1} failed due to connection error or API issue: {error}")
+
+def call_gemini_api(api_key, prompt, response_schema, use_cache=True, deadline_seconds=DEADLINE_SECONDS):
+    """
+    Calls the Gemini API through the shared client, reusing cached parsed responses.
+    All attempts and backoff waits together stay within deadline_seconds.
+    """
+    headers = {'Content-Type': 'application/json'}
+    payload, cache_key = build_payload(prompt, response_schema)
+
+    cache = get_response_cache() if use_cache else None
+    if cache is not None:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    url_with_key = with_key(API_URL, api_key)
+
+    json_text = ""
+    try:
+        # The shared client pools connections and retries with jittered exponential backoff
+        result = get_client().post_json(
+            url_with_key, payload, headers=headers, retries=MAX_RETRIES - 1, on_retry=warn_retry,
+            deadline=time.monotonic() + deadline_seconds
+        )
+
+        if result.get('candidates'):
+            json_text = result['candidates'][0]['content']['parts'][0]['text']
+            # The model is forced to output JSON, but it might be wrapped in markdown backticks.
+            if json_text.startswith("```json"):
+                json_text = json_text.strip().replace("```json", "").replace("```", "").strip()
+            prediction = json.loads(json_text)
+            if cache is not None:
+                cache.put(cache_key, prediction)
+            return prediction
+
+        # If no candidates, but no HTTP error, it might be a safety block
+        st.error("API Error: The request was blocked or returned an empty response. Check the prompt content.")
+        return None
+
+    except requests.exceptions.RequestException as e:
+        st.warning(f"Final attempt failed due to connection error or API issue: {e}")
+        st.error("All retries failed. Please check your API key and connection.")
+        return None
+    except json.JSONDecodeError as e:
+        st.error(f"Failed to parse JSON response from the API. This often means the model output was not valid JSON. Error: {e}")
+        st.code(json_text) # Show the raw text output for debugging
+        return None
+
+def stream_gemini_api(api_key, prompt, response_schema, on_field, use_cache=True, deadline_seconds=DEADLINE_SECONDS):
+    """
+    Streaming version of call_gemini_api. The JSON is parsed while it arrives and
+    on_field(name, value) is called for every finished breakdown item and for the key insights.
+    Returns (prediction, seconds until the first field arrived, or None when nothing was streamed).
+    """
+    headers = {'Content-Type': 'application/json'}
+    payload, cache_key = build_payload(prompt, response_schema)
+
+    cache = get_response_cache() if use_cache else None
+    if cache is not None:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            for item in cached.get('expense_breakdown', []):
+                on_field('expense_breakdown', item)
+            if 'key_insights' in cached:
+                on_field('key_insights', cached['key_insights'])
+            return cached, None
+
+    parser = JSONFieldParser(array_fields=("expense_breakdown",), fields=("key_insights",))
+    started = time.perf_counter()
+    first_value = None
+    try:
+        chunks = get_client().post_stream(
+            with_key(STREAM_API_URL, api_key), payload, headers=headers, retries=MAX_RETRIES - 1, on_retry=warn_retry,
+            deadline=time.monotonic() + deadline_seconds
+        )
+        for chunk in chunks:
+            for name, value in parser.feed(chunk):
+                if first_value is None:
+                    first_value = time.perf_counter() - started
+                on_field(name, value)
+
+        if not parser.text.strip():
             st.error("API Error: The request was blocked or returned an empty response. Check the prompt content.")
-            return None
+            return None, first_value
+        prediction = parser.result()
+        if cache is not None:
+            cache.put(cache_key, prediction)
+        return prediction, first_value
 
-        except requests.exceptions.RequestException as e:
-            st.warning(f"Attempt {i+1} failed due to connection error or API issue: {e}")
-            if i < MAX_RETRIES - 1:
-                wait_time = 2 ** i
-                time.sleep(wait_time)
-            else:
-                st.error("All retries failed. Please check your API key and connection.")
-                return None
-        except json.JSONDecodeError as e:
-            st.error(f"Failed to parse JSON response from the API. This often means the model output was not valid JSON. Error: {e}")
-            st.code(json_text) # Show the raw text output for debugging
-            return None
-    return None
+    except requests.exceptions.RequestException as e:
+        st.warning(f"Final attempt failed due to connection error or API issue: {e}")
+        st.error("All retries failed. Please check your API key and connection.")
+        return None, first_value
+    except json.JSONDecodeError as e:
+        st.error(f"Failed to parse JSON response from the API. This often means the model output was not valid JSON. Error: {e}")
+        st.code(parser.text) # Show the raw text output for debugging
+        return None, first_value
+
+def show_breakdown_table(slot, df_breakdown):
+    """Render the breakdown table with justifications into a placeholder."""
+    slot.dataframe(
+        df_breakdown.rename(columns={
+            'category': 'Category',
+            'predicted_amount': 'Predicted Amount ($)',
+            'justification': 'Forecasting Justification'
+        }),
+        use_container_width=True,
+        hide_index=True,
+        column_config={
+            "Predicted Amount ($)": st.column_config.NumberColumn(format="%.2f")
+        }
+    )
 
 # --- Streamlit App UI ---
 
@@ -148,6 +252,16 @@ with st.sidebar:
         ("Next Quarter (3 months)", "Next Month (1 month)"),
         key="period_select"
     )
+    cap_anomalies = st.checkbox("Cap flagged anomalies before forecasting", value=False)
+
+    st.header("Response Cache")
+    bypass_cache = st.checkbox("Bypass cached responses", value=False)
+    stream_response = st.checkbox("Stream justifications as they are generated", value=False)
+    cache_stats = get_response_cache().stats()
+    st.caption(
+        f"{cache_stats['entries']} cached responses · "
+        f"hit rate {cache_stats['hit_rate']:.0%} ({cache_stats['hits']} hits, {cache_stats['misses']} misses)"
+    )
 
 st.header("3. Historical Expense Data Input")
 st.info("Paste your historical expense data below. **Use CSV format** with column headers: `Date`, `Category`, `Amount`.")
@@ -196,60 +310,87 @@ if st.button("Generate Forecast", type="primary"):
     elif not historical_data.strip():
         st.error("Please provide historical expense data.")
     else:
+        # Aggregate per category, forecast every category and the total at once, then reconcile
+        try:
+            breakdown = forecast_breakdown(
+                load_transactions(historical_data), periods=HORIZON_MONTHS[prediction_period], cap_anomalies=cap_anomalies
+            )
+        except (ValueError, pd.errors.ParserError) as e:
+            st.error(f"Could not read the historical data: {e}")
+            st.stop()
+
         # Create prompt and schema
-        prompt, response_schema = create_prediction_prompt(historical_data, prediction_period)
+        prompt, response_schema = create_prediction_prompt(breakdown, prediction_period)
+        st.caption(f"Prompt size: ~{estimate_tokens(prompt):,} tokens (pasted data: ~{estimate_tokens(historical_data):,} tokens)")
         
-        # Display a spinner while waiting for the API call
-        with st.spinner(f"Analyzing data and generating forecast for the {prediction_period}..."):
-            # MODIFICATION: Pass the hardcoded key
-            prediction_data = call_gemini_api(HARDCODED_API_KEY, prompt, response_schema)
-
-        if prediction_data:
-            st.success(f"Forecast Generated for {prediction_data.get('prediction_period', prediction_period)}!")
-            
-            # --- Display Results ---
-            
-            st.subheader("💰 Predicted Total Expense")
-            total_expense = prediction_data.get('predicted_total_expense', 'N/A')
-            st.metric(
-                label=f"Forecast for {prediction_data.get('prediction_period', prediction_period)}", 
-                value=f"${total_expense:,.2f}" if isinstance(total_expense, (int, float)) else str(total_expense)
+        # --- Display Results ---
+        # The numbers are local, so they are shown right away; the model's text fills in below
+
+        st.subheader("💰 Predicted Total Expense")
+        total_expense = float(breakdown['total'].sum())
+        st.metric(
+            label=f"Forecast for {prediction_period}", 
+            value=f"${total_expense:,.2f}"
+        )
+
+        st.subheader("📊 Expense Breakdown")
+        df_breakdown = breakdown['forecast'].sum().rename_axis('category').rename('predicted_amount').reset_index()
+        df_breakdown['justification'] = ''
+        
+        # Display as a chart
+        st.bar_chart(df_breakdown, x='category', y='predicted_amount', color="#4a69bd", use_container_width=True)
+        
+        # Display as a table with justifications
+        table_slot = st.empty()
+        show_breakdown_table(table_slot, df_breakdown)
+
+        if not breakdown['anomalies'].empty:
+            st.subheader("🚩 Flagged Anomalies")
+            st.caption(
+                "Months far from their category's running median and usual level for that month; "
+                + ("they were capped before forecasting (months not seen in an earlier year only past twice the usual level)." if cap_anomalies else "they are included in the forecast as recorded.")
             )
+            st.dataframe(breakdown['anomalies'].replace({'category': {TOTAL_SERIES: 'Total'}}), hide_index=True)
+
+        st.subheader("📈 Key Insights from the Analysis")
+        insights_slot = st.empty()
 
-            st.subheader("📊 Expense Breakdown")
-            breakdown = prediction_data.get('expense_breakdown', [])
-
-            if breakdown:
-                df_breakdown = pd.DataFrame(breakdown)
-                # Ensure the predicted_amount column is numeric for charting
-                df_breakdown['predicted_amount'] = pd.to_numeric(df_breakdown['predicted_amount'], errors='coerce')
-                
-                # Display as a chart
-                st.bar_chart(df_breakdown, x='category', y='predicted_amount', color="#4a69bd", use_container_width=True)
-                
-                # Display as a table with justifications
-                st.dataframe(
-                    df_breakdown.rename(columns={
-                        'category': 'Category',
-                        'predicted_amount': 'Predicted Amount ($)',
-                        'justification': 'Forecasting Justification'
-                    }),
-                    use_container_width=True,
-                    hide_index=True,
-                    column_config={
-                        "Predicted Amount ($)": st.column_config.NumberColumn(format="%.2f")
-                    }
+        def show_field(name, value):
+            if name == 'expense_breakdown':
+                is_category = df_breakdown['category'] == value.get('category')
+                df_breakdown.loc[is_category, 'justification'] = value.get('justification', '')
+                show_breakdown_table(table_slot, df_breakdown)
+            else:
+                insights_slot.markdown(f"*{value}*")
+
+        # Display a spinner while waiting for the API call
+        with st.spinner(f"Generating justifications and insights for the {prediction_period}..."):
+            # MODIFICATION: Pass the hardcoded key
+            started = time.perf_counter()
+            if stream_response:
+                prediction_data, first_value = stream_gemini_api(
+                    HARDCODED_API_KEY, prompt, response_schema, show_field, use_cache=not bypass_cache
                 )
+                if first_value is not None:
+                    st.caption(f"Time to first value: {first_value:.2f}s")
             else:
-                st.warning("No detailed category breakdown was returned by the model.")
+                prediction_data = call_gemini_api(HARDCODED_API_KEY, prompt, response_schema, use_cache=not bypass_cache)
+            st.caption(f"Response time: {time.perf_counter() - started:.2f}s (deadline {DEADLINE_SECONDS}s)")
 
-            st.subheader("📈 Key Insights from the Analysis")
-            st.markdown(f"*{prediction_data.get('key_insights', 'The model did not provide specific insights.')}*")
-            
-            # Add an image tag to illustrate the concept of time series forecasting.
-            # This helps users understand the underlying method.
-            st.markdown("")
+        if not prediction_data:
+            st.warning("The model did not return justifications; showing the local forecast only.")
+            prediction_data = {}
 
-        else:
+        justifications = {
+            item.get('category'): item.get('justification', '')
+            for item in prediction_data.get('expense_breakdown', [])
+        }
+        df_breakdown['justification'] = df_breakdown['category'].map(justifications).fillna('')
+        show_breakdown_table(table_slot, df_breakdown)
+        insights_slot.markdown(f"*{prediction_data.get('key_insights', 'The model did not provide specific insights.')}*")
 
-            st.error("Prediction failed. Please check the API key, data format, or see the console for error details.")
+        st.success(f"Forecast Generated for {prediction_period}!")
+        
+        # Add an image tag to illustrate the concept of time series forecasting.
+        # This helps users understand the underlying method.
+        st.markdown("")
@@ -0,0 +1,158 @@
+# src/autoselect.py
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from src.decomposition import Decomposition, default_config, series_fingerprint
+from src.seasonality import adjust_for_seasonality
+from src.trend import adjust_for_trend
+from src.llm_cache import ResponseCache
+
+DEFAULT_SELECTION_CACHE_PATH = os.getenv("DECOMPOSITION_CACHE_PATH", ".decomposition_cache.sqlite3")
+# Seasonal periods tried per frequency
+PERIODS = {'M': (12, 6, 3), 'Q': (4, 2), 'W': (52, 4), 'D': (7,)}
+# STL seasonal smoother lengths tried (odd)
+STL_WINDOWS = (7, 13, 25)
+MODELS = ('multiplicative', 'additive')
+# Candidates whose mean holdout error exceeds the best one's by this factor stop early
+PRUNE_RATIO = 1.5
+
+_selection_cache = None
+
+def get_selection_cache() -> ResponseCache:
+    """
+    Shared store of chosen configurations at DEFAULT_SELECTION_CACHE_PATH,
+    created on first use; entries never expire.
+    """
+    global _selection_cache
+    if _selection_cache is None:
+        _selection_cache = ResponseCache(DEFAULT_SELECTION_CACHE_PATH, ttl=None)
+    return _selection_cache
+
+def candidate_grid(freq: str = 'M') -> list:
+    """
+    Decomposition settings searched by select_config, default first: no
+    seasonality, classical decompositions of either model for every
+    period, and STL fits of either model for every period, smoother
+    length and robust flag.
+    """
+    base = default_config(freq)
+    periods = PERIODS.get(freq, (base["period"],))
+    grid = [base, dict(base, method='none')]
+    grid += [dict(base, model=model, period=period) for model in MODELS for period in periods]
+    grid += [
+        dict(base, method='stl', model=model, period=period, seasonal=window, robust=robust)
+        for model in MODELS for period in periods for window in STL_WINDOWS for robust in (True, False)
+    ]
+    unique = []
+    for config in grid:
+        if config not in unique:
+            unique.append(config)
+    return unique
+
+def holdout_lengths(n_periods: int, horizon: int = 3, folds: int = 3, min_train: int = 3) -> list:
+    """
+    Training lengths of the rolling holdout folds, oldest first: each fold
+    keeps the next horizon periods as actuals.
+    """
+    lengths = [n_periods - horizon * k for k in range(folds, 0, -1)]
+    return [length for length in lengths if length >= min_train]
+
+def holdout_error(ts: pd.Series, freq: str, config: dict, train_length: int, horizon: int) -> float:
+    """
+    MAE of the historical-mean forecast adjusted by the config's seasonal
+    and trend components over one holdout fold; inf when the config cannot
+    be fitted (e.g. a multiplicative model on zero-valued periods).
+    """
+    train, actual = ts.iloc[:train_length], ts.iloc[train_length:train_length + horizon]
+    decomposition = Decomposition(train, freq, config)
+    base = pd.DataFrame({"date": actual.index, "predicted_expense": float(train.mean())})
+    try:
+        predicted = adjust_for_trend(adjust_for_seasonality(base, decomposition), decomposition)['predicted_expense']
+    except (ValueError, np.linalg.LinAlgError):
+        return np.inf
+    error = np.abs(predicted.to_numpy(dtype=float) - actual.to_numpy(dtype=float)).mean()
+    return float(error) if np.isfinite(error) else np.inf
+
+def select_config(
+    ts: pd.Series,
+    freq: str = 'M',
+    horizon: int = 3,
+    folds: int = 3,
+    workers: int = None,
+    pool=None,
+    use_cache: bool = True
+) -> dict:
+    """
+    Choose decomposition settings for one resampled series on a holdout.
+
+    Every candidate of candidate_grid that has two full cycles in every
+    fold (and, for classical multiplicative ones, only positive periods) is
+    scored on rolling holdout folds, all surviving candidates of a
+    fold in parallel. After each fold, candidates whose mean error exceeds
+    the best one's by PRUNE_RATIO are dropped. The winner (ties go to the
+    earlier candidate, so the default wins when nothing beats it) is cached
+    per series fingerprint, so later runs skip the search.
+
+    Args:
+        ts: Resampled expense series.
+        freq: Its frequency.
+        horizon: Periods forecast in each fold.
+        folds: Number of holdout folds.
+        workers: Process pool size; 0 or 1 searches in-process.
+        pool: Executor to use instead of starting one.
+        use_cache: Read and write the selection cache.
+
+    Returns:
+        Dict with the chosen 'config', its mean holdout 'error' (None when
+        the history is too short to search), the number of 'candidates',
+        'evaluations' run, candidates 'pruned' early and whether the
+        result was 'cached'.
+    """
+    grid = candidate_grid(freq)
+    cache = get_selection_cache() if use_cache else None
+    key = ResponseCache.make_key("decomposition-search", series_fingerprint(ts), {"freq": freq, "horizon": horizon, "folds": folds, "grid": grid})
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            return dict(cached, cached=True)
+
+    lengths = holdout_lengths(len(ts), horizon, folds)
+    shortest = min(lengths, default=0)
+    positive = bool((ts > 0).all())
+    candidates = [
+        config for config in grid
+        if lengths and (config["method"] == 'none' or shortest >= 2 * config["period"])
+        # A classical multiplicative fit of the full series fails on zero or negative periods
+        and (positive or config["method"] != 'classical' or config["model"] != 'multiplicative')
+    ]
+    result = {"config": default_config(freq), "error": None, "candidates": len(candidates), "evaluations": 0, "pruned": 0}
+    if len(candidates) > 1:
+        workers = os.cpu_count() if workers is None else workers
+        own_pool = pool is None and workers > 1
+        pool = ProcessPoolExecutor(max_workers=workers) if own_pool else pool
+        try:
+            alive, errors = list(range(len(candidates))), [[] for _ in candidates]
+            for length in lengths:
+                configs = [candidates[i] for i in alive]
+                args = ([ts] * len(configs), [freq] * len(configs), configs, [length] * len(configs), [horizon] * len(configs))
+                scores = list(pool.map(holdout_error, *args)) if pool is not None else list(map(holdout_error, *args))
+                result["evaluations"] += len(scores)
+                for i, score in zip(alive, scores):
+                    errors[i].append(score)
+                means = {i: np.mean(errors[i]) for i in alive}
+                best = min(means.values())
+                if not np.isfinite(best):
+                    break
+                alive = [i for i in alive if means[i] <= best * PRUNE_RATIO]
+            else:
+                winner = min(alive, key=lambda i: (means[i], i))
+                result.update(config=candidates[winner], error=float(means[winner]), pruned=len(candidates) - len(alive))
+        finally:
+            if own_pool:
+                pool.shutdown()
+
+    if cache is not None:
+        cache.put(key, result)
+    return dict(result, cached=False)
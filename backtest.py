@@ -0,0 +1,160 @@
+# src/backtest.py
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from src.clean_data import aggregate_expenses_by_series
+from src.forecast import forecast_expenses, forecast_aggregated_batch
+
+# Engines with a vectorized multi-series path; anything else runs per series
+BATCH_ENGINES = ('mean', 'ets')
+
+# Aggregated history shared by the worker processes of one backtest run
+_worker_state = {}
+
+def rolling_cutoffs(dates: pd.DatetimeIndex, horizon: int, min_train: int = 12, step: int = 1, max_cutoffs: int = None) -> list:
+    """
+    Forecast origins for a rolling-origin backtest.
+
+    Every origin leaves at least min_train periods of history before it
+    and horizon periods of actuals after it. With max_cutoffs, only the
+    most recent origins are kept.
+    """
+    dates = pd.DatetimeIndex(sorted(set(dates)))
+    cutoffs = list(dates[min_train - 1:len(dates) - horizon:step])
+    if max_cutoffs is not None:
+        cutoffs = cutoffs[-max_cutoffs:]
+    return cutoffs
+
+def _init_worker(agg_df: pd.DataFrame, series_col: str, freq: str, engine, replay_path: str, record: bool) -> None:
+    _worker_state.update(agg_df=agg_df, series_col=series_col, freq=freq, engine=engine)
+    if replay_path is not None:
+        from src.llm_cache import use_replay_store
+        use_replay_store(replay_path, record=record)
+
+def _forecast_cutoffs(cutoffs: list, horizon: int) -> pd.DataFrame:
+    """
+    Forecast every series from each cutoff, using the worker's aggregates.
+    Returns rows of (series, cutoff, h, predicted).
+    """
+    agg_df = _worker_state['agg_df']
+    series_col = _worker_state['series_col']
+    freq = _worker_state['freq']
+    engine = _worker_state['engine']
+
+    frames = []
+    for cutoff in cutoffs:
+        history = agg_df[agg_df['date'] <= cutoff]
+        if engine in BATCH_ENGINES:
+            forecast = forecast_aggregated_batch(history, periods=horizon, freq=freq, series_col=series_col, engine=engine)
+        else:
+            parts = []
+            for series_id, series_history in history.groupby(series_col, sort=False):
+                series_history = series_history[['date', 'expense']].reset_index(drop=True)
+                if callable(engine):
+                    part = engine(series_history, horizon, freq)
+                else:
+                    part = forecast_expenses(series_history, periods=horizon, freq=freq, engine=engine)
+                parts.append(part.assign(**{series_col: series_id}))
+            if not parts:
+                continue
+            forecast = pd.concat(parts, ignore_index=True)
+        forecast = forecast.assign(cutoff=cutoff, h=forecast.groupby(series_col).cumcount() + 1)
+        # An LLM may answer with more periods than asked for
+        forecast = forecast[forecast['h'] <= horizon]
+        frames.append(forecast[[series_col, 'cutoff', 'h', 'predicted_expense']])
+    if not frames:
+        return pd.DataFrame(columns=[series_col, 'cutoff', 'h', 'predicted_expense'])
+    return pd.concat(frames, ignore_index=True)
+
+def backtest(
+    df: pd.DataFrame,
+    horizon: int = 3,
+    freq: str = 'M',
+    series_col: str = None,
+    engine='mean',
+    min_train: int = 12,
+    step: int = 1,
+    max_cutoffs: int = None,
+    workers: int = None,
+    replay_path: str = None,
+    record: bool = False,
+) -> pd.DataFrame:
+    """
+    Replay history at many cutoff dates and score the forecasts.
+
+    Transactions are aggregated once; every cutoff slices that aggregate
+    instead of re-aggregating. Cutoffs are spread across a process pool.
+    'mean' and 'ets' forecast all series of a cutoff in one vectorized
+    pass; other engines ('llm' or a callable(history_df, periods, freq)
+    returning 'date'/'predicted_expense') run forecast_expenses per series.
+
+    Args:
+        df: Transactions with 'date', 'expense' and optionally series_col.
+        horizon: Periods forecast from each cutoff.
+        freq: Aggregation frequency.
+        series_col: Series id column, or None for a single series.
+        engine: 'mean', 'ets', 'llm' or a callable.
+        min_train: Minimum periods of history before the first cutoff.
+        step: Periods between consecutive cutoffs.
+        max_cutoffs: Keep only the most recent cutoffs.
+        workers: Process pool size; 0 or 1 runs in-process.
+        replay_path: Record/replay store answering LLM prompts, so LLM runs
+            are deterministic and offline.
+        record: Fill replay_path from the live API instead of replaying only.
+
+    Returns:
+        One row per series, cutoff and horizon step with 'actual',
+        'predicted_expense' and the absolute error.
+    """
+    if series_col is None:
+        df = df.assign(series='all')
+        series_col = 'series'
+    agg_df = aggregate_expenses_by_series(df, freq=freq, series_col=series_col)
+    cutoffs = rolling_cutoffs(agg_df['date'], horizon, min_train=min_train, step=step, max_cutoffs=max_cutoffs)
+
+    initargs = (agg_df, series_col, freq, engine, replay_path, record)
+    workers = os.cpu_count() if workers is None else workers
+    if workers <= 1 or len(cutoffs) <= 1:
+        # The replay store must not outlive the run in the caller's process
+        from src import llm_cache
+        saved = llm_cache._default_cache, llm_cache._replay_only
+        try:
+            _init_worker(*initargs)
+            predictions = _forecast_cutoffs(cutoffs, horizon)
+        finally:
+            llm_cache._default_cache, llm_cache._replay_only = saved
+            _worker_state.clear()
+    else:
+        chunks = [list(chunk) for chunk in np.array_split(np.array(cutoffs, dtype=object), min(len(cutoffs), workers * 4)) if len(chunk)]
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as pool:
+            predictions = pd.concat(pool.map(_forecast_cutoffs, chunks, [horizon] * len(chunks)), ignore_index=True)
+
+    # Align forecasts with actuals by position: step h after the cutoff
+    actuals = agg_df.assign(pos=agg_df.groupby(series_col).cumcount())
+    origin = actuals[[series_col, 'date', 'pos']].rename(columns={'date': 'cutoff', 'pos': 'cutoff_pos'})
+    errors = predictions.merge(origin, on=[series_col, 'cutoff'])
+    errors['pos'] = errors['cutoff_pos'] + errors['h']
+    errors = errors.merge(actuals[[series_col, 'pos', 'expense']], on=[series_col, 'pos'])
+    errors = errors.rename(columns={'expense': 'actual'}).drop(columns=['cutoff_pos', 'pos'])
+    errors['abs_error'] = (errors['predicted_expense'] - errors['actual']).abs()
+    return errors.sort_values([series_col, 'cutoff', 'h']).reset_index(drop=True)
+
+def score_backtest(errors: pd.DataFrame) -> pd.DataFrame:
+    """
+    MAE, MAPE and sMAPE (in percent) per horizon step of a backtest.
+    MAPE skips periods whose actual is zero.
+    """
+    actual = errors['actual'].astype(float)
+    predicted = errors['predicted_expense'].astype(float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ape = (errors['abs_error'] / actual.abs()).where(actual != 0) * 100
+        sape = 2 * errors['abs_error'] / (actual.abs() + predicted.abs()) * 100
+    scored = errors.assign(ape=ape, sape=sape.fillna(0.0))
+    return scored.groupby('h').agg(
+        forecasts=('abs_error', 'size'),
+        mae=('abs_error', 'mean'),
+        mape=('ape', 'mean'),
+        smape=('sape', 'mean'),
+    ).reset_index()
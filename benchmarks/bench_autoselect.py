@@ -0,0 +1,107 @@
+# src/benchmarks/bench_autoselect.py
+
+import os
+import sys
+import tempfile
+
+# Keep the selection cache of this run out of the working directory
+os.environ.setdefault("DECOMPOSITION_CACHE_PATH", os.path.join(tempfile.mkdtemp(), "decomposition_cache.sqlite3"))
+
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from src import autoselect
+from src.autoselect import holdout_error, select_config
+from src.decomposition import default_config
+
+TEST_PERIODS = 6
+
+def make_series(kind: str, seed: int) -> pd.Series:
+    """One synthetic monthly series of a given shape."""
+    rng = np.random.default_rng(seed)
+    level = rng.uniform(500, 3000)
+    if kind == 'multiplicative':
+        t = np.arange(72)
+        values = level * (1 + 0.3 * np.sin(t * np.pi / 6)) * (1 + 0.04 * rng.standard_normal(len(t)))
+    elif kind == 'additive':
+        t = np.arange(72)
+        values = level + 0.3 * level * np.sign(np.sin(t * np.pi / 6 + 0.3)) + 0.04 * level * rng.standard_normal(len(t))
+    elif kind == 'short 6-month cycle':
+        # Under two years once the test periods are held out
+        t = np.arange(28)
+        values = level * (1 + 0.4 * np.cos(t * np.pi / 3)) + 0.03 * level * rng.standard_normal(len(t))
+    elif kind == 'zero months':
+        t = np.arange(48)
+        values = np.where(t % 4 == 1, 0.0, level * (1 + 0.5 * (t % 4 == 3))) + 0.02 * level * rng.random(len(t))
+        values[t % 4 == 1] = 0.0
+    else:
+        t = np.arange(60)
+        values = level * (1 + 0.08 * rng.standard_normal(len(t)))
+    return pd.Series(values, index=pd.date_range('2015-01-31', periods=len(t), freq='ME'))
+
+def test_error(ts: pd.Series, config: dict) -> float:
+    """Error of a config fitted on all but the last TEST_PERIODS, which the search never sees."""
+    return holdout_error(ts, 'M', config, len(ts) - TEST_PERIODS, TEST_PERIODS)
+
+def run(per_kind: int = 8) -> int:
+    kinds = ('multiplicative', 'additive', 'short 6-month cycle', 'zero months', 'noise')
+    failures, searches = [], []
+    print(f"{'series':>20} {'default':>10} {'auto':>10}  chosen")
+    start = time.perf_counter()
+    for kind in kinds:
+        default_errors, auto_errors, chosen = [], [], []
+        for seed in range(per_kind):
+            ts = make_series(kind, seed)
+            result = select_config(ts.iloc[:-TEST_PERIODS], 'M', workers=1)
+            searches.append(result)
+            default_errors.append(test_error(ts, default_config('M')))
+            auto_errors.append(test_error(ts, result["config"]))
+            chosen.append(f"{result['config']['method']}/{result['config']['model'][:4]}/{result['config']['period']}")
+        default, auto = np.mean(default_errors), np.mean(auto_errors)
+        print(f"{kind:>20} {default:10.1f} {auto:10.1f}  {pd.Series(chosen).value_counts().index[0]}")
+        if not np.isfinite(auto):
+            failures.append(f"auto selection failed on '{kind}' series")
+        elif np.isfinite(default) and auto > default * 1.1:
+            failures.append(f"auto selection is worse than the default on '{kind}' series")
+    search_seconds = time.perf_counter() - start
+    evaluations = sum(result["evaluations"] for result in searches)
+    possible = sum(result["candidates"] * 3 for result in searches)
+    print(f"{len(searches)} searches in {search_seconds:.2f}s: {evaluations} of {possible} "
+          f"fold evaluations run ({1 - evaluations / possible:.0%} skipped by early stopping)")
+
+    # Pruning should only drop candidates that would not have won
+    ratio, autoselect.PRUNE_RATIO = autoselect.PRUNE_RATIO, np.inf
+    full = [select_config(make_series(kind, seed).iloc[:-TEST_PERIODS], 'M', workers=1, use_cache=False)
+            for kind in kinds for seed in range(per_kind)]
+    autoselect.PRUNE_RATIO = ratio
+    agreement = np.mean([exhaustive["config"] == result["config"] for exhaustive, result in zip(full, searches)])
+    regret = np.mean([result["error"] / exhaustive["error"] - 1 for exhaustive, result in zip(full, searches) if exhaustive["error"]])
+    print(f"early stopping keeps the exhaustive search's choice for {agreement:.0%} of series, "
+          f"mean holdout error {regret:+.1%} against it")
+    if regret > 0.05:
+        failures.append(f"early stopping raised the holdout error by {regret:.1%}")
+
+    ts = make_series('multiplicative', 99).iloc[:-TEST_PERIODS]
+    with ProcessPoolExecutor(max_workers=2) as pool:
+        start = time.perf_counter()
+        pooled = select_config(ts, 'M', pool=pool, use_cache=False)
+        print(f"process pool (2 workers): {time.perf_counter() - start:.2f}s per search")
+    serial = select_config(ts, 'M', workers=1, use_cache=False)
+    if pooled["config"] != serial["config"] or pooled["error"] != serial["error"]:
+        failures.append("pooled search differs from the in-process one")
+
+    select_config(ts, 'M', workers=1)
+    start = time.perf_counter()
+    cached = select_config(ts, 'M', workers=1)
+    print(f"cached selection: {(time.perf_counter() - start) * 1000:.2f}ms")
+    if not cached["cached"] or cached["config"] != serial["config"]:
+        failures.append("repeated search was not served from the cache")
+
+    for failure in failures:
+        print(f"FAILED {failure}")
+    print("Auto-selection checks passed." if not failures else f"{len(failures)} failure(s).")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(run())
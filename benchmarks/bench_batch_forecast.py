@@ -0,0 +1,42 @@
+# src/benchmarks/bench_batch_forecast.py
+
+import time
+import numpy as np
+import pandas as pd
+from src.clean_data import aggregate_expenses
+from src.forecast import forecast_expenses, forecast_expenses_batch
+
+def make_ledger(n_series: int, n_months: int = 36, per_month: int = 8, seed: int = 0) -> pd.DataFrame:
+    """Synthetic long-format ledger with a yearly cycle per series."""
+    rng = np.random.default_rng(seed)
+    n_rows = n_series * n_months * per_month
+    start = pd.Timestamp('2021-01-01')
+    days = rng.integers(0, n_months * 30, n_rows)
+    series = np.repeat(np.arange(n_series), n_months * per_month)
+    level = rng.gamma(2.0, 100.0, n_series)[series]
+    season = 1 + 0.3 * np.sin(2 * np.pi * days / 365.25)
+    return pd.DataFrame({
+        "series": series,
+        "date": start + pd.to_timedelta(days, unit='D'),
+        "expense": level * season * rng.lognormal(0, 0.2, n_rows),
+    })
+
+def run(sizes=(10, 1_000, 10_000), periods: int = 3, loop_limit: int = 100) -> None:
+    for n_series in sizes:
+        ledger = make_ledger(n_series)
+
+        start = time.perf_counter()
+        forecast_expenses_batch(ledger, periods=periods, freq='M')
+        batch_time = time.perf_counter() - start
+
+        line = f"{n_series:>6} series | batch {batch_time:8.3f}s ({n_series / batch_time:10.0f} series/s)"
+        if n_series <= loop_limit:
+            start = time.perf_counter()
+            for _, group in ledger.groupby('series'):
+                forecast_expenses(aggregate_expenses(group[['date', 'expense']], 'M'), periods=periods, freq='M')
+            loop_time = time.perf_counter() - start
+            line += f" | loop {loop_time:8.3f}s ({n_series / loop_time:10.0f} series/s)"
+        print(line)
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,99 @@
+# src/benchmarks/bench_compact.py
+
+import io
+import sys
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+from src.clean_data import (
+    load_data, clean_data, aggregate_expenses, aggregate_expenses_by_series,
+    stream_aggregate, periods_to_dates, memory_footprint,
+)
+
+def make_ledger_csv(n_rows: int, n_accounts: int = 200, seed: int = 0) -> bytes:
+    """Synthetic ledger CSV with category and account columns and a few bad rows."""
+    rng = np.random.default_rng(seed)
+    days = pd.date_range('2010-01-01', '2024-12-31', freq='D')
+    df = pd.DataFrame({
+        "date": rng.choice(days, n_rows).astype('datetime64[ns]').astype(str),
+        "category": rng.choice(['Rent', 'Food', 'Transport', 'Utilities', 'Leisure', 'Health'], n_rows),
+        "account": np.char.add('ACC-', rng.integers(0, n_accounts, n_rows).astype(str)),
+        "expense": np.round(rng.gamma(2.0, 40.0, n_rows), 2),
+    })
+    df.loc[::997, 'date'] = 'not a date'
+    df.loc[::1009, 'expense'] = np.nan
+    return df.to_csv(index=False).encode()
+
+def load_clean(data: bytes, compact: bool) -> tuple:
+    """Load and clean data; returns (frame, seconds, peak traced bytes)."""
+    start = time.perf_counter()
+    df = clean_data(load_data(io.BytesIO(data), compact=compact), compact=compact)
+    seconds = time.perf_counter() - start
+    # Tracing slows allocation down, so memory is measured on a second pass
+    tracemalloc.start()
+    clean_data(load_data(io.BytesIO(data), compact=compact), compact=compact)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return df, seconds, peak
+
+def matches(default: pd.DataFrame, compact: pd.DataFrame, freq: str, keys: list) -> bool:
+    """Whether a compact aggregate equals the default one once decoded."""
+    decoded = periods_to_dates(compact, freq)
+    if keys[0] != 'date':
+        decoded[keys[0]] = decoded[keys[0]].astype(str)
+        default = default.assign(**{keys[0]: default[keys[0]].astype(str)})
+    default = default.sort_values(keys).reset_index(drop=True)
+    decoded = decoded.sort_values(keys).reset_index(drop=True)
+    return (
+        len(default) == len(decoded)
+        and (default[keys].to_numpy() == decoded[keys].to_numpy()).all()
+        and np.allclose(default['expense'], decoded['expense'], rtol=1e-9, atol=1e-6)
+    )
+
+def check_aggregates(data: bytes, default_df: pd.DataFrame, compact_df: pd.DataFrame) -> list:
+    """Compare every compact aggregate with the default mode; returns failures."""
+    failures = []
+    for freq in ('M', 'Q'):
+        if not matches(aggregate_expenses(default_df, freq), aggregate_expenses(compact_df, freq, compact=True), freq, ['date']):
+            failures.append(f"aggregate_expenses freq={freq}")
+        for series_col in ('account', 'category'):
+            default = aggregate_expenses_by_series(default_df, freq, series_col=series_col)
+            compact = aggregate_expenses_by_series(compact_df, freq, series_col=series_col, compact=True)
+            if not matches(default, compact, freq, [series_col, 'date']):
+                failures.append(f"aggregate_expenses_by_series freq={freq} series={series_col}")
+    default, default_report = stream_aggregate(io.BytesIO(data), chunksize=50_000)
+    compact, compact_report = stream_aggregate(io.BytesIO(data), chunksize=50_000, compact=True)
+    if default_report != compact_report or not matches(default, compact, 'M', ['date']):
+        failures.append("stream_aggregate")
+    return failures
+
+def run(sizes: tuple = (100_000, 1_000_000)) -> int:
+    failures = []
+    for n_rows in sizes:
+        data = make_ledger_csv(n_rows)
+        default_df, default_seconds, default_peak = load_clean(data, compact=False)
+        compact_df, compact_seconds, compact_peak = load_clean(data, compact=True)
+
+        print(f"\n{n_rows:,} rows")
+        report = memory_footprint(default_df).join(memory_footprint(compact_df), lsuffix='_default', rsuffix='_compact')
+        print(report.to_string())
+        print(f"load+clean: default {default_seconds:.2f}s peak {default_peak / 2**20:.0f}MiB, "
+              f"compact {compact_seconds:.2f}s peak {compact_peak / 2**20:.0f}MiB")
+
+        for label, compact in (("default", False), ("compact", True)):
+            df = compact_df if compact else default_df
+            start = time.perf_counter()
+            aggregate_expenses_by_series(df, 'M', series_col='account', compact=compact)
+            print(f"aggregate by account ({label}): {(time.perf_counter() - start) * 1000:.0f}ms")
+
+        failures += [f"{n_rows} rows: {failure}" for failure in check_aggregates(data, default_df, compact_df)]
+
+    print()
+    for failure in failures:
+        print(f"MISMATCH {failure}")
+    print("Compact aggregates match the default mode." if not failures else f"{len(failures)} mismatch(es).")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(run())
@@ -0,0 +1,54 @@
+# src/benchmarks/bench_ets.py
+
+import time
+import warnings
+import numpy as np
+from statsmodels.tsa.holtwinters import ExponentialSmoothing
+from src.clean_data import load_data, clean_data, aggregate_expenses
+from src.ets import holt_winters_forecast
+
+def make_panel(n_series: int, n_periods: int = 48, seed: int = 0) -> np.ndarray:
+    """Synthetic monthly panel with level, trend, yearly cycle and noise."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(n_periods)
+    level = rng.gamma(2.0, 500.0, (n_series, 1))
+    slope = rng.normal(0.0, 0.005, (n_series, 1)) * level
+    season = 1 + rng.uniform(0.05, 0.3, (n_series, 1)) * np.sin(2 * np.pi * (t + rng.integers(0, 12, (n_series, 1))) / 12)
+    return (level + slope * t) * season * rng.lognormal(0.0, 0.05, (n_series, n_periods))
+
+def smape(actual: np.ndarray, predicted: np.ndarray) -> float:
+    return float(np.mean(2 * np.abs(predicted - actual) / (np.abs(actual) + np.abs(predicted))) * 100)
+
+def statsmodels_forecast(Y: np.ndarray, periods: int, season_length: int = 12) -> np.ndarray:
+    out = np.empty((Y.shape[0], periods))
+    seasonal = 'mul' if Y.shape[1] >= 2 * season_length and (Y > 0).all() else None
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        for i, y in enumerate(Y):
+            model = ExponentialSmoothing(y, trend='add', seasonal=seasonal,
+                                         seasonal_periods=season_length if seasonal else None)
+            out[i] = model.fit().forecast(periods)
+    return out
+
+def compare(name: str, Y: np.ndarray, horizon: int) -> None:
+    train, test = Y[:, :-horizon], Y[:, -horizon:]
+
+    start = time.perf_counter()
+    ours = holt_winters_forecast(train, horizon)
+    ours_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    theirs = statsmodels_forecast(train, horizon)
+    theirs_time = time.perf_counter() - start
+
+    print(f"{name:<22} numpy ETS {ours_time:8.3f}s sMAPE {smape(test, ours):6.2f}% | "
+          f"statsmodels {theirs_time:8.3f}s sMAPE {smape(test, theirs):6.2f}%")
+
+def run(data_path: str = "data/sample_expenses.csv") -> None:
+    sample = aggregate_expenses(clean_data(load_data(data_path)))
+    compare("sample data", sample['expense'].to_numpy(dtype=float)[None, :], horizon=2)
+    for n_series in (100, 500):
+        compare(f"synthetic x{n_series}", make_panel(n_series), horizon=12)
+
+if __name__ == "__main__":
+    run()
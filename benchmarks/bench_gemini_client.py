@@ -0,0 +1,46 @@
+# src/benchmarks/bench_gemini_client.py
+
+import asyncio
+import time
+import requests
+from src.gemini_client import GeminiClient
+from src.benchmarks.stub_llm_server import start_stub_server
+
+def run(n_requests: int = 200, delay: float = 0.02) -> None:
+    server = start_stub_server(delay=delay)
+    url = f"http://127.0.0.1:{server.server_port}/"
+    payload = {"prompt": "ping"}
+    client = GeminiClient(rate=10_000, max_in_flight=32)
+
+    start = time.perf_counter()
+    for _ in range(n_requests):
+        requests.post(url, json=payload, timeout=10).json()
+    no_session = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(n_requests):
+        client.post_json(url, payload)
+    pooled = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = asyncio.run(client.apost_many(url, [payload] * n_requests))
+    concurrent = time.perf_counter() - start
+    failures = sum(isinstance(r, Exception) for r in results)
+
+    print(f"requests.post (no session) : {n_requests / no_session:8.1f} req/s")
+    print(f"pooled client, sequential  : {n_requests / pooled:8.1f} req/s")
+    print(f"pooled client, async x32   : {n_requests / concurrent:8.1f} req/s ({failures} failed)")
+    server.shutdown()
+
+    # 429/5xx replies must be retried, by both the blocking and async paths
+    server = start_stub_server(fail_first=2)
+    url = f"http://127.0.0.1:{server.server_port}/"
+    client = GeminiClient(rate=10_000, base_delay=0.01)
+    client.post_json(url, payload, retries=2)
+    server.RequestHandlerClass.failed[0] = 0
+    asyncio.run(client.apost_json(url, payload, retries=2))
+    print("503 replies retried        : ok")
+    server.shutdown()
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,49 @@
+# src/benchmarks/bench_import.py
+
+import os
+import statistics
+import subprocess
+import sys
+
+# Core modules a headless batch job imports, and the budget for a cold import
+CORE_MODULES = ("src.clean_data", "src.forecast", "src.ets", "src.incremental")
+HEAVY_MODULES = ("statsmodels", "scipy", "matplotlib", "seaborn", "streamlit", "plotly", "dotenv", "requests")
+BUDGET_SECONDS = float(os.getenv("IMPORT_BUDGET_SECONDS", "1.0"))
+
+PROBE = """
+import sys, time
+start = time.perf_counter()
+{imports}
+elapsed = time.perf_counter() - start
+print(elapsed)
+print(",".join(m for m in {heavy!r} if m in sys.modules))
+"""
+
+def cold_import(modules: tuple) -> tuple:
+    """Import modules in a fresh interpreter; returns (seconds, heavy modules loaded)."""
+    code = PROBE.format(imports="\n".join(f"import {m}" for m in modules), heavy=HEAVY_MODULES)
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(p for p in sys.path if p))
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True, env=env).stdout.split("\n")
+    return float(out[0]), [m for m in out[1].split(",") if m]
+
+def run(repeats: int = 5) -> None:
+    times = []
+    for _ in range(repeats):
+        seconds, heavy = cold_import(CORE_MODULES)
+        times.append(seconds)
+    median = statistics.median(times)
+    print(f"Cold import of {', '.join(CORE_MODULES)}: median {median * 1000:.0f}ms over {repeats} runs")
+    print(f"Heavy modules loaded: {', '.join(heavy) or 'none'}")
+
+    failures = []
+    if heavy:
+        failures.append(f"core import pulled in {', '.join(heavy)}")
+    if median > BUDGET_SECONDS:
+        failures.append(f"median {median:.2f}s exceeds the {BUDGET_SECONDS:.2f}s budget")
+    if failures:
+        print("FAIL: " + "; ".join(failures))
+        sys.exit(1)
+    print("OK")
+
+if __name__ == "__main__":
+    run()
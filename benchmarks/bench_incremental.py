@@ -0,0 +1,36 @@
+# src/benchmarks/bench_incremental.py
+
+import time
+import numpy as np
+import pandas as pd
+from src.clean_data import aggregate_expenses
+from src.ai_agent import offline_forecast
+from src.incremental import IncrementalForecaster
+
+def make_transactions(n_months: int, per_day: int = 20, seed: int = 0) -> pd.DataFrame:
+    """Synthetic daily transactions covering n_months."""
+    rng = np.random.default_rng(seed)
+    days = pd.date_range('2000-01-01', periods=n_months * 30, freq='D')
+    dates = np.repeat(days.values, per_day)
+    return pd.DataFrame({"date": dates, "expense": rng.uniform(5, 100, len(dates))})
+
+def run() -> None:
+    print(f"{'months':>7} {'full rebuild':>13} {'append month':>13} {'speedup':>8}")
+    for n_months in (24, 120, 600):
+        tx = make_transactions(n_months + 1)
+        cutoff = tx['date'].max() - pd.Timedelta(days=30)
+        history, new = tx[tx['date'] <= cutoff], tx[tx['date'] > cutoff]
+        forecaster = IncrementalForecaster.from_history(history)
+
+        start = time.perf_counter()
+        offline_forecast(aggregate_expenses(tx), 3, 'M', engine='ets')
+        full = time.perf_counter() - start
+
+        start = time.perf_counter()
+        forecaster.append(new)
+        forecaster.forecast(3)
+        incremental = time.perf_counter() - start
+        print(f"{n_months:>7} {full * 1000:>11.1f}ms {incremental * 1000:>11.1f}ms {full / incremental:>7.1f}x")
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,122 @@
+# src/benchmarks/bench_intervals.py
+
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from src.forecast import forecast_aggregated_batch, forecast_expenses
+from src.intervals import QUANTILES, simulate_quantiles
+
+def make_panel(n_series: int, n_periods: int, seed: int = 0) -> tuple:
+    """Base forecasts, residual histories and multipliers for a synthetic panel."""
+    rng = np.random.default_rng(seed)
+    base = rng.uniform(500, 1500, (n_series, 1)) * np.ones((n_series, 12))
+    resid = rng.normal(0, 1, (n_series, n_periods)) * rng.uniform(20, 200, (n_series, 1))
+    factors = 1 + 0.1 * np.sin(np.arange(12) * np.pi / 6) * np.ones((n_series, 1))
+    return base, resid, factors
+
+def loop_quantiles(base, resid, factors, n_paths: int, seed: int = 0) -> np.ndarray:
+    """Reference: one path at a time in Python."""
+    rng = np.random.default_rng(seed)
+    n_series, periods = base.shape
+    result = np.empty((len(QUANTILES), n_series, periods))
+    for i in range(n_series):
+        paths = []
+        for _ in range(n_paths):
+            paths.append([(base[i, h] + resid[i, rng.integers(resid.shape[1])]) * factors[i, h] for h in range(periods)])
+        result[:, i, :] = np.quantile(np.array(paths), QUANTILES, axis=0)
+    return result
+
+def peak_bytes(fn) -> int:
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+def check_calibration(n_series: int = 300, n_history: int = 48, holdout: int = 12, n_paths: int = 1000) -> float:
+    """Share of held-out actuals inside the P10-P90 band of a mean forecast."""
+    rng = np.random.default_rng(7)
+    levels = rng.uniform(200, 2000, (n_series, 1))
+    seasonal = 1 + 0.2 * np.sin(np.arange(n_history + holdout) * np.pi / 6)
+    values = levels * seasonal + rng.normal(0, 1, (n_series, n_history + holdout)) * levels * 0.1
+    dates = pd.date_range('2015-01-31', periods=n_history + holdout, freq='ME')
+    agg = pd.DataFrame({
+        "series": np.repeat(np.arange(n_series), n_history),
+        "date": np.tile(dates[:n_history], n_series),
+        "expense": values[:, :n_history].ravel(),
+    })
+    forecast = forecast_aggregated_batch(agg, periods=holdout, intervals=True, n_paths=n_paths)
+    actual = values[:, n_history:].ravel()
+    return float(((forecast['p10'] <= actual) & (actual <= forecast['p90'])).mean())
+
+def check_single_series(n_series: int = 40, n_history: int = 48, holdout: int = 6, noise: float = 80.0) -> tuple:
+    """P10-P90 coverage and mean half-width of single-series bands on noisy seasonal histories."""
+    covered, half_widths = [], []
+    dates = pd.date_range('2015-01-31', periods=n_history + holdout, freq='ME')
+    for seed in range(n_series):
+        rng = np.random.default_rng(seed)
+        values = 1000 * (1 + 0.2 * np.sin(np.arange(n_history + holdout) * np.pi / 6)) + rng.normal(0, noise, n_history + holdout)
+        history = pd.DataFrame({"date": dates[:n_history], "expense": values[:n_history]})
+        forecast = forecast_expenses(history, periods=holdout, engine='mean', intervals=True, n_paths=1000)
+        actual = values[n_history:]
+        covered.append(((forecast['p10'] <= actual) & (actual <= forecast['p90'])).mean())
+        half_widths.append(((forecast['p90'] - forecast['p10']) / 2).mean())
+    return float(np.mean(covered)), float(np.mean(half_widths))
+
+def run(n_series: int = 2000, n_periods: int = 48, n_paths: int = 1000, workers: int = 2) -> int:
+    base, resid, factors = make_panel(n_series, n_periods)
+    failures = []
+
+    sample = slice(0, 20)
+    start = time.perf_counter()
+    reference = loop_quantiles(base[sample], resid[sample], factors[sample], n_paths)
+    loop = (time.perf_counter() - start) * n_series / 20
+    start = time.perf_counter()
+    bands = simulate_quantiles(base, resid, factors, n_paths=n_paths)
+    vectorized = time.perf_counter() - start
+    print(f"{n_series:,} series x {n_paths:,} paths x 12 periods: "
+          f"Python loop ~{loop:.1f}s (extrapolated), vectorized {vectorized:.2f}s")
+    # Different draws, same distribution: quantiles agree to Monte Carlo noise
+    spread = reference[2] - reference[0]
+    if np.abs(bands[:, sample] - reference).mean() > 0.05 * spread.mean():
+        failures.append("vectorized quantiles disagree with the loop reference")
+
+    for max_bytes in (None, 16 * 2**20, 2 * 2**20):
+        peak = peak_bytes(lambda: simulate_quantiles(base, resid, factors, n_paths=n_paths, max_bytes=max_bytes))
+        label = "unchunked" if max_bytes is None else f"{max_bytes // 2**20}MiB chunks"
+        print(f"{label:>14}: peak {peak / 2**20:7.1f}MiB")
+    # A fixed seed gives the same bands whatever the chunk size
+    if not all(
+        np.array_equal(bands, simulate_quantiles(base, resid, factors, n_paths=n_paths, max_bytes=max_bytes))
+        for max_bytes in (16 * 2**20, 2 * 2**20)
+    ):
+        failures.append("simulation depends on the chunk size for a fixed seed")
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        start = time.perf_counter()
+        pooled = simulate_quantiles(base, resid, factors, n_paths=n_paths, max_bytes=8 * 2**20, pool=pool)
+        print(f"process pool ({workers} workers): {time.perf_counter() - start:.2f}s")
+    if not np.array_equal(pooled, simulate_quantiles(base, resid, factors, n_paths=n_paths, max_bytes=8 * 2**20)):
+        failures.append("pooled simulation differs from the in-process one")
+
+    coverage = check_calibration()
+    print(f"P10-P90 coverage of held-out actuals: {coverage:.1%} (nominal 80%)")
+    if not 0.7 <= coverage <= 0.9:
+        failures.append(f"P10-P90 coverage {coverage:.1%} is far from 80%")
+
+    # Noise of sd 80 needs a P10-P90 half-width of at least 1.28 * 80
+    coverage, half_width = check_single_series()
+    print(f"single series, noise sd 80: coverage {coverage:.1%}, mean half-width {half_width:.0f}")
+    if not 0.7 <= coverage <= 0.9 or half_width < 1.28 * 80:
+        failures.append(f"single-series bands (coverage {coverage:.1%}, half-width {half_width:.0f}) are miscalibrated")
+
+    for failure in failures:
+        print(f"FAILED {failure}")
+    print("Interval checks passed." if not failures else f"{len(failures)} failure(s).")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(run())
@@ -0,0 +1,60 @@
+# src/benchmarks/bench_plot.py
+
+import io
+import time
+import numpy as np
+import pandas as pd
+from src import utils
+from src.ai_agent import forecast_dates
+from src.utils import expense_figure, merge_historical_and_forecast
+
+def make_combined(n_points: int, periods: int = 12, seed: int = 0) -> pd.DataFrame:
+    """History of n_points minutes of expenses plus a monthly forecast."""
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range('2000-01-01', periods=n_points, freq='min')
+    history = pd.DataFrame({"date": dates, "expense": rng.gamma(2.0, 50.0, n_points)})
+    forecast = pd.DataFrame({
+        "date": forecast_dates(dates[-1], periods, 'M'),
+        "predicted_expense": rng.gamma(2.0, 50.0, periods),
+    })
+    return merge_historical_and_forecast(history, forecast)
+
+def matplotlib_render(df: pd.DataFrame) -> None:
+    """The previous plot_expenses path: seaborn line plot rasterized to PNG."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    plt.figure(figsize=(10, 5))
+    sns.lineplot(x='date', y=df.columns[1], data=df, marker='o')
+    plt.xticks(rotation=45)
+    plt.tight_layout()
+    plt.savefig(io.BytesIO(), format='png')
+    plt.close('all')
+
+def plotly_render(df: pd.DataFrame) -> None:
+    """Figure construction plus the JSON Streamlit ships to the browser."""
+    expense_figure(df, title="Benchmark").to_json()
+
+def timed(fn, df) -> float:
+    start = time.perf_counter()
+    fn(df)
+    return time.perf_counter() - start
+
+def run(sizes: tuple = (1_000, 100_000, 1_000_000), matplotlib_limit: int = 100_000) -> None:
+    # Warm up imports so the first row measures rendering only
+    warmup = make_combined(10)
+    matplotlib_render(warmup)
+    plotly_render(warmup)
+    print(f"{'points':>9} {'matplotlib':>11} {'plotly+lttb':>12} {'plotly cached':>14}")
+    for n_points in sizes:
+        df = make_combined(n_points)
+        old = f"{timed(matplotlib_render, df) * 1000:9.0f}ms" if n_points <= matplotlib_limit else f"{'skipped':>11}"
+        utils._figure_cache.clear()
+        cold = timed(plotly_render, df)
+        warm = timed(plotly_render, df)
+        print(f"{n_points:>9} {old} {cold * 1000:10.0f}ms {warm * 1000:12.0f}ms")
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,78 @@
+# src/benchmarks/bench_rollup.py
+
+import sys
+import time
+import numpy as np
+import pandas as pd
+from src.clean_data import aggregate_expenses
+from src.decomposition import resample_expenses
+from src.rollup import Rollup
+
+FREQS = ('D', 'W', 'M', 'Q', 'Y')
+
+def make_transactions(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    """Synthetic cleaned transactions spread over 2000-2024."""
+    rng = np.random.default_rng(seed)
+    start, end = np.datetime64('2000-01-01', 's').astype(np.int64), np.datetime64('2024-12-31', 's').astype(np.int64)
+    seconds = np.sort(rng.integers(start, end, n_rows))
+    return pd.DataFrame({
+        "date": seconds.astype('datetime64[s]').astype('datetime64[ns]'),
+        "expense": np.round(rng.gamma(2.0, 40.0, n_rows), 2),
+    })
+
+def best_of(fn, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def check(df: pd.DataFrame, rollup: Rollup) -> list:
+    """Compare every rollup level with resampling the raw rows; returns failures."""
+    failures = []
+    for freq in FREQS:
+        expected = aggregate_expenses(df, freq=freq)
+        result = rollup.query(freq)
+        if not (result['date'].equals(expected['date']) and np.allclose(result['expense'], expected['expense'], rtol=1e-9, atol=1e-6)):
+            failures.append(f"query freq={freq}")
+        series, expected_series = rollup.series(freq), resample_expenses(df, freq)
+        if not (series.index.equals(expected_series.index) and series.index.freq == expected_series.index.freq):
+            failures.append(f"series index freq={freq}")
+
+    # A date range selects the periods whose labels fall inside it
+    start, end = pd.Timestamp('2010-03-15'), pd.Timestamp('2012-07-31')
+    expected = aggregate_expenses(df, freq='M')
+    expected = expected[(expected['date'] >= start) & (expected['date'] <= end)].reset_index(drop=True)
+    if not rollup.query('M', start, end)['date'].equals(expected['date']):
+        failures.append("date range query")
+
+    counts = rollup.query('Q', counts=True)['count']
+    if counts.sum() != len(df) or not (counts.to_numpy() == df.groupby(pd.Grouper(key='date', freq='Q')).size().to_numpy()).all():
+        failures.append("transaction counts")
+    return failures
+
+def run(n_rows: int = 10_000_000) -> int:
+    df = make_transactions(n_rows)
+    start = time.perf_counter()
+    rollup = Rollup.from_transactions(df)
+    build = time.perf_counter() - start
+    print(f"{n_rows:,} transactions, rollup built in {build:.2f}s")
+
+    print(f"{'freq':>5} {'resample':>10} {'first query':>12} {'query':>10}")
+    for freq in FREQS:
+        resample = best_of(lambda: aggregate_expenses(df, freq=freq), 1)
+        start = time.perf_counter()
+        rollup.query(freq)
+        first = time.perf_counter() - start
+        query = best_of(lambda: rollup.query(freq), 200)
+        print(f"{freq:>5} {resample * 1000:8.1f}ms {first * 1000:10.3f}ms {query * 1000:8.3f}ms")
+
+    failures = check(df, rollup)
+    for failure in failures:
+        print(f"MISMATCH {failure}")
+    print("Rollup levels match resampling the raw rows." if not failures else f"{len(failures)} mismatch(es).")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(run())
@@ -0,0 +1,106 @@
+# src/benchmarks/bench_streaming.py
+
+import os
+import sys
+import tempfile
+
+# Point the agent at a throwaway response cache before any src module reads its settings
+os.environ.setdefault("GEMINI_API_KEY", "local-stub")
+os.environ.setdefault("LLM_CACHE_PATH", os.path.join(tempfile.mkdtemp(), "llm_cache.sqlite3"))
+
+import json
+import time
+import pandas as pd
+from src import ai_agent
+from src.gemini_client import GeminiClient
+from src.streaming import JSONFieldParser
+from src.benchmarks.stub_llm_server import start_stub_server
+
+def forecast_text(periods: int) -> str:
+    """Stub completion with one forecast line per period."""
+    dates = pd.date_range('2024-01-31', periods=periods, freq='ME').strftime('%Y-%m-%d')
+    return "\n".join(f"{date}: {100.0 + i * 2.5}" for i, date in enumerate(dates))
+
+def breakdown_json(n_categories: int) -> str:
+    """Stub structured answer shaped like app.py's response schema."""
+    return json.dumps({
+        "expense_breakdown": [
+            {"category": f"Category {i}", "justification": f"Stable baseline with a mild seasonal swing ({i})."}
+            for i in range(n_categories)
+        ],
+        "key_insights": "Spending is steady with a recurring year-end peak.",
+    }, indent=2)
+
+def history(n_months: int = 36) -> pd.DataFrame:
+    dates = pd.date_range('2021-01-31', periods=n_months, freq='ME')
+    return pd.DataFrame({"date": dates, "expense": [1000.0 + 10 * i for i in range(n_months)]})
+
+def check_forecast(url: str, periods: int) -> list:
+    """Compare the streamed forecast with the blocking one; returns failures."""
+    os.environ["GEMINI_API_URL"] = url
+    ai_agent._load_settings(dotenv=False)
+    df = history()
+
+    start = time.perf_counter()
+    blocking = ai_agent.get_ai_forecast(df, periods, 'M', use_cache=False)
+    blocking_seconds = time.perf_counter() - start
+
+    updates = []
+    start = time.perf_counter()
+    streamed = ai_agent.stream_ai_forecast(df, periods, 'M', on_update=lambda frame: updates.append(len(frame)), use_cache=False)
+    streamed_seconds = time.perf_counter() - start
+    first_value = streamed.attrs['time_to_first_value']
+
+    print(f"forecast lines : blocking {blocking_seconds:.2f}s | streamed first value {first_value:.2f}s, "
+          f"all {streamed_seconds:.2f}s over {len(updates)} updates")
+    failures = []
+    if not streamed.equals(blocking) or len(streamed) != periods:
+        failures.append("streamed forecast differs from the blocking forecast")
+    if updates != sorted(updates) or updates[-1] != periods:
+        failures.append(f"updates did not grow to the full forecast: {updates}")
+    if first_value >= streamed_seconds / 2:
+        failures.append("first value did not arrive early")
+    return failures
+
+def check_json(url: str, text: str) -> list:
+    """Parse a streamed structured answer field by field; returns failures."""
+    client = GeminiClient(rate=1e6)
+    parser = JSONFieldParser(array_fields=("expense_breakdown",), fields=("key_insights",))
+    events, first_value = [], None
+    start = time.perf_counter()
+    for chunk in client.post_stream(f"{url}model:streamGenerateContent?alt=sse", {"contents": []}):
+        for event in parser.feed(chunk):
+            first_value = first_value if first_value is not None else time.perf_counter() - start
+            events.append(event)
+    total = time.perf_counter() - start
+    client.close()
+
+    expected = json.loads(text)
+    print(f"JSON fields    : first field {first_value:.2f}s, all {total:.2f}s, {len(events)} fields")
+    failures = []
+    if parser.result() != expected:
+        failures.append("streamed JSON differs from the stub's document")
+    if [value for name, value in events if name == "expense_breakdown"] != expected["expense_breakdown"]:
+        failures.append("breakdown items were not all emitted in order")
+    if ("key_insights", expected["key_insights"]) not in events:
+        failures.append("key insights were not emitted")
+    return failures
+
+def run(periods: int = 12, chunk_size: int = 12, chunk_delay: float = 0.02) -> int:
+    text = forecast_text(periods)
+    server = start_stub_server(text=text, chunk_size=chunk_size, chunk_delay=chunk_delay)
+    failures = check_forecast(f"http://127.0.0.1:{server.server_port}/", periods)
+    server.shutdown()
+
+    text = breakdown_json(8)
+    server = start_stub_server(text=text, chunk_size=chunk_size * 4, chunk_delay=chunk_delay)
+    failures += check_json(f"http://127.0.0.1:{server.server_port}/", text)
+    server.shutdown()
+
+    for failure in failures:
+        print(f"FAILED {failure}")
+    print("Streaming results match." if not failures else f"{len(failures)} failure(s).")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(run())
@@ -0,0 +1,92 @@
+# src/benchmarks/load_test_service.py
+
+import os
+import tempfile
+
+# Point the agent at the local stub and a throwaway response cache before
+# any src module reads its settings
+os.environ.setdefault("GEMINI_API_KEY", "local-stub")
+os.environ.setdefault("LLM_CACHE_PATH", os.path.join(tempfile.mkdtemp(), "llm_cache.sqlite3"))
+
+import asyncio
+import socket
+import threading
+import time
+import numpy as np
+import pandas as pd
+from src.gemini_client import GeminiClient
+from src.benchmarks.stub_llm_server import start_stub_server
+
+def make_ledgers(n_ledgers: int, n_months: int = 36, seed: int = 0) -> list:
+    """Distinct synthetic ledgers as CSV text."""
+    rng = np.random.default_rng(seed)
+    ledgers = []
+    for _ in range(n_ledgers):
+        dates = pd.date_range('2021-01-01', periods=n_months * 30, freq='D')
+        df = pd.DataFrame({"date": dates.strftime('%Y-%m-%d'), "expense": rng.uniform(5, 100, len(dates)).round(2)})
+        ledgers.append(df.to_csv(index=False))
+    return ledgers
+
+def batch_text(max_batch: int, periods: int) -> str:
+    """Stub answer covering every label a batched prompt can use."""
+    dates = pd.date_range('2024-01-31', periods=periods, freq='ME').strftime('%Y-%m-%d')
+    return "\n".join(f"S{i} | {date}: {100.0 + i}" for i in range(1, max_batch + 1) for date in dates)
+
+def start_service(window: float, max_batch: int) -> tuple:
+    """Run the service with uvicorn in a daemon thread; returns (server, url)."""
+    import uvicorn
+    from src.service import ForecastService, create_app
+
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    app = create_app(ForecastService(window=window, max_batch=max_batch))
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return server, f"http://127.0.0.1:{port}"
+
+async def fire(url: str, payloads: list, concurrency: int) -> tuple:
+    client = GeminiClient(rate=1e6, max_in_flight=concurrency, max_retries=1, timeout=60)
+    latencies = []
+
+    async def one(payload):
+        start = time.perf_counter()
+        try:
+            await client.apost_json(url, payload)
+        except Exception:
+            return False
+        latencies.append(time.perf_counter() - start)
+        return True
+
+    start = time.perf_counter()
+    ok = await asyncio.gather(*(one(payload) for payload in payloads))
+    elapsed = time.perf_counter() - start
+    client.close()
+    return np.array(latencies), elapsed, ok.count(False)
+
+def run(n_requests: int = 300, n_ledgers: int = 60, concurrency: int = 32, llm_delay: float = 0.2, window: float = 0.01, max_batch: int = 64) -> None:
+    periods = 3
+    stub = start_stub_server(delay=llm_delay, text=batch_text(max_batch, periods))
+    os.environ.setdefault("GEMINI_API_URL", f"http://127.0.0.1:{stub.server_port}/")
+    server, url = start_service(window, max_batch)
+
+    ledgers = make_ledgers(n_ledgers)
+    rng = np.random.default_rng(1)
+    for engine in ('mean', 'llm'):
+        payloads = [{"csv": ledgers[i], "periods": periods, "engine": engine} for i in rng.integers(0, n_ledgers, n_requests)]
+        latencies, elapsed, failures = asyncio.run(fire(f"{url}/forecast", payloads, concurrency))
+        print(
+            f"{engine:>5}: {len(latencies) / elapsed:8.1f} req/s  "
+            f"p50 {np.percentile(latencies, 50) * 1000:7.1f}ms  p99 {np.percentile(latencies, 99) * 1000:7.1f}ms  "
+            f"({failures} failed)"
+        )
+
+    import requests
+    print("service stats:", requests.get(f"{url}/stats", timeout=5).json())
+    server.should_exit = True
+    stub.shutdown()
+
+if __name__ == "__main__":
+    run()
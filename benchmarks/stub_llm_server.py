@@ -0,0 +1,103 @@
+# src/benchmarks/stub_llm_server.py
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class StubLLMHandler(BaseHTTPRequestHandler):
+    """
+    Answers any POST like both Gemini endpoints used by the app: a
+    'choices' text completion and a 'candidates' generateContent body.
+    Streaming requests (a ':streamGenerateContent' path or "stream": true
+    in the body) get the text as chunked server-sent events instead,
+    chunk_size characters per event, chunk_delay seconds apart. The first
+    fail_first requests are answered with a 503.
+    """
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    delay = 0.0
+    chunk_size = 16
+    chunk_delay = 0.0
+    fail_first = 0
+    failed = [0]
+    lock = threading.Lock()
+    text = "2024-01-31: 100.0\n2024-02-29: 110.0\n2024-03-31: 120.0"
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = self.rfile.read(length)
+        if self.delay:
+            time.sleep(self.delay)
+        with self.lock:
+            failing = self.failed[0] < self.fail_first
+            self.failed[0] += failing
+        if failing:
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if "streamGenerateContent" in self.path or json.loads(request or b"{}").get("stream"):
+            self._stream()
+            return
+        # A blocking answer takes as long to generate as the whole stream
+        if self.chunk_delay:
+            time.sleep(self.chunk_delay * ((len(self.text) - 1) // self.chunk_size))
+        body = json.dumps(self._result(self.text)).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    @staticmethod
+    def _result(text: str) -> dict:
+        return {
+            "choices": [{"text": text}],
+            "candidates": [{"content": {"parts": [{"text": text}]}}],
+        }
+
+    def _stream(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for start in range(0, len(self.text), self.chunk_size):
+            if start and self.chunk_delay:
+                time.sleep(self.chunk_delay)
+            event = f"data: {json.dumps(self._result(self.text[start:start + self.chunk_size]))}\n\n".encode()
+            self.wfile.write(f"{len(event):X}\r\n".encode() + event + b"\r\n")
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+    def log_message(self, format, *args):
+        pass
+
+def start_stub_server(
+    delay: float = 0.0,
+    text: str = None,
+    port: int = 0,
+    chunk_size: int = 16,
+    chunk_delay: float = 0.0,
+    fail_first: int = 0
+) -> ThreadingHTTPServer:
+    """
+    Start the stub on localhost in a daemon thread; the URL is
+    f"http://127.0.0.1:{server.server_port}/". Call server.shutdown() to stop.
+    """
+    attrs = {
+        "delay": delay, "chunk_size": chunk_size, "chunk_delay": chunk_delay,
+        "fail_first": fail_first, "failed": [0], "lock": threading.Lock(),
+    }
+    if text is not None:
+        attrs["text"] = text
+    handler = type("ConfiguredStubLLMHandler", (StubLLMHandler,), attrs)
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+if __name__ == "__main__":
+    server = start_stub_server(port=8765)
+    print(f"Stub LLM listening on http://127.0.0.1:{server.server_port}/")
+    threading.Event().wait()
@@ -0,0 +1,153 @@
+# src/breakdown.py
+
+import io
+import numpy as np
+import pandas as pd
+from src.forecast import forecast_aggregated_batch
+from src.anomalies import screen_panel
+from src.prompt_budget import estimate_tokens, fit_recent_lines
+
+# Series id of the overall total, forecast alongside the categories
+TOTAL_SERIES = "__total__"
+
+def load_transactions(csv_text: str) -> pd.DataFrame:
+    """
+    Parse a pasted 'Date,Category,Amount' CSV into 'date', 'category' and
+    'expense' columns, dropping rows whose date or amount cannot be parsed.
+    """
+    df = pd.read_csv(io.StringIO(csv_text.strip()))
+    missing = {'Date', 'Category', 'Amount'} - set(df.columns)
+    if missing:
+        raise ValueError(f"CSV must have {', '.join(sorted(missing))} column(s)")
+    df = pd.DataFrame({
+        "date": pd.to_datetime(df['Date'], errors='coerce'),
+        "category": df['Category'].astype(str).str.strip(),
+        "expense": pd.to_numeric(df['Amount'], errors='coerce'),
+    })
+    return df.dropna(subset=['date', 'expense'])
+
+def pivot_categories(df: pd.DataFrame, freq: str = 'M') -> pd.DataFrame:
+    """
+    Per-category period totals as a wide frame (periods x categories).
+    Every category spans the whole ledger range, with zeros in periods
+    where it has no transactions.
+    """
+    sums = df.groupby([pd.Grouper(key='date', freq=freq), 'category'])['expense'].sum()
+    wide = sums.unstack('category', fill_value=0.0)
+    wide = wide.reindex(pd.date_range(wide.index.min(), wide.index.max(), freq=freq), fill_value=0.0)
+    wide.index.name = 'date'
+    wide.columns.name = None
+    return wide
+
+def reconcile(bottom: np.ndarray, total: np.ndarray, method: str = 'proportional') -> tuple:
+    """
+    Make category forecasts add up to the total in every period.
+
+    Args:
+        bottom: Category forecasts, shape (n_categories, n_periods).
+        total: Total forecast, shape (n_periods,).
+        method: 'proportional' scales categories to the total forecast
+            (keeps their shares and signs); 'ols' projects both levels
+            onto the coherent forecasts closest in least squares, moving
+            every category by (total - sum) / (n_categories + 1);
+            'bottom_up' replaces the total by the sum of categories.
+
+    Returns:
+        (reconciled bottom, reconciled total)
+    """
+    bottom = np.asarray(bottom, dtype=float)
+    total = np.asarray(total, dtype=float)
+    bottom_sum = bottom.sum(axis=0)
+    if method == 'bottom_up':
+        return bottom, bottom_sum
+    if method == 'ols':
+        bottom = bottom + (total - bottom_sum) / (len(bottom) + 1)
+        return bottom, bottom.sum(axis=0)
+    if method == 'proportional':
+        with np.errstate(divide='ignore', invalid='ignore'):
+            shares = np.where(bottom_sum != 0, bottom / bottom_sum, 1.0 / len(bottom))
+        return shares * total, total
+    raise ValueError(f"Unknown reconciliation method: {method}")
+
+def forecast_breakdown(
+    df: pd.DataFrame,
+    periods: int = 1,
+    freq: str = 'M',
+    engine: str = 'mean',
+    method: str = 'proportional',
+    cap_anomalies: bool = False
+) -> dict:
+    """
+    Forecast every category and the overall total in one vectorized pass,
+    then reconcile the categories to the total. Spikes in any category or
+    in the total are flagged first, and capped before forecasting when
+    cap_anomalies is set (months without transactions are zero-filled, so
+    dips are not flagged).
+
+    Args:
+        df: Transactions with 'date', 'category' and 'expense' columns.
+        periods: Number of future periods to predict.
+        freq: Aggregation frequency ('M' monthly, 'Q' quarterly).
+        engine: 'mean' or 'ets', as in forecast_expenses_batch.
+        method: Reconciliation method, see reconcile.
+        cap_anomalies: Forecast from capped anomalies instead of the
+            recorded amounts.
+
+    Returns:
+        Dict with 'history' (periods x categories aggregates, as recorded),
+        'forecast' (future periods x categories, reconciled), 'total'
+        (Series of the reconciled total per future period), 'anomalies'
+        (flagged periods, see screen_panel) and whether they were
+        'capped'.
+    """
+    wide = pivot_categories(df, freq=freq)
+    panel, anomalies = screen_panel(wide.assign(**{TOTAL_SERIES: wide.sum(axis=1)}), cap=cap_anomalies, side='upper', freq=freq)
+    long_df = panel.stack().rename('expense').reset_index().rename(columns={'level_1': 'category'})
+    predicted = forecast_aggregated_batch(long_df, periods=periods, freq=freq, series_col='category', engine=engine)
+    predicted = predicted.pivot(index='category', columns='date', values='predicted_expense')
+
+    categories = list(wide.columns)
+    bottom, total = reconcile(predicted.loc[categories].to_numpy(), predicted.loc[TOTAL_SERIES].to_numpy(), method)
+    dates = pd.DatetimeIndex(predicted.columns, name='date')
+    return {
+        "history": wide,
+        "forecast": pd.DataFrame(bottom.T, index=dates, columns=categories),
+        "total": pd.Series(total, index=dates, name='total'),
+        "anomalies": anomalies.rename(columns={'series': 'category'}),
+        "capped": cap_anomalies,
+    }
+
+def anomaly_table(anomalies: pd.DataFrame) -> str:
+    """
+    Compact CSV of flagged periods for an LLM prompt; the overall total is
+    labeled 'Total'.
+    """
+    table = pd.DataFrame({
+        "Period": anomalies['date'].dt.strftime('%Y-%m'),
+        "Category": anomalies['category'].replace({TOTAL_SERIES: 'Total'}),
+        "Amount": anomalies['expense'].round(2),
+        "Typical": anomalies['expected'].round(2),
+    })
+    return table.to_csv(index=False).strip()
+
+def aggregate_table(wide: pd.DataFrame, token_budget: int = None) -> str:
+    """
+    Compact CSV of a periods x categories table for an LLM prompt. Past
+    token_budget, the most recent periods stay as they are and older ones
+    are rolled up to yearly totals.
+    """
+    def render(frame: pd.DataFrame, labels: pd.Index) -> pd.Series:
+        values = frame.round(2).astype(str)
+        return pd.Series(labels.astype(str), index=frame.index).str.cat([values[c] for c in values.columns], sep=",")
+
+    header = "Period," + ",".join(map(str, wide.columns))
+    lines = render(wide, wide.index.strftime('%Y-%m'))
+    text = header + "\n" + "\n".join(lines)
+    if token_budget is None or estimate_tokens(text) <= token_budget:
+        return text
+
+    keep = max(fit_recent_lines(lines, token_budget * 2 // 3), 1)
+    older = wide.iloc[:-keep]
+    yearly = older.groupby(older.index.year).sum()
+    yearly_lines = render(yearly, yearly.index.astype(str) + " (year)")
+    return header + "\n" + "\n".join(pd.concat([yearly_lines, lines.iloc[-keep:]]))
@@ -0,0 +1,178 @@
+# src/cache.py
+
+import hashlib
+import io
+import os
+import pandas as pd
+from src.clean_data import load_data, clean_data, aggregate_expenses
+
+DEFAULT_CACHE_DIR = os.getenv("EXPENSE_CACHE_DIR", ".expense_cache")
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+def content_hash(source) -> str:
+    """
+    SHA-256 of a CSV source: a file path, raw bytes, or a file-like object
+    (such as a Streamlit upload), which is rewound afterwards.
+    """
+    digest = hashlib.sha256()
+    if isinstance(source, (bytes, bytearray)):
+        digest.update(source)
+    elif hasattr(source, 'read'):
+        position = source.tell() if hasattr(source, 'tell') else None
+        while True:
+            block = source.read(1 << 20)
+            if not block:
+                break
+            digest.update(block if isinstance(block, bytes) else block.encode())
+        if position is not None:
+            source.seek(position)
+    else:
+        with open(source, 'rb') as fh:
+            for block in iter(lambda: fh.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+def _parquet_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+class DataCache:
+    """
+    Content-addressed on-disk cache of cleaned and aggregated expense frames.
+
+    Cleaned frames are keyed by the CSV content hash and aggregates by
+    content hash plus frequency. Frames are stored as Parquet (pickle when
+    pyarrow is missing); the least recently used files are evicted once the
+    cache grows past max_bytes.
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.suffix = '.parquet' if _parquet_available() else '.pkl'
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def load(self, source, freq: str = 'M') -> tuple:
+        """
+        Return (cleaned, aggregated) frames for a CSV source, loading and
+        cleaning it only when no cached copy exists for its content.
+        """
+        key = content_hash(source)
+        return self.clean(source, key=key), self.aggregate(source, freq=freq, key=key)
+
+    def clean(self, source, key: str = None) -> pd.DataFrame:
+        """
+        Cleaned frame of a CSV source, loaded and cleaned only on a miss;
+        key is its content hash when the caller already has it.
+        """
+        key = key or content_hash(source)
+        clean_df = self._read(f"{key}.clean")
+        if clean_df is None:
+            if isinstance(source, (bytes, bytearray)):
+                source = io.BytesIO(source)
+            clean_df = clean_data(load_data(source))
+            self._write(f"{key}.clean", clean_df)
+            self._evict()
+        return clean_df
+
+    def aggregate(self, source, freq: str = 'M', key: str = None) -> pd.DataFrame:
+        """
+        Aggregate of a CSV source at freq; the cleaned frame is only read
+        (or built) when the aggregate is not cached yet.
+        """
+        key = key or content_hash(source)
+        agg_df = self._read(f"{key}.{freq}.agg")
+        if agg_df is None:
+            agg_df = aggregate_expenses(self.clean(source, key=key), freq=freq)
+            self._write(f"{key}.{freq}.agg", agg_df)
+            self._evict()
+        return agg_df
+
+    def entries(self) -> pd.DataFrame:
+        """
+        List cache entries with their key, kind, frequency, size and last use,
+        most recently used first.
+        """
+        rows = []
+        for name in os.listdir(self.cache_dir):
+            stem, ext = os.path.splitext(name)
+            if ext not in ('.parquet', '.pkl'):
+                continue
+            parts = stem.split('.')
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                # Evicted by another process sharing the directory
+                continue
+            rows.append({
+                "key": parts[0],
+                "kind": parts[-1],
+                "freq": parts[1] if len(parts) == 3 else None,
+                "bytes": stat.st_size,
+                "last_used": pd.Timestamp(stat.st_mtime, unit='s'),
+                "file": name,
+            })
+        columns = ["key", "kind", "freq", "bytes", "last_used", "file"]
+        return pd.DataFrame(rows, columns=columns).sort_values('last_used', ascending=False).reset_index(drop=True)
+
+    def purge(self, key: str = None) -> int:
+        """
+        Delete every entry for the given content hash, or all entries when
+        key is None. Returns the number of files removed.
+        """
+        removed = 0
+        for name in self.entries()['file']:
+            if key is None or name.startswith(f"{key}."):
+                os.remove(os.path.join(self.cache_dir, name))
+                removed += 1
+        return removed
+
+    def _path(self, stem: str) -> str:
+        return os.path.join(self.cache_dir, stem + self.suffix)
+
+    def _read(self, stem: str):
+        path = self._path(stem)
+        try:
+            # Touch on hit so eviction drops the least recently used files first
+            os.utime(path, None)
+            if self.suffix == '.parquet':
+                return pd.read_parquet(path)
+            return pd.read_pickle(path)
+        except FileNotFoundError:
+            return None
+
+    def _write(self, stem: str, df: pd.DataFrame) -> None:
+        path = self._path(stem)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            if self.suffix == '.parquet':
+                df.to_parquet(tmp_path, index=False)
+            else:
+                df.to_pickle(tmp_path)
+        except (ValueError, TypeError):
+            # Columns Parquet cannot store (e.g. mixed types) are not cached
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        os.replace(tmp_path, path)
+
+    def _evict(self) -> None:
+        entries = self.entries()
+        total = entries['bytes'].sum()
+        for _, entry in entries.iloc[::-1].iterrows():
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, entry['file']))
+            except FileNotFoundError:
+                pass
+            total -= entry['bytes']
+
+def load_cached(source, freq: str = 'M', cache_dir: str = DEFAULT_CACHE_DIR) -> tuple:
+    """
+    Shortcut for DataCache(cache_dir).load(source, freq).
+    """
+    return DataCache(cache_dir).load(source, freq=freq)
@@ -1,26 +1,75 @@
 # src/clean_data.py
 
 import pandas as pd
+import numpy as np
+from src.instrument import instrumented
+from src.rollup import Rollup
 
-def load_data(filepath: str) -> pd.DataFrame:
+# Columns read as pandas categoricals in compact mode
+CATEGORICAL_COLUMNS = ('category', 'account', 'series')
+
+@instrumented()
+def load_data(filepath: str, compact: bool = False) -> pd.DataFrame:
     """
     Load expense data from CSV.
     Expected columns: 'date' and 'expense' (or similar).
+    compact: read category/account/series columns straight into
+    categoricals instead of Python strings.
     """
-    df = pd.read_csv(filepath)
-    return df
+    if not compact:
+        return pd.read_csv(filepath)
 
-def clean_data(df: pd.DataFrame) -> pd.DataFrame:
+    position = filepath.tell() if hasattr(filepath, 'tell') else None
+    header = pd.read_csv(filepath, nrows=0).columns
+    if position is not None:
+        filepath.seek(position)
+    dtype = {col: 'category' for col in header if col.lower() in CATEGORICAL_COLUMNS}
+    return pd.read_csv(filepath, dtype=dtype)
+
+def iter_data_chunks(filepath: str, chunksize: int = 100_000, engine: str = None):
+    """
+    Read expense data from CSV in chunks of roughly chunksize rows.
+    engine: None for the pandas C parser, or 'pyarrow' to stream record
+    batches with pyarrow (filepath must then be a path).
+    """
+    if engine != 'pyarrow':
+        yield from pd.read_csv(filepath, chunksize=chunksize)
+        return
+
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+
+    # Read every column as text so a bad value in a later block cannot
+    # break the type inferred from the first one; clean_data parses them
+    names = pacsv.open_csv(filepath).schema.names
+    reader = pacsv.open_csv(
+        filepath,
+        read_options=pacsv.ReadOptions(block_size=max(chunksize * 64, 1 << 20)),
+        convert_options=pacsv.ConvertOptions(column_types={name: pa.string() for name in names}),
+    )
+    for batch in reader:
+        yield batch.to_pandas()
+
+@instrumented()
+def clean_data(df: pd.DataFrame, report: dict = None, compact: bool = False) -> pd.DataFrame:
     """
     Clean raw data:
     - Parse dates
     - Drop rows with missing values
     - Rename columns if necessary
+    If report is given, row counts are added to its 'rows_read',
+    'rows_kept', 'dropped_bad_date' and 'dropped_bad_expense' entries.
+    compact: keep the same rows with narrower dtypes (see _clean_compact).
     """
+    if compact:
+        return _clean_compact(df, report)
+
     # Ensure 'date' column exists and parse to datetime
     if 'date' not in df.columns:
         raise ValueError("CSV must have a 'date' column")
     df['date'] = pd.to_datetime(df['date'], errors='coerce')
+    rows_read = len(df)
+    bad_dates = int(df['date'].isna().sum())
 
     # Ensure 'expense' column exists
     if 'expense' not in df.columns:
@@ -38,15 +87,226 @@ def clean_data(df: pd.DataFrame) -> pd.DataFrame:
     df['expense'] = pd.to_numeric(df['expense'], errors='coerce')
     df = df.dropna(subset=['expense'])
 
+    if report is not None:
+        report['rows_read'] = report.get('rows_read', 0) + rows_read
+        report['rows_kept'] = report.get('rows_kept', 0) + len(df)
+        report['dropped_bad_date'] = report.get('dropped_bad_date', 0) + bad_dates
+        report['dropped_bad_expense'] = report.get('dropped_bad_expense', 0) + rows_read - bad_dates - len(df)
+
     return df
 
-def aggregate_expenses(df: pd.DataFrame, freq: str = 'M') -> pd.DataFrame:
+def _clean_compact(df: pd.DataFrame, report: dict = None) -> pd.DataFrame:
+    """
+    clean_data in compact mode: dates and amounts are parsed once, rows are
+    filtered with a single mask (skipped when nothing is dropped), expense
+    becomes float32 when that is lossless at cent precision, and repetitive
+    text columns become categoricals. The input frame is not modified.
+    """
+    if 'date' not in df.columns:
+        raise ValueError("CSV must have a 'date' column")
+    expense_col = 'expense' if 'expense' in df.columns else next((col for col in df.columns if 'expense' in col.lower()), None)
+    if expense_col is None:
+        raise ValueError("CSV must have an 'expense' column")
+
+    dates = pd.to_datetime(df['date'], errors='coerce')
+    expense = pd.to_numeric(df[expense_col], errors='coerce')
+    keep = dates.notna().to_numpy() & expense.notna().to_numpy()
+
+    columns = {}
+    for col in df.columns:
+        if col == 'date':
+            columns[col] = dates
+        elif col == expense_col:
+            columns['expense'] = _narrow_expense(expense)
+        elif df[col].dtype == object and df[col].nunique() <= len(df) // 2:
+            columns[col] = df[col].astype('category')
+        else:
+            columns[col] = df[col]
+    cleaned = pd.DataFrame(columns)
+    if not keep.all():
+        cleaned = cleaned[keep]
+
+    if report is not None:
+        rows_read, bad_dates = len(df), int(dates.isna().sum())
+        report['rows_read'] = report.get('rows_read', 0) + rows_read
+        report['rows_kept'] = report.get('rows_kept', 0) + len(cleaned)
+        report['dropped_bad_date'] = report.get('dropped_bad_date', 0) + bad_dates
+        report['dropped_bad_expense'] = report.get('dropped_bad_expense', 0) + rows_read - bad_dates - len(cleaned)
+    return cleaned
+
+def _narrow_expense(expense: pd.Series) -> pd.Series:
+    """
+    float32 copy of amounts when every value rounds back to itself at cent
+    precision (see _expense_values), otherwise the float64 original.
+    """
+    values = expense.to_numpy(dtype=np.float64)
+    finite = values[np.isfinite(values)]
+    if np.array_equal(np.round(finite.astype(np.float32).astype(np.float64), 2), finite):
+        return expense.astype(np.float32)
+    return expense
+
+def _expense_values(expense: pd.Series) -> np.ndarray:
+    """float64 amounts; float32 compact amounts are restored to whole cents."""
+    values = expense.to_numpy(dtype=np.float64)
+    return np.round(values, 2) if expense.dtype == np.float32 else values
+
+def period_codes(dates: pd.Series, freq: str = 'M') -> np.ndarray:
+    """
+    Integer period ordinals of dates (e.g. months since 1970-01 for 'M').
+    """
+    return dates.dt.to_period(freq).array.asi8
+
+def periods_to_dates(agg_df: pd.DataFrame, freq: str = 'M') -> pd.DataFrame:
+    """
+    Turn a compact aggregate's 'period' codes back into the 'date' labels
+    aggregate_expenses uses (period end dates).
+    """
+    periods = pd.arrays.PeriodArray(agg_df['period'].to_numpy(dtype=np.int64), dtype=pd.PeriodDtype(freq))
+    dates = pd.PeriodIndex(periods).to_timestamp(how='end').normalize()
+    return agg_df.assign(period=dates).rename(columns={'period': 'date'})
+
+def memory_footprint(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Deep memory usage in bytes of the index and every column, with dtypes
+    and a 'total' row.
+    """
+    usage = df.memory_usage(deep=True)
+    report = pd.DataFrame({
+        'dtype': [str(df.index.dtype)] + [str(dtype) for dtype in df.dtypes],
+        'bytes': usage.to_numpy(),
+    }, index=usage.index)
+    report.loc['total'] = ['', int(usage.sum())]
+    return report
+
+def stream_aggregate(
+    filepath: str,
+    freq: str = 'M',
+    chunksize: int = 100_000,
+    engine: str = None,
+    compact: bool = False
+) -> tuple:
+    """
+    Load, clean and aggregate a CSV chunk by chunk.
+    Only one chunk and the running per-period sums are held in memory,
+    so peak memory is bounded by chunksize rather than file size.
+    Returns (aggregated dataframe like aggregate_expenses, report dict of
+    row counts from clean_data). With compact, chunks are cleaned in
+    compact mode and the result has aggregate_expenses' compact columns.
+    """
+    report = {'rows_read': 0, 'rows_kept': 0, 'dropped_bad_date': 0, 'dropped_bad_expense': 0}
+    running = None
+    for chunk in iter_data_chunks(filepath, chunksize=chunksize, engine=engine):
+        chunk = clean_data(chunk, report=report, compact=compact)
+        if compact:
+            agg = aggregate_expenses(chunk, freq=freq, compact=True)
+            sums = pd.Series(agg['expense'].to_numpy(), index=agg['period'].to_numpy(dtype=np.int64))
+        else:
+            sums = chunk.groupby(pd.Grouper(key='date', freq=freq))['expense'].sum()
+        running = sums if running is None else running.add(sums, fill_value=0)
+
+    if compact:
+        if running is None or running.empty:
+            return pd.DataFrame({'period': np.array([], dtype=np.int32), 'expense': []}), report
+        running = running.reindex(np.arange(running.index.min(), running.index.max() + 1), fill_value=0)
+        return pd.DataFrame({'period': running.index.to_numpy().astype(np.int32), 'expense': running.to_numpy()}), report
+
+    if running is None or running.empty:
+        return pd.DataFrame({'date': pd.DatetimeIndex([]), 'expense': []}), report
+
+    # Periods with no transactions sum to zero, like resample does
+    running = running.groupby(level=0).sum()
+    running = running.reindex(pd.date_range(running.index.min(), running.index.max(), freq=freq), fill_value=0)
+    agg_df = running.rename_axis('date').rename('expense').reset_index()
+    return agg_df, report
+
+@instrumented()
+def aggregate_expenses(df: pd.DataFrame, freq: str = 'M', compact: bool = False) -> pd.DataFrame:
     """
     Aggregate expenses by given frequency.
     freq: 'M' for monthly, 'Q' for quarterly, etc.
     Returns dataframe with 'date' and 'expense' aggregated.
+    compact: return int32 'period' codes (see period_codes) instead of
+    'date' timestamps; periods_to_dates converts them back.
+    df may also be a Rollup, which answers from its precomputed levels.
     """
+    if isinstance(df, Rollup):
+        return df.query(freq)
+    if compact:
+        codes = period_codes(df['date'], freq)
+        if len(codes) == 0:
+            return pd.DataFrame({'period': np.array([], dtype=np.int32), 'expense': []})
+        first = codes.min()
+        sums = np.bincount(codes - first, weights=_expense_values(df['expense']))
+        return pd.DataFrame({'period': np.arange(first, first + len(sums), dtype=np.int32), 'expense': sums})
+
     # Set date as index for resampling
     df = df.set_index('date')
     agg_df = df['expense'].resample(freq).sum().reset_index()
     return agg_df
+
+def aggregate_expenses_by_series(
+    df: pd.DataFrame,
+    freq: str = 'M',
+    series_col: str = 'series',
+    compact: bool = False
+) -> pd.DataFrame:
+    """
+    Aggregate expenses by frequency for every series in a long-format frame.
+    Each series is resampled over its own date range, exactly as
+    aggregate_expenses would do for that series on its own.
+    Returns dataframe with series_col, 'date' and 'expense' aggregated.
+    compact: categorical series_col and int32 'period' codes instead of
+    'date' timestamps.
+    """
+    if series_col not in df.columns:
+        raise ValueError(f"CSV must have a '{series_col}' column")
+    if compact:
+        return _aggregate_series_compact(df, freq, series_col)
+    sums = df.groupby([series_col, pd.Grouper(key='date', freq=freq)])['expense'].sum()
+    wide = sums.unstack('date')
+    wide = wide.reindex(columns=pd.date_range(wide.columns.min(), wide.columns.max(), freq=freq))
+
+    # Empty periods inside a series' own range sum to zero, like resample does
+    observed = wide.notna().to_numpy()
+    inside = np.logical_or.accumulate(observed, axis=1) & np.logical_or.accumulate(observed[:, ::-1], axis=1)[:, ::-1]
+    rows, cols = np.nonzero(inside)
+    agg_df = pd.DataFrame({
+        series_col: wide.index.to_numpy()[rows],
+        'date': wide.columns.to_numpy()[cols],
+        'expense': wide.fillna(0).to_numpy()[rows, cols].astype(sums.dtype),
+    })
+    return agg_df
+
+def _aggregate_series_compact(df: pd.DataFrame, freq: str, series_col: str) -> pd.DataFrame:
+    """
+    aggregate_expenses_by_series on integer codes: one bincount over
+    (series code, period code) cells instead of a groupby on timestamps.
+    """
+    series = df[series_col]
+    series = series if isinstance(series.dtype, pd.CategoricalDtype) else series.astype('category')
+    categories = series.cat.categories
+    series_codes = series.cat.codes.to_numpy().astype(np.int64)
+    valid = series_codes >= 0
+    if not valid.any():
+        return pd.DataFrame({
+            series_col: pd.Categorical([], categories=categories),
+            'period': np.array([], dtype=np.int32),
+            'expense': [],
+        })
+
+    codes = period_codes(df['date'], freq)[valid]
+    first = codes.min()
+    width = codes.max() - first + 1
+    cells = series_codes[valid] * width + (codes - first)
+    size = len(categories) * width
+    sums = np.bincount(cells, weights=_expense_values(df['expense'])[valid], minlength=size).reshape(-1, width)
+
+    # Empty periods inside a series' own range sum to zero, like resample does
+    observed = np.bincount(cells, minlength=size).reshape(-1, width) > 0
+    inside = np.logical_or.accumulate(observed, axis=1) & np.logical_or.accumulate(observed[:, ::-1], axis=1)[:, ::-1]
+    rows, cols = np.nonzero(inside)
+    return pd.DataFrame({
+        series_col: pd.Categorical.from_codes(rows, categories=categories),
+        'period': (first + cols).astype(np.int32),
+        'expense': sums[rows, cols],
+    })
@@ -0,0 +1,254 @@
+# src/cli.py
+
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import pandas as pd
+from src.cache import DEFAULT_CACHE_DIR, DataCache
+from src.clean_data import aggregate_expenses_by_series, stream_aggregate
+from src.forecast import forecast_expenses, forecast_aggregated_batch
+
+# Engines with a vectorized multi-series path; 'llm' runs per series
+BATCH_ENGINES = ('mean', 'ets')
+
+SUMMARY_COLUMNS = ['file', 'status', 'series', 'rows', 'source', 'fallbacks', 'seconds', 'error']
+
+def find_inputs(patterns: list) -> list:
+    """
+    Expand directories (every *.csv inside) and glob patterns into a sorted
+    list of CSV paths.
+    """
+    paths = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            paths.update(glob.glob(os.path.join(pattern, '*.csv')))
+        else:
+            paths.update(glob.glob(pattern))
+    return sorted(paths)
+
+def _source(engine: str, forecast_df: pd.DataFrame) -> str:
+    """Where a forecast came from: the engine, or the LLM race provenance."""
+    provenance = forecast_df.attrs.get('provenance')
+    return provenance['source'] if provenance else engine
+
+def forecast_file(
+    path: str,
+    periods: int,
+    freq: str,
+    engine: str,
+    deadline: float,
+    n_paths: int = 0,
+    cache_dir: str = DEFAULT_CACHE_DIR,
+    chunksize: int = None
+) -> tuple:
+    """
+    Clean, aggregate and forecast one ledger CSV with the unchanged
+    single-series pipeline, with P10/P50/P90 bands from n_paths simulated
+    paths when n_paths is positive. Cleaned and aggregated frames come from
+    the content-addressed DataCache in cache_dir, so unchanged files are
+    not parsed again. With chunksize, the file is instead streamed through
+    stream_aggregate in chunks of that many rows, so memory stays bounded
+    for files too large to load whole.
+
+    Returns:
+        (forecast DataFrame with a 'file' column, status dict)
+    """
+    start = time.perf_counter()
+    status = {"file": path, "series": 1, "status": "ok", "error": None, "rows": 0, "fallbacks": 0}
+    try:
+        if chunksize:
+            agg_df, report = stream_aggregate(path, freq=freq, chunksize=chunksize)
+            status["rows"] = report['rows_kept']
+        else:
+            df, agg_df = DataCache(cache_dir).load(path, freq=freq)
+            status["rows"] = len(df)
+        if status["rows"] == 0 or agg_df.empty:
+            status["series"] = 0
+            raise ValueError("no valid date/expense rows left after cleaning")
+        forecast_df = forecast_expenses(agg_df, periods=periods, freq=freq, deadline=deadline, engine=engine, intervals=n_paths > 0, n_paths=n_paths)
+        status["source"] = _source(engine, forecast_df)
+        status["fallbacks"] = int(engine == 'llm' and status["source"] == 'offline')
+        forecast_df = forecast_df.assign(file=path)
+    except Exception as e:
+        status.update(status="error", error=str(e))
+        forecast_df = None
+    status["seconds"] = round(time.perf_counter() - start, 4)
+    return forecast_df, status
+
+def forecast_series(agg_df: pd.DataFrame, periods: int, freq: str, engine: str, deadline: float, n_paths: int = 0) -> tuple:
+    """
+    Forecast one series of a long-format file; used for engines without a
+    vectorized path. Returns (forecast DataFrame, source).
+    """
+    forecast_df = forecast_expenses(agg_df, periods=periods, freq=freq, deadline=deadline, engine=engine, intervals=n_paths > 0, n_paths=n_paths)
+    return forecast_df, _source(engine, forecast_df)
+
+def forecast_long_file(
+    path: str,
+    series_col: str,
+    periods: int,
+    freq: str,
+    engine: str,
+    deadline: float,
+    pool,
+    n_paths: int = 0,
+    cache_dir: str = DEFAULT_CACHE_DIR
+) -> tuple:
+    """
+    Forecast every series of one long-format file. 'mean' and 'ets' run in
+    one vectorized pass (their interval simulation also uses the pool);
+    other engines fan the series out over the pool. The cleaned frame
+    comes from the DataCache in cache_dir.
+
+    Returns:
+        (forecast DataFrame with 'file' and series_col columns, status dict)
+    """
+    start = time.perf_counter()
+    status = {"file": path, "series": 0, "status": "ok", "error": None, "rows": 0, "fallbacks": 0}
+    try:
+        df = DataCache(cache_dir).clean(path)
+        status["rows"] = len(df)
+        if df.empty:
+            raise ValueError("no valid date/expense rows left after cleaning")
+        agg_df = aggregate_expenses_by_series(df, freq=freq, series_col=series_col)
+        series_ids = agg_df[series_col].unique()
+        status["series"] = len(series_ids)
+        if engine in BATCH_ENGINES:
+            forecast_df = forecast_aggregated_batch(
+                agg_df, periods=periods, freq=freq, series_col=series_col, engine=engine,
+                intervals=n_paths > 0, n_paths=n_paths, pool=pool,
+            )
+            status["source"] = engine
+        else:
+            tasks = []
+            for series_id, history in agg_df.groupby(series_col, sort=False):
+                args = (history[['date', 'expense']].reset_index(drop=True), periods, freq, engine, deadline, n_paths)
+                tasks.append((series_id, pool.submit(forecast_series, *args) if pool else forecast_series(*args)))
+            parts, sources = [], []
+            for series_id, result in tasks:
+                part, source = result.result() if pool else result
+                parts.append(part.assign(**{series_col: series_id}))
+                sources.append(source)
+            forecast_df = pd.concat(parts, ignore_index=True)
+            status["source"] = ",".join(sorted(set(sources)))
+            status["fallbacks"] = sources.count('offline')
+        forecast_df = forecast_df.assign(file=path)
+    except Exception as e:
+        status.update(status="error", error=str(e))
+        forecast_df = None
+    status["seconds"] = round(time.perf_counter() - start, 4)
+    return forecast_df, status
+
+def run_batch(
+    paths: list,
+    periods: int = 3,
+    freq: str = 'M',
+    engine: str = 'llm',
+    series_col: str = None,
+    workers: int = None,
+    deadline: float = None,
+    n_paths: int = 0,
+    cache_dir: str = DEFAULT_CACHE_DIR,
+    chunksize: int = None,
+) -> tuple:
+    """
+    Forecast many ledgers across a process pool.
+
+    Args:
+        paths: CSV files to forecast.
+        periods: Number of future periods to predict.
+        freq: Aggregation frequency ('M' monthly, 'Q' quarterly).
+        engine: 'llm', 'mean' or 'ets'.
+        series_col: Treat each file as long format with this series column.
+        workers: Process pool size; 0 or 1 runs in-process.
+        deadline: Latency budget per LLM forecast in seconds.
+        n_paths: Simulated paths for P10/P50/P90 bands; 0 adds no bands.
+        cache_dir: Directory of the cleaned/aggregated data cache.
+        chunksize: Stream single-series files in chunks of this many rows
+            instead of loading them whole (bypasses the cache).
+
+    Returns:
+        (forecasts DataFrame, summary DataFrame with one row per file)
+    """
+    workers = os.cpu_count() if workers is None else workers
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    results = []
+    try:
+        if series_col is not None:
+            # Parallelism comes from the series inside each file
+            for path in paths:
+                results.append(forecast_long_file(path, series_col, periods, freq, engine, deadline, pool, n_paths, cache_dir))
+        elif pool is None:
+            results = [forecast_file(path, periods, freq, engine, deadline, n_paths, cache_dir, chunksize) for path in paths]
+        else:
+            futures = [pool.submit(forecast_file, path, periods, freq, engine, deadline, n_paths, cache_dir, chunksize) for path in paths]
+            results = [future.result() for future in as_completed(futures)]
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    forecasts = [forecast_df for forecast_df, _ in results if forecast_df is not None]
+    leading = ['file'] + ([series_col] if series_col else [])
+    forecasts = pd.concat(forecasts, ignore_index=True) if forecasts else pd.DataFrame(columns=leading + ['date', 'predicted_expense'])
+    forecasts = forecasts[leading + [c for c in forecasts.columns if c not in leading]]
+    summary = pd.DataFrame([status for _, status in results], columns=SUMMARY_COLUMNS).sort_values('file').reset_index(drop=True)
+    return forecasts, summary
+
+def write_frame(df: pd.DataFrame, path: str) -> None:
+    """Write a frame as Parquet when path ends in .parquet, CSV otherwise."""
+    if path.endswith('.parquet'):
+        df.to_parquet(path, index=False)
+    else:
+        df.to_csv(path, index=False)
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description="Forecast expenses for a batch of ledger CSVs without the UI.")
+    parser.add_argument("inputs", nargs="+", help="CSV files, directories or glob patterns")
+    parser.add_argument("--periods", type=int, default=3, help="Number of future periods to predict")
+    parser.add_argument("--freq", default='M', choices=['M', 'Q'], help="Aggregation frequency")
+    parser.add_argument("--engine", default='llm', choices=['llm', 'mean', 'ets'], help="Base forecast engine")
+    parser.add_argument("--series-col", default=None, help="Series column of long-format files")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--deadline", type=float, default=30.0, help="Seconds per LLM forecast before the offline fallback")
+    parser.add_argument("--intervals", action="store_true", help="Add P10/P50/P90 bands from simulated paths")
+    parser.add_argument("--paths", type=int, default=1000, help="Simulated paths per series for --intervals")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="Cache of cleaned and aggregated files")
+    parser.add_argument("--chunksize", type=int, default=None, help="Stream each file in chunks of this many rows (bounded memory, no cache)")
+    parser.add_argument("--output", default="forecasts.parquet", help="Forecast output (.parquet or .csv)")
+    parser.add_argument("--summary", default=None, help="Optional per-file summary output (.parquet or .csv)")
+    args = parser.parse_args(argv)
+    if args.chunksize is not None and args.series_col is not None:
+        parser.error("--chunksize streams single-series files only; drop it or --series-col")
+
+    paths = find_inputs(args.inputs)
+    if not paths:
+        print("No CSV files matched the given inputs.")
+        return 2
+
+    start = time.perf_counter()
+    forecasts, summary = run_batch(
+        paths, periods=args.periods, freq=args.freq, engine=args.engine,
+        series_col=args.series_col, workers=args.workers,
+        deadline=args.deadline if args.engine == 'llm' else None,
+        n_paths=args.paths if args.intervals else 0,
+        cache_dir=args.cache_dir,
+        chunksize=args.chunksize,
+    )
+    write_frame(forecasts, args.output)
+    if args.summary:
+        write_frame(summary, args.summary)
+
+    print(summary.to_string(index=False))
+    failed = int((summary['status'] != 'ok').sum())
+    print(
+        f"{len(paths)} file(s), {int(summary['series'].sum())} series, {failed} failed, "
+        f"{int(summary['fallbacks'].sum())} LLM fallback(s) in {time.perf_counter() - start:.2f}s. "
+        f"Forecasts written to {args.output}."
+    )
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
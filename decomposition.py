@@ -0,0 +1,153 @@
+# src/decomposition.py
+
+import hashlib
+import json
+from collections import OrderedDict
+import pandas as pd
+from src.instrument import instrumented, span
+from src.rollup import Rollup
+
+# Decompositions memoized by (frequency, content hash of the resampled series, settings)
+_CACHE_SIZE = 128
+_cache = OrderedDict()
+
+def default_config(freq: str = 'M') -> dict:
+    """
+    Settings of the fixed decomposition: a classical multiplicative
+    decomposition with a 12-period cycle for the seasonal factors, and a
+    robust STL (seasonal smoother 13 for monthly data, 3 otherwise) for
+    trend and residuals.
+    """
+    return {"method": "classical", "model": "multiplicative", "period": 12, "seasonal": 13 if freq == 'M' else 3, "robust": True}
+
+def resample_expenses(df: pd.DataFrame, freq: str = 'M') -> pd.Series:
+    """
+    Resample the 'expense' column of a date/expense frame to the given frequency.
+    A Rollup is queried instead of resampled.
+    """
+    if isinstance(df, Rollup):
+        return df.series(freq)
+    return df.set_index('date')['expense'].resample(freq).sum()
+
+def series_fingerprint(ts: pd.Series) -> str:
+    """
+    Content hash of a series (index and values).
+    """
+    return hashlib.sha1(pd.util.hash_pandas_object(ts, index=True).values.tobytes()).hexdigest()
+
+class Decomposition:
+    """
+    Trend, seasonal and residual components of one resampled expense series.
+
+    The series is resampled once; each component model is fitted at most
+    once, on first access, and shared by every consumer of the object.
+
+    config selects the model (see default_config): 'method' is 'classical'
+    (seasonal_decompose), 'stl' (seasonal factors from the STL fit, whose
+    'period', 'seasonal' smoother and 'robust' flag then also apply) or
+    'none' (no seasonality); 'model' is 'multiplicative' or 'additive'.
+    """
+
+    def __init__(self, ts: pd.Series, freq: str = 'M', config: dict = None):
+        self.series = ts
+        self.freq = freq
+        self.config = config or default_config(freq)
+        self._seasonal = None
+        self._stl = None
+
+    @property
+    def seasonal(self) -> pd.Series:
+        """Multiplicative seasonal factors normalized to be around 1."""
+        if self._seasonal is None:
+            ts = self.series
+            method, model, period = self.config["method"], self.config["model"], self.config["period"]
+            # Handle if length too short for decomposition
+            if method == 'none' or len(ts) < 2 * period:  # less than two full cycles
+                # Seasonality detection unreliable
+                self._seasonal = pd.Series([1] * len(ts), index=ts.index)
+            elif method == 'stl':
+                # STL is additive; turn its seasonal into factors around the trend or the level
+                stl = self._fit_stl()
+                reference = stl.trend if model == 'multiplicative' else ts.mean()
+                seasonal = 1 + stl.seasonal / reference
+                self._seasonal = seasonal / seasonal.mean()
+            else:
+                # statsmodels is imported on first fit; it dominates import time
+                from statsmodels.tsa.seasonal import seasonal_decompose
+                with span('seasonal_decompose', rows_in=len(ts)):
+                    decomposition = seasonal_decompose(ts, model=model, period=period, extrapolate_trend='freq')
+                seasonal = decomposition.seasonal
+                if model == 'additive':
+                    seasonal = 1 + seasonal / ts.mean()
+                # Normalize seasonal component to be around 1 (multiplicative)
+                self._seasonal = seasonal / seasonal.mean()
+        return self._seasonal
+
+    @property
+    def trend(self) -> pd.Series:
+        """STL trend normalized relative to its last value."""
+        ts = self.series
+        # Too short to detect trend reliably, return series of ones
+        if len(ts) < 3:
+            return pd.Series([1] * len(ts), index=ts.index)
+        trend = self._fit_stl().trend
+        return trend / trend.iloc[-1]
+
+    @property
+    def resid(self) -> pd.Series:
+        """STL residuals, or zeros when the series is too short."""
+        ts = self.series
+        if len(ts) < 3:
+            return pd.Series([0.0] * len(ts), index=ts.index)
+        return self._fit_stl().resid
+
+    def _fit_stl(self):
+        if self._stl is None:
+            from statsmodels.tsa.seasonal import STL
+            # The STL period follows the index frequency unless STL also fits the seasonality
+            period = self.config["period"] if self.config["method"] == 'stl' else None
+            with span('stl', rows_in=len(self.series)):
+                stl = STL(self.series, period=period, seasonal=self.config["seasonal"], robust=self.config["robust"])
+                self._stl = stl.fit()
+        return self._stl
+
+@instrumented()
+def decompose(df: pd.DataFrame, freq: str = 'M', auto: bool = False, workers: int = None) -> Decomposition:
+    """
+    Resample historical expenses once and return their shared decomposition.
+
+    Results are memoized on the content hash of the resampled series, so
+    forecasting the same history again (e.g. with a different number of
+    periods) reuses the fitted components.
+
+    Args:
+        df: DataFrame with 'date' and 'expense' columns, or a Rollup.
+        freq: Frequency for resampling ('M' for monthly, 'Q' for quarterly).
+        auto: Pick the decomposition settings with a holdout search over
+            a grid (see autoselect.select_config) instead of default_config.
+        workers: Process pool size of that search.
+
+    Returns:
+        Decomposition of the resampled series.
+    """
+    ts = resample_expenses(df, freq)
+    config = None
+    if auto:
+        from src.autoselect import select_config
+        config = select_config(ts, freq, workers=workers)["config"]
+    key = (freq, series_fingerprint(ts), json.dumps(config, sort_keys=True) if config else None)
+    if key in _cache:
+        _cache.move_to_end(key)
+        return _cache[key]
+
+    decomposition = Decomposition(ts, freq, config)
+    _cache[key] = decomposition
+    if len(_cache) > _CACHE_SIZE:
+        _cache.popitem(last=False)
+    return decomposition
+
+def clear_decomposition_cache() -> None:
+    """
+    Drop all memoized decompositions.
+    """
+    _cache.clear()
@@ -0,0 +1,201 @@
+# src/ets.py
+
+import itertools
+import numpy as np
+
+# Periods per seasonal cycle for each aggregation frequency
+SEASON_LENGTHS = {'M': 12, 'Q': 4, 'W': 52, 'D': 7}
+
+# Smoothing parameter grid searched for every series at once
+ALPHAS = (0.1, 0.3, 0.5, 0.8)
+BETAS = (0.01, 0.1, 0.3)
+GAMMAS = (0.05, 0.2, 0.5)
+
+def _initial_states(Y: np.ndarray, season_length: int, trend: bool, seasonal: str):
+    """
+    Classical Holt-Winters start values for every row of Y.
+
+    Returns:
+        (level, slope, season) arrays of shapes (n,), (n,) and (n, m).
+    """
+    n, T = Y.shape
+    m = season_length
+    if seasonal:
+        first = Y[:, :m].mean(axis=1)
+        second = Y[:, m:2 * m].mean(axis=1)
+        level = first
+        slope = (second - first) / m if trend else np.zeros(n)
+        if seasonal == 'multiplicative':
+            season = Y[:, :m] / first[:, None]
+        else:
+            season = Y[:, :m] - first[:, None]
+    else:
+        level = Y[:, 0].astype(float)
+        slope = Y[:, 1] - Y[:, 0] if trend and T > 1 else np.zeros(n)
+        season = np.zeros((n, 1))
+    return level, slope, season
+
+def _smooth(Y: np.ndarray, level, slope, season, t0: int, params: tuple, trend: bool, seasonal: str):
+    """
+    Run the Holt-Winters recursion over the periods of Y (time on axis 1),
+    starting from the given states at absolute period t0. States broadcast
+    against Y[:, t], so the same loop filters a (series x grid) fit or a
+    single parameter set per series.
+
+    Returns:
+        (level, slope, season, sse) after the last period of Y.
+    """
+    alpha, beta, gamma = params
+    m = season.shape[-1]
+    multiplicative = seasonal == 'multiplicative'
+    season = season.copy()
+    sse = 0.0
+    for t in range(Y.shape[1]):
+        y = Y[:, t]
+        s = season[..., (t0 + t) % m]
+        base = level + slope
+        fitted = base * s if multiplicative else base + s
+        sse = sse + (y - fitted) ** 2
+        with np.errstate(divide='ignore', invalid='ignore'):
+            deseasoned = y / s if multiplicative else y - s
+        new_level = alpha * deseasoned + (1 - alpha) * base
+        if trend:
+            slope = beta * (new_level - level) + (1 - beta) * slope
+        if seasonal:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                target = y / new_level if multiplicative else y - new_level
+            season[..., (t0 + t) % m] = gamma * target + (1 - gamma) * s
+        level = new_level
+    return level, slope, season, sse
+
+def fit_holt_winters(
+    Y: np.ndarray,
+    season_length: int = 12,
+    trend: bool = True,
+    seasonal: str = 'auto',
+) -> dict:
+    """
+    Fit Holt-Winters exponential smoothing to many aligned series at once.
+
+    Every series is filtered with every (alpha, beta, gamma) combination of
+    the module grid in one pass over time; the combination with the lowest
+    in-sample one-step squared error is kept per series. All work is
+    array-at-a-time over series and grid points, the only Python loop is
+    over periods.
+
+    Args:
+        Y: Array of shape (n_series, n_periods), series as rows.
+        season_length: Periods per seasonal cycle.
+        trend: Whether to include an additive trend.
+        seasonal: 'additive', 'multiplicative', None, or 'auto' to use
+            multiplicative seasonality when at least two full cycles of
+            strictly positive data exist (otherwise no seasonality).
+
+    Returns:
+        Dict with final 'level', 'slope' and 'season' states, the chosen
+        'alpha', 'beta', 'gamma', 'sse' per series and model settings.
+    """
+    Y = np.asarray(Y, dtype=float)
+    if Y.ndim == 1:
+        Y = Y[None, :]
+    n, T = Y.shape
+    if seasonal == 'auto':
+        seasonal = 'multiplicative' if T >= 2 * season_length and (Y > 0).all() else None
+    if seasonal and T < 2 * season_length:
+        seasonal = None
+    m = season_length if seasonal else 1
+
+    grid = np.array(list(itertools.product(ALPHAS, BETAS if trend else (0.0,), GAMMAS if seasonal else (0.0,))))
+    alpha, beta, gamma = (grid[:, k][None, :] for k in range(3))
+    G = len(grid)
+
+    level0, slope0, season0 = _initial_states(Y, m, trend, seasonal)
+    level = np.repeat(level0[:, None], G, axis=1)
+    slope = np.repeat(slope0[:, None], G, axis=1)
+    season = np.repeat(season0[:, None, :], G, axis=1)
+    level, slope, season, sse = _smooth(Y[:, :, None], level, slope, season, 0, (alpha, beta, gamma), trend, seasonal)
+
+    sse = np.where(np.isfinite(sse), sse, np.inf)
+    best = sse.argmin(axis=1)
+    rows = np.arange(n)
+    return {
+        "level": level[rows, best],
+        "slope": slope[rows, best],
+        "season": season[rows, best],
+        "alpha": grid[best, 0],
+        "beta": grid[best, 1],
+        "gamma": grid[best, 2],
+        "sse": sse[rows, best],
+        "n_periods": T,
+        "trend": trend,
+        "seasonal": seasonal,
+        "season_length": m,
+    }
+
+def update_holt_winters(fit: dict, Y_new: np.ndarray) -> dict:
+    """
+    Continue a fit over newly observed periods with its smoothing parameters
+    held fixed. Costs time proportional to the new periods only.
+
+    Args:
+        fit: Result of fit_holt_winters (or of a previous update).
+        Y_new: Array of shape (n_series, n_new_periods).
+
+    Returns:
+        New fit dict with the states advanced past Y_new.
+    """
+    Y_new = np.atleast_2d(np.asarray(Y_new, dtype=float))
+    level, slope, season, sse = _smooth(
+        Y_new, fit["level"], fit["slope"], fit["season"], fit["n_periods"],
+        (fit["alpha"], fit["beta"], fit["gamma"]), fit["trend"], fit["seasonal"],
+    )
+    updated = dict(fit)
+    updated.update(level=level, slope=slope, season=season, sse=fit["sse"] + sse, n_periods=fit["n_periods"] + Y_new.shape[1])
+    return updated
+
+def rewind_holt_winters(fit: dict, Y: np.ndarray, n_periods: int) -> dict:
+    """
+    States of a fit after only the first n_periods of the Y it was fitted
+    to, with the chosen smoothing parameters unchanged.
+    """
+    Y = np.atleast_2d(np.asarray(Y, dtype=float))
+    level, slope, season = _initial_states(Y, fit["season_length"], fit["trend"], fit["seasonal"])
+    start = dict(fit, level=level, slope=slope, season=season, sse=np.zeros(Y.shape[0]), n_periods=0)
+    return update_holt_winters(start, Y[:, :n_periods])
+
+def forecast_holt_winters(fit: dict, periods: int) -> np.ndarray:
+    """
+    Forecast periods steps ahead from fitted Holt-Winters states.
+
+    Returns:
+        Array of shape (n_series, periods).
+    """
+    steps = np.arange(1, periods + 1)
+    base = fit["level"][:, None] + steps[None, :] * fit["slope"][:, None]
+    if not fit["seasonal"]:
+        return base
+    m = fit["season_length"]
+    positions = (fit["n_periods"] + steps - 1) % m
+    s = fit["season"][:, positions]
+    return base * s if fit["seasonal"] == 'multiplicative' else base + s
+
+def holt_winters_forecast(Y: np.ndarray, periods: int, season_length: int = 12, seasonal: str = 'auto') -> np.ndarray:
+    """
+    Fit and forecast many aligned series (rows of Y) in one call.
+    With seasonal='auto', strictly positive rows get multiplicative
+    seasonality and the others none, each group fitted in one pass.
+
+    Returns:
+        Array of shape (n_series, periods).
+    """
+    Y = np.atleast_2d(np.asarray(Y, dtype=float))
+    if seasonal != 'auto' or Y.shape[1] < 2 * season_length:
+        return forecast_holt_winters(fit_holt_winters(Y, season_length=season_length, seasonal=seasonal), periods)
+
+    forecast = np.empty((Y.shape[0], periods))
+    positive = (Y > 0).all(axis=1)
+    for rows, model in ((positive, 'multiplicative'), (~positive, None)):
+        if rows.any():
+            fit = fit_holt_winters(Y[rows], season_length=season_length, seasonal=model)
+            forecast[rows] = forecast_holt_winters(fit, periods)
+    return forecast
@@ -1,14 +1,26 @@
 # src/forecast.py
 
 import pandas as pd
-from src.seasonality import detect_seasonality, adjust_for_seasonality
-from src.trend import detect_trend, adjust_for_trend
-from src.ai_agent import get_ai_forecast
+import numpy as np
+from src.clean_data import aggregate_expenses_by_series
+from src.panel import iter_panel_blocks, panel_seasonality, panel_trend, panel_holdout_errors, seasonal_factors
+from src.decomposition import decompose
+from src.seasonality import adjust_for_seasonality
+from src.trend import adjust_for_trend
+from src.ai_agent import get_ai_forecast, get_ai_forecast_within, forecast_dates, offline_forecast
+from src.ets import SEASON_LENGTHS, holt_winters_forecast
+from src.intervals import BAND_COLUMNS, MAX_CHUNK_BYTES, simulate_quantiles
 
 def forecast_expenses(
     df: pd.DataFrame,
     periods: int = 1,
-    freq: str = 'M'
+    freq: str = 'M',
+    deadline: float = None,
+    engine: str = 'llm',
+    intervals: bool = False,
+    n_paths: int = 1000,
+    seed: int = 0,
+    auto_decompose: bool = False
 ) -> pd.DataFrame:
     """
     Forecast future expenses for the given number of periods.
@@ -17,19 +29,174 @@ def forecast_expenses(
         df: Historical expenses dataframe with 'date' and 'expense' columns.
         periods: Number of future periods to predict.
         freq: Frequency for aggregation ('M' monthly, 'Q' quarterly).
+        deadline: Optional latency budget in seconds for the base forecast.
+            The LLM is then raced against the offline model and the result's
+            attrs['provenance'] records the source and elapsed time.
+        engine: Base forecast engine: 'llm' (Gemini with offline fallback),
+            'mean' (historical mean) or 'ets' (Holt-Winters). ETS models
+            trend and seasonality itself, so its output is not adjusted again.
+        intervals: Also return 'p10', 'p50' and 'p90' columns from n_paths
+            simulated paths (see simulate_quantiles), drawn from seed.
+        auto_decompose: Choose the decomposition settings by a holdout
+            search (see autoselect.select_config) instead of the defaults.
     
     Returns:
         pd.DataFrame with forecasted 'date' and 'predicted_expense'.
     """
-    # Step 1: Detect seasonality and trend
-    seasonal_pattern = detect_seasonality(df, freq=freq)
-    trend_pattern = detect_trend(df, freq=freq)
+    if engine == 'ets':
+        forecast_df = offline_forecast(df, periods, freq, engine='ets')
+        if intervals:
+            forecast_df = add_intervals(forecast_df, forecast_df['predicted_expense'], decompose(df, freq=freq, auto=auto_decompose), n_paths, seed)
+        return forecast_df
+
+    # Step 1: Detect seasonality and trend (one shared, memoized decomposition)
+    decomposition = decompose(df, freq=freq, auto=auto_decompose)
     
     # Step 2: Call AI agent for base forecast (pass historical data)
-    base_forecast = get_ai_forecast(df, periods, freq)
+    provenance = None
+    if engine == 'mean':
+        base_forecast = offline_forecast(df, periods, freq, engine='mean')
+    elif deadline is None:
+        base_forecast = get_ai_forecast(df, periods, freq)
+    else:
+        base_forecast, provenance = get_ai_forecast_within(df, periods, freq, deadline)
     
     # Step 3: Adjust forecast for seasonality and trend
-    adjusted_forecast = adjust_for_seasonality(base_forecast, seasonal_pattern)
-    adjusted_forecast = adjust_for_trend(adjusted_forecast, trend_pattern)
-    
+    adjusted_forecast = adjust_base_forecast(df, base_forecast, freq, decomposition)
+    if intervals:
+        adjusted_forecast = add_intervals(adjusted_forecast, base_forecast['predicted_expense'], decomposition, n_paths, seed)
+
+    if provenance is not None:
+        adjusted_forecast.attrs['provenance'] = provenance
     return adjusted_forecast
+
+def adjust_base_forecast(df: pd.DataFrame, base_forecast: pd.DataFrame, freq: str = 'M', decomposition=None) -> pd.DataFrame:
+    """
+    Apply the seasonality and trend adjustments of forecast_expenses to a
+    base forecast produced elsewhere (e.g. a batched LLM request).
+    Holt-Winters bases (attrs['engine'] 'ets', such as the LLM fallback
+    with OFFLINE_FORECAST_ENGINE=ets) already model both and are returned
+    unadjusted.
+    """
+    if base_forecast.attrs.get('engine') == 'ets':
+        return base_forecast.copy()
+    if decomposition is None:
+        decomposition = decompose(df, freq=freq)
+    adjusted_forecast = adjust_for_seasonality(base_forecast, decomposition)
+    return adjust_for_trend(adjusted_forecast, decomposition)
+
+def add_intervals(forecast_df: pd.DataFrame, base, decomposition, n_paths: int = 1000, seed: int = 0) -> pd.DataFrame:
+    """
+    Add band columns to a single-series forecast. Each path bootstraps
+    holdout errors of the history (see panel_holdout_errors, using the
+    decomposition's own seasonal factors) onto the base forecast and is
+    scaled by the same seasonal and trend factors that turned base into
+    predicted_expense.
+    """
+    base = np.asarray(base, dtype=float)
+    adjusted = forecast_df['predicted_expense'].to_numpy(dtype=float)
+    factors = np.divide(adjusted, base, out=np.ones_like(base), where=base != 0)
+    errors = panel_holdout_errors(
+        decomposition.series.to_numpy(dtype=float)[None, :], decomposition.seasonal.to_numpy(dtype=float)[None, :], decomposition.config["period"]
+    )
+    bands = simulate_quantiles(base[None, :], errors, factors[None, :], n_paths=n_paths, seed=seed)
+    return forecast_df.assign(**{column: band[0] for column, band in zip(BAND_COLUMNS, bands)})
+
+def forecast_expenses_batch(
+    df: pd.DataFrame,
+    periods: int = 1,
+    freq: str = 'M',
+    series_col: str = 'series',
+    engine: str = 'mean',
+    **interval_options
+) -> pd.DataFrame:
+    """
+    Forecast future expenses for every series of a long-format frame at once.
+
+    Aggregation, decomposition, base forecast and adjustment run on
+    aligned 2-D blocks of series instead of one Python call per series.
+    No LLM round trip is made per series: the base forecast is the
+    historical mean used by offline_forecast (engine='mean'), or
+    Holt-Winters fitted to the whole block (engine='ets', not adjusted again).
+
+    Args:
+        df: Transactions with series_col, 'date' and 'expense' columns.
+        periods: Number of future periods to predict.
+        freq: Frequency for aggregation ('M' monthly, 'Q' quarterly).
+        series_col: Name of the series id column (account, category, ...).
+        engine: 'mean' or 'ets'.
+        interval_options: intervals, n_paths, seed, max_bytes and pool, as
+            in forecast_aggregated_batch.
+
+    Returns:
+        pd.DataFrame with series_col, forecasted 'date' and 'predicted_expense'.
+    """
+    agg_df = aggregate_expenses_by_series(df, freq=freq, series_col=series_col)
+    return forecast_aggregated_batch(agg_df, periods=periods, freq=freq, series_col=series_col, engine=engine, **interval_options)
+
+def forecast_aggregated_batch(
+    agg_df: pd.DataFrame,
+    periods: int = 1,
+    freq: str = 'M',
+    series_col: str = 'series',
+    engine: str = 'mean',
+    intervals: bool = False,
+    n_paths: int = 1000,
+    seed: int = 0,
+    max_bytes: int = MAX_CHUNK_BYTES,
+    pool=None
+) -> pd.DataFrame:
+    """
+    forecast_expenses_batch for data already aggregated per series and period,
+    as returned by aggregate_expenses_by_series.
+
+    With intervals, 'p10', 'p50' and 'p90' columns come from n_paths
+    simulated paths per series (see simulate_quantiles), bootstrapping the
+    holdout errors of the block's seasonally adjusted historical mean
+    (see panel_holdout_errors).
+    Simulation runs in chunks of at most max_bytes, spread over pool (e.g.
+    a ProcessPoolExecutor) when one is given.
+    """
+    frames = []
+    for block, (series_ids, dates, values) in enumerate(iter_panel_blocks(agg_df, series_col=series_col)):
+        future_dates = pd.DatetimeIndex(forecast_dates(dates[-1], periods, freq))
+        if engine == 'ets' and values.shape[1] >= 2:
+            base = adjusted = holt_winters_forecast(values, periods, season_length=SEASON_LENGTHS.get(freq, 12))
+            seasonal = panel_seasonality(values) if intervals else None
+        else:
+            # Step 1: Detect seasonality and trend for the whole block
+            seasonal = panel_seasonality(values)
+            trend = panel_trend(values)
+
+            # Step 2: Base forecast from the historical mean
+            base = np.repeat(values.mean(axis=1, keepdims=True), periods, axis=1)
+
+            # Step 3: Adjust for seasonality and trend (same rules as the single-series path)
+            adjusted = base * seasonal_factors(seasonal, dates, future_dates)
+            last_trend = trend[:, -1:]
+            steps = np.arange(1, periods + 1)
+            adjusted = adjusted * (1 + steps * (last_trend - 1) / max(len(dates), 1))
+
+        bands = None
+        if intervals:
+            factors = np.divide(adjusted, base, out=np.ones_like(adjusted), where=base != 0)
+            bands = simulate_quantiles(
+                base, panel_holdout_errors(values, seasonal), factors,
+                n_paths=n_paths, seed=[seed, block], max_bytes=max_bytes, pool=pool,
+            )
+        frames.append(_block_frame(series_col, series_ids, future_dates, adjusted, bands))
+
+    if not frames:
+        return pd.DataFrame(columns=[series_col, 'date', 'predicted_expense'] + (list(BAND_COLUMNS) if intervals else []))
+    return pd.concat(frames, ignore_index=True).sort_values([series_col, 'date'], kind='stable').reset_index(drop=True)
+
+def _block_frame(series_col: str, series_ids: np.ndarray, future_dates: pd.DatetimeIndex, predicted: np.ndarray, bands: np.ndarray = None) -> pd.DataFrame:
+    """Tidy forecast rows for one block of series, with band columns when given."""
+    columns = {
+        series_col: np.repeat(series_ids, len(future_dates)),
+        "date": np.tile(future_dates, len(series_ids)),
+        "predicted_expense": predicted.ravel(),
+    }
+    if bands is not None:
+        columns.update({column: band.ravel() for column, band in zip(BAND_COLUMNS, bands)})
+    return pd.DataFrame(columns)
@@ -0,0 +1,268 @@
+# src/gemini_client.py
+
+import asyncio
+import json
+import random
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+
+# HTTP statuses worth retrying: rate limiting and transient server errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class TokenBucket:
+    """
+    Token-bucket rate limiter usable from threads and from asyncio code.
+    rate: tokens added per second; capacity: largest burst allowed.
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """Take one token, returning how long the caller must wait for it."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def acquire(self) -> None:
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self) -> None:
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+class GeminiClient:
+    """
+    Shared HTTP client for Gemini calls.
+
+    One requests.Session keeps pooled keep-alive connections. Every request
+    goes through a token-bucket rate limiter and is retried with jittered
+    exponential backoff on connection errors and retryable statuses. The
+    async API runs the pooled session in worker threads, caps requests in
+    flight with a semaphore and backs off with asyncio.sleep, so it never
+    blocks the event loop.
+    """
+
+    def __init__(
+        self,
+        rate: float = 10.0,
+        burst: float = None,
+        max_in_flight: int = 8,
+        max_retries: int = 5,
+        base_delay: float = 1.0,
+        max_delay: float = 16.0,
+        timeout: float = 30.0,
+    ):
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.bucket = TokenBucket(rate, burst)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_in_flight, pool_maxsize=max_in_flight)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="gemini")
+        # Per event loop; a closed and dropped loop takes its semaphore with it
+        self._semaphores = weakref.WeakKeyDictionary()
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff delay for a 0-based retry attempt."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def _post_once(self, url: str, payload: dict, headers: dict = None, timeout: float = None) -> dict:
+        response = self.session.post(url, headers=headers, json=payload, timeout=timeout or self.timeout)
+        if response.status_code in RETRY_STATUSES:
+            raise requests.exceptions.RetryError(f"{response.status_code} from {url}")
+        response.raise_for_status()
+        return response.json()
+
+    def post_json(
+        self,
+        url: str,
+        payload: dict,
+        headers: dict = None,
+        timeout: float = None,
+        retries: int = None,
+        on_retry=None,
+        deadline: float = None,
+    ) -> dict:
+        """
+        POST a JSON payload and return the decoded JSON response.
+
+        Args:
+            url: Endpoint URL.
+            payload: JSON body.
+            headers: Extra request headers.
+            timeout: Per-attempt timeout in seconds (defaults to the client's).
+            retries: Retries after the first attempt (defaults to max_retries - 1).
+            on_retry: Optional callback(attempt, exception) called before each retry.
+            deadline: Optional time.monotonic() value after which no attempt is
+                started; each attempt's timeout is cut to the time remaining.
+
+        Raises:
+            requests.exceptions.RequestException once every attempt has failed.
+        """
+        send = lambda attempt_timeout: self._post_once(url, payload, headers, attempt_timeout)
+        return self._with_retries(send, timeout, retries, on_retry, deadline)
+
+    def _with_retries(self, send, timeout: float = None, retries: int = None, on_retry=None, deadline: float = None):
+        """Call send(timeout) through the rate limiter with post_json's retry policy."""
+        retries = self.max_retries - 1 if retries is None else retries
+        for attempt in range(retries + 1):
+            self.bucket.acquire()
+            try:
+                return send(_remaining(timeout or self.timeout, deadline))
+            except requests.exceptions.RequestException as e:
+                if attempt >= retries or not _is_retryable(e):
+                    raise
+                delay = self.backoff(attempt)
+                if deadline is not None and time.monotonic() + delay >= deadline:
+                    raise requests.exceptions.Timeout(f"Deadline reached after {attempt + 1} attempts: {e}") from e
+                if on_retry is not None:
+                    on_retry(attempt, e)
+                time.sleep(delay)
+
+    def _open_stream(self, url: str, payload: dict, headers: dict = None, timeout: float = None):
+        response = self.session.post(url, headers=headers, json=payload, timeout=timeout or self.timeout, stream=True)
+        if response.status_code in RETRY_STATUSES:
+            response.close()
+            raise requests.exceptions.RetryError(f"{response.status_code} from {url}")
+        try:
+            response.raise_for_status()
+        except requests.exceptions.HTTPError:
+            response.close()
+            raise
+        return response
+
+    def post_stream(
+        self,
+        url: str,
+        payload: dict,
+        headers: dict = None,
+        timeout: float = None,
+        retries: int = None,
+        on_retry=None,
+        deadline: float = None,
+    ):
+        """
+        POST to a streaming endpoint and yield generated text as it arrives.
+
+        Server-sent events ('data: {...}' lines) are decoded one by one and
+        the text of each is yielded (see response_text); a plain JSON reply
+        yields its whole text once. Opening the connection is retried like
+        post_json, but an error after text has been yielded is raised as is.
+        """
+        send = lambda attempt_timeout: self._open_stream(url, payload, headers, attempt_timeout)
+        response = self._with_retries(send, timeout, retries, on_retry, deadline)
+        with response:
+            if not response.headers.get("Content-Type", "").startswith("text/event-stream"):
+                yield response_text(response.json())
+                return
+            response.encoding = response.encoding or "utf-8"
+            for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                text = response_text(json.loads(data))
+                if text:
+                    yield text
+
+    async def apost_json(
+        self,
+        url: str,
+        payload: dict,
+        headers: dict = None,
+        timeout: float = None,
+        retries: int = None,
+    ) -> dict:
+        """
+        Async version of post_json; at most max_in_flight requests run at once.
+        """
+        retries = self.max_retries - 1 if retries is None else retries
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_in_flight)
+        for attempt in range(retries + 1):
+            await self.bucket.acquire_async()
+            try:
+                async with semaphore:
+                    return await loop.run_in_executor(self._executor, self._post_once, url, payload, headers, timeout)
+            except requests.exceptions.RequestException as e:
+                if attempt >= retries or not _is_retryable(e):
+                    raise
+                await asyncio.sleep(self.backoff(attempt))
+
+    async def apost_many(self, url: str, payloads: list, headers: dict = None, timeout: float = None) -> list:
+        """
+        POST many payloads concurrently. Results keep the input order; a
+        request that failed every attempt yields its exception instead.
+        """
+        tasks = [self.apost_json(url, payload, headers, timeout) for payload in payloads]
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
+        self.session.close()
+
+def response_text(result: dict) -> str:
+    """
+    Generated text of a response body or stream event, either a 'choices'
+    completion or a 'candidates' generateContent result.
+    """
+    if result.get("choices"):
+        return result["choices"][0].get("text", "")
+    if result.get("candidates"):
+        parts = result["candidates"][0].get("content", {}).get("parts", [])
+        return "".join(part.get("text", "") for part in parts)
+    return ""
+
+def _remaining(timeout: float, deadline: float = None) -> float:
+    """Per-attempt timeout, cut to the time left before deadline."""
+    if deadline is None:
+        return timeout
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise requests.exceptions.Timeout("Deadline reached before the request was sent")
+    return min(timeout, remaining)
+
+def _is_retryable(error: Exception) -> bool:
+    """
+    Retry retryable HTTP statuses (raised as RetryError by _post_once and
+    _open_stream) and connection or timeout errors only; malformed bodies
+    and other request errors fail right away.
+    """
+    if isinstance(error, requests.exceptions.HTTPError):
+        return error.response is not None and error.response.status_code in RETRY_STATUSES
+    return isinstance(error, (
+        requests.exceptions.RetryError, requests.exceptions.ConnectionError, requests.exceptions.Timeout
+    ))
+
+_default_client = None
+
+def get_client() -> GeminiClient:
+    """
+    Process-wide GeminiClient, created on first use.
+    """
+    global _default_client
+    if _default_client is None:
+        _default_client = GeminiClient()
+    return _default_client
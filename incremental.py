@@ -0,0 +1,139 @@
+# src/incremental.py
+
+import pickle
+import numpy as np
+import pandas as pd
+from src.clean_data import aggregate_expenses
+from src.ets import SEASON_LENGTHS, fit_holt_winters, update_holt_winters, rewind_holt_winters, forecast_holt_winters
+from src.ai_agent import forecast_dates, offline_forecast
+
+class IncrementalForecaster:
+    """
+    Holt-Winters forecaster that keeps per-period aggregates and smoothing
+    state between runs, so appending transactions only touches the periods
+    they fall in.
+
+    The last aggregated period is treated as still open: new transactions
+    may add to it. The committed model state covers every period before
+    it; forecasting steps the state through the open period on a copy.
+    Transactions that land in an older period (late data), or history that
+    changes which seasonal model 'auto' would pick, trigger a full refit.
+    """
+
+    def __init__(self, freq: str = 'M', season_length: int = None):
+        self.freq = freq
+        self.season_length = season_length or SEASON_LENGTHS.get(freq, 12)
+        self.dates = []
+        self.values = []
+        self.refits = 0
+        self._committed = None
+        self._committed_positive = True
+
+    @classmethod
+    def from_history(cls, df: pd.DataFrame, freq: str = 'M') -> 'IncrementalForecaster':
+        """
+        Build a forecaster from cleaned transactions ('date', 'expense').
+        """
+        forecaster = cls(freq=freq)
+        forecaster.append(df)
+        return forecaster
+
+    @property
+    def history(self) -> pd.DataFrame:
+        """Per-period aggregates, as aggregate_expenses would return them."""
+        return pd.DataFrame({"date": pd.DatetimeIndex(self.dates), "expense": self.values})
+
+    def append(self, df: pd.DataFrame) -> dict:
+        """
+        Add a batch of cleaned transactions and update the model state.
+
+        Args:
+            df: New transactions with 'date' and 'expense' columns.
+
+        Returns:
+            Dict with the number of 'periods_updated', whether a full
+            'refit' happened and its 'reason'.
+        """
+        if df.empty:
+            return {"periods_updated": 0, "refit": False, "reason": None}
+
+        if not self.dates:
+            batch = aggregate_expenses(df, freq=self.freq)
+            self.dates, self.values = batch['date'].tolist(), batch['expense'].astype(float).tolist()
+            self.refit()
+            return {"periods_updated": len(batch), "refit": True, "reason": "initial fit"}
+
+        # Anchor the batch on the open period so gaps after it are zero-filled
+        last_date = self.dates[-1]
+        anchor = pd.DataFrame({"date": [last_date], "expense": [0.0]})
+        batch = aggregate_expenses(pd.concat([anchor, df[['date', 'expense']]], ignore_index=True), freq=self.freq)
+        if batch['date'].iloc[0] < last_date:
+            # Late data: merge into the stored aggregates and start over
+            merged = aggregate_expenses(pd.concat([self.history, df[['date', 'expense']]], ignore_index=True), freq=self.freq)
+            self.dates, self.values = merged['date'].tolist(), merged['expense'].astype(float).tolist()
+            self.refit()
+            return {"periods_updated": len(merged), "refit": True, "reason": "late data"}
+
+        amounts = batch['expense'].astype(float).tolist()
+        open_index = len(self.values) - 1
+        self.values[-1] += amounts[0]
+        self.dates.extend(batch['date'].iloc[1:].tolist())
+        self.values.extend(amounts[1:])
+
+        closed = np.asarray(self.values[open_index:-1], dtype=float)
+        self._committed_positive = self._committed_positive and bool((closed > 0).all())
+        if self._needs_refit():
+            self.refit()
+            return {"periods_updated": len(batch), "refit": True, "reason": "model structure"}
+        if len(closed):
+            self._committed = update_holt_winters(self._committed, closed[None, :])
+        return {"periods_updated": len(batch), "refit": False, "reason": None}
+
+    def refit(self) -> None:
+        """
+        Fit the model from scratch on the stored aggregates, choosing new
+        smoothing parameters.
+        """
+        self.refits += 1
+        values = np.asarray(self.values, dtype=float)
+        self._committed_positive = bool((values[:-1] > 0).all())
+        if len(values) < 2:
+            self._committed = None
+            return
+        fit = fit_holt_winters(values[None, :], season_length=self.season_length)
+        self._committed = rewind_holt_winters(fit, values[None, :], len(values) - 1)
+
+    def _needs_refit(self) -> bool:
+        """Whether the seasonal model chosen at the last refit is stale."""
+        if self._committed is None:
+            return len(self.values) >= 2
+        periods = len(self.values)
+        positive = self._committed_positive and self.values[-1] > 0
+        expected = 'multiplicative' if periods >= 2 * self.season_length and positive else None
+        return expected != self._committed["seasonal"]
+
+    def forecast(self, periods: int = 1) -> pd.DataFrame:
+        """
+        Forecast from the current state.
+
+        Returns:
+            pd.DataFrame with forecasted 'date' and 'predicted_expense'.
+        """
+        if self._committed is None:
+            return offline_forecast(self.history, periods, self.freq, engine='mean')
+        tip = update_holt_winters(self._committed, [[self.values[-1]]])
+        return pd.DataFrame({
+            "date": forecast_dates(self.dates[-1], periods, self.freq),
+            "predicted_expense": forecast_holt_winters(tip, periods)[0],
+        })
+
+    def save(self, path: str) -> None:
+        """Persist aggregates and model state for the next run."""
+        with open(path, 'wb') as fh:
+            pickle.dump(self, fh)
+
+    @staticmethod
+    def load(path: str) -> 'IncrementalForecaster':
+        """Load a forecaster written by save()."""
+        with open(path, 'rb') as fh:
+            return pickle.load(fh)
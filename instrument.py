@@ -0,0 +1,198 @@
+# src/instrument.py
+
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+
+# Off unless EXPENSE_INSTRUMENT is set (or enable() is called); when off,
+# instrumented functions cost one global flag check per call
+_enabled = os.getenv("EXPENSE_INSTRUMENT", "") not in ("", "0")
+_trace_memory = True
+_records = deque(maxlen=10_000)
+_local = threading.local()
+
+class _Collector:
+    """Span buffer of one context (see collect)."""
+
+    def __init__(self, trace_memory: bool):
+        self.trace_memory = trace_memory
+        self.records = deque(maxlen=_records.maxlen)
+
+# Collector of the current thread or task, if it records its own spans
+_collector = contextvars.ContextVar('instrument_collector', default=None)
+
+def enable(flag: bool = True, trace_memory: bool = True) -> None:
+    """
+    Turn span recording on or off. trace_memory also tracks peak memory
+    through tracemalloc, which slows allocation-heavy code while enabled.
+    """
+    global _enabled, _trace_memory
+    _enabled = flag
+    _trace_memory = trace_memory
+    if flag and trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    elif not flag and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+def collect(flag: bool = True, trace_memory: bool = True) -> None:
+    """
+    Record the spans of the current context (thread or asyncio task) into
+    a fresh buffer of its own, or stop recording them when flag is False.
+    Unlike enable(), this leaves other contexts alone, so concurrent
+    Streamlit sessions each see only their own spans; records(), clear()
+    and the exporters then work on that buffer. tracemalloc is process
+    wide: it stays on once started, and the peaks of concurrent contexts
+    can overlap.
+    """
+    _collector.set(_Collector(trace_memory) if flag else None)
+    if flag and trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+def is_enabled() -> bool:
+    return _enabled or _collector.get() is not None
+
+def _buffer() -> deque:
+    collector = _collector.get()
+    return _records if collector is None else collector.records
+
+def _row_count(value):
+    try:
+        return len(value) if hasattr(value, 'shape') else None
+    except TypeError:
+        return None
+
+@contextmanager
+def span(name: str, rows_in: int = None):
+    """
+    Record wall time, CPU time, peak memory delta and row counts of a block.
+
+    Yields a dict (or None when disabled) whose 'rows_out' may be set by
+    the caller. Nested spans each report their own peak.
+    """
+    collector = _collector.get()
+    if not _enabled and collector is None:
+        yield None
+        return
+
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    trace_memory = _trace_memory if collector is None else collector.trace_memory
+    tracing = trace_memory and tracemalloc.is_tracing()
+    if tracing:
+        current, peak = tracemalloc.get_traced_memory()
+        # Fold the peak so far into the parent before resetting it for this span
+        if stack:
+            stack[-1]['_peak'] = max(stack[-1]['_peak'], peak)
+        tracemalloc.reset_peak()
+    record = {
+        "stage": name,
+        "rows_in": rows_in,
+        "rows_out": None,
+        "_start_mem": current if tracing else 0,
+        "_peak": 0,
+    }
+    stack.append(record)
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    try:
+        yield record
+    finally:
+        record["wall_s"] = time.perf_counter() - wall_start
+        record["cpu_s"] = time.process_time() - cpu_start
+        stack.pop()
+        peak = max(tracemalloc.get_traced_memory()[1], record['_peak']) if tracing else 0
+        if tracing and stack:
+            stack[-1]['_peak'] = max(stack[-1]['_peak'], peak)
+        record["peak_mem_delta_bytes"] = max(peak - record.pop('_start_mem'), 0) if tracing else None
+        record.pop('_peak')
+        record["timestamp"] = time.time()
+        (_records if collector is None else collector.records).append(record)
+
+def instrumented(name: str = None):
+    """
+    Decorator recording a span around every call of the function. Row
+    counts come from the first argument and the return value when they
+    are DataFrames or Series.
+    """
+    def decorator(fn):
+        stage = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled and _collector.get() is None:
+                return fn(*args, **kwargs)
+            with span(stage, rows_in=_row_count(args[0]) if args else None) as record:
+                result = fn(*args, **kwargs)
+                record["rows_out"] = _row_count(result)
+                return result
+        return wrapper
+    return decorator
+
+def records() -> list:
+    """
+    Copies of the recorded spans, oldest first: those of the current
+    context when it collects its own (see collect), the global ones
+    otherwise.
+    """
+    return [dict(record) for record in _buffer()]
+
+def clear() -> None:
+    _buffer().clear()
+
+def to_jsonl(path: str = None) -> str:
+    """
+    Recorded spans as JSON lines; also appended to path when given.
+    """
+    text = "".join(json.dumps(record) + "\n" for record in records())
+    if path is not None:
+        with open(path, 'a') as fh:
+            fh.write(text)
+    return text
+
+def to_prometheus(prefix: str = "expense_stage") -> str:
+    """
+    Per-stage totals in the Prometheus text exposition format.
+    """
+    totals = {}
+    for record in records():
+        stage = totals.setdefault(record['stage'], {"count": 0, "wall": 0.0, "cpu": 0.0, "mem": 0, "rows": 0})
+        stage["count"] += 1
+        stage["wall"] += record['wall_s']
+        stage["cpu"] += record['cpu_s']
+        stage["mem"] = max(stage["mem"], record['peak_mem_delta_bytes'] or 0)
+        stage["rows"] += record['rows_out'] or 0
+        if record.get('first_value_s') is not None:
+            stage["first_value"] = record['first_value_s']
+
+    metrics = [
+        ("calls_total", "counter", "Number of calls", "count"),
+        ("wall_seconds_total", "counter", "Wall-clock time spent", "wall"),
+        ("cpu_seconds_total", "counter", "CPU time spent", "cpu"),
+        ("peak_memory_delta_bytes", "gauge", "Largest peak memory increase of one call", "mem"),
+        ("rows_out_total", "counter", "Rows returned", "rows"),
+    ]
+    lines = []
+    for metric, kind, help_text, field in metrics:
+        lines.append(f"# HELP {prefix}_{metric} {help_text}")
+        lines.append(f"# TYPE {prefix}_{metric} {kind}")
+        for stage, values in totals.items():
+            lines.append(f'{prefix}_{metric}{{stage="{stage}"}} {values[field]}')
+
+    # Streaming stages also report how long their first parsed value took
+    streamed = {stage: values["first_value"] for stage, values in totals.items() if "first_value" in values}
+    if streamed:
+        lines.append(f"# HELP {prefix}_first_value_seconds Time to the first streamed value of the latest call")
+        lines.append(f"# TYPE {prefix}_first_value_seconds gauge")
+        for stage, seconds in streamed.items():
+            lines.append(f'{prefix}_first_value_seconds{{stage="{stage}"}} {seconds}')
+    return "\n".join(lines) + "\n"
+
+if _enabled:
+    enable(True)
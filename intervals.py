@@ -0,0 +1,92 @@
+# src/intervals.py
+
+import itertools
+import numpy as np
+
+# Quantiles of interval forecasts and the columns they are reported in
+QUANTILES = (0.1, 0.5, 0.9)
+BAND_COLUMNS = ('p10', 'p50', 'p90')
+# Largest working set of one simulated chunk of series
+MAX_CHUNK_BYTES = 64 * 2**20
+# Bytes held per simulated value: uniform draw, index and path value
+_BYTES_PER_VALUE = 24
+# Series drawing from one random stream; chunks hold whole blocks, so the
+# draws do not depend on the chunk size
+SEED_BLOCK = 16
+
+def _simulate_chunk(base, resid, counts, factors, n_paths, quantiles, seeds) -> np.ndarray:
+    """Quantiles over n_paths bootstrapped paths for one chunk of whole seed blocks."""
+    n_series, periods = factors.shape
+    uniforms = np.empty((n_series, n_paths * periods))
+    for start, seed in zip(range(0, n_series, SEED_BLOCK), seeds):
+        np.random.default_rng(seed).random(out=uniforms[start:start + SEED_BLOCK])
+    # Residual draws per series, restricted to that series' own residuals
+    draws = (uniforms * counts[:, None]).astype(np.int64)
+    sampled = np.take_along_axis(resid, draws, axis=1).reshape(n_series, n_paths, periods)
+    paths = (base[:, None, :] + sampled) * factors[:, None, :]
+    return np.quantile(paths, quantiles, axis=1)
+
+def simulate_quantiles(
+    base: np.ndarray,
+    resid: np.ndarray,
+    factors: np.ndarray = None,
+    n_paths: int = 1000,
+    quantiles: tuple = QUANTILES,
+    seed=0,
+    max_bytes: int = MAX_CHUNK_BYTES,
+    pool=None
+) -> np.ndarray:
+    """
+    Monte Carlo forecast quantiles by residual bootstrap.
+
+    Every path adds residuals drawn with replacement from a series' own
+    history to its base forecast, then applies the forecast's seasonal and
+    trend multipliers, so path h is (base_h + e*) * factors_h. Paths,
+    horizons and series are simulated as one array per chunk. Every block
+    of SEED_BLOCK series draws from its own child of seed, so the bands
+    depend on neither max_bytes nor pool.
+
+    Args:
+        base: Base forecasts, shape (n_series, periods).
+        resid: Historical residuals, shape (n_series, n_history); NaNs
+            are ignored and a series without residuals gets no spread.
+        factors: Multipliers applied to every path, shape like base
+            (defaults to ones).
+        n_paths: Simulated paths per series.
+        quantiles: Quantiles to report.
+        seed: Seed (or seed sequence entropy) for reproducible draws.
+        max_bytes: Memory budget per chunk of series, rounded down to
+            whole blocks of SEED_BLOCK series (at least one); None
+            simulates all series at once.
+        pool: Optional concurrent.futures executor (e.g. a process pool)
+            the chunks are spread over.
+
+    Returns:
+        Array of shape (len(quantiles), n_series, periods).
+    """
+    base = np.asarray(base, dtype=float)
+    factors = np.ones_like(base) if factors is None else np.asarray(factors, dtype=float)
+    n_series, periods = base.shape
+    if n_series == 0:
+        return np.empty((len(quantiles), 0, periods))
+    resid = np.asarray(resid, dtype=float).reshape(len(base), -1)
+    if resid.shape[1] == 0:
+        resid = np.zeros((len(base), 1))
+    # Bootstrapping ignores order, so NaNs can be sorted to the end of each row
+    resid = np.sort(resid, axis=1)
+    counts = (~np.isnan(resid)).sum(axis=1)
+    resid[counts == 0] = 0.0
+    counts = np.maximum(counts, 1)
+
+    seeds = np.random.SeedSequence(seed).spawn(-(-n_series // SEED_BLOCK))
+    chunk = n_series
+    if max_bytes:
+        chunk = max_bytes // (n_paths * periods * _BYTES_PER_VALUE)
+        chunk = max(chunk - chunk % SEED_BLOCK, SEED_BLOCK)
+    args = [
+        (base[s:s + chunk], resid[s:s + chunk], counts[s:s + chunk], factors[s:s + chunk], n_paths, quantiles,
+         seeds[s // SEED_BLOCK:-(-(s + chunk) // SEED_BLOCK)])
+        for s in range(0, n_series, chunk)
+    ]
+    results = pool.map(_simulate_chunk, *zip(*args)) if pool is not None else itertools.starmap(_simulate_chunk, args)
+    return np.concatenate(list(results), axis=1)
@@ -0,0 +1,138 @@
+# src/llm_cache.py
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", ".llm_cache.sqlite3")
+DEFAULT_TTL_SECONDS = 24 * 3600
+DEFAULT_MAX_ENTRIES = 10_000
+
+class ResponseCache:
+    """
+    Persistent SQLite cache of parsed LLM responses.
+
+    Entries are keyed by model name, prompt hash and generation parameters,
+    expire after ttl seconds (None keeps them forever) and the least
+    recently used entries are evicted beyond max_entries. Values must be
+    JSON-serializable, so callers store the parsed result, not raw text.
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_LLM_CACHE_PATH,
+        ttl: float = DEFAULT_TTL_SECONDS,
+        max_entries: int = DEFAULT_MAX_ENTRIES
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+
+    @contextmanager
+    def _connect(self):
+        # A short-lived connection per call keeps the cache usable from any thread
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def make_key(model: str, prompt: str, params: dict = None) -> str:
+        """Cache key for a model, prompt and generation parameters."""
+        prompt_hash = hashlib.sha256(prompt.encode()).hexdigest()
+        material = json.dumps({"model": model, "prompt": prompt_hash, "params": params or {}}, sort_keys=True, default=str)
+        return hashlib.sha256(material.encode()).hexdigest()
+
+    def get(self, key: str):
+        """Return the cached value for key, or None on a miss or expired entry."""
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.ttl is not None and now - row[1] > self.ttl:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, value) -> None:
+        """Store a value, evicting the least recently used entries past max_entries."""
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created, last_used) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now),
+            )
+            conn.execute(
+                "DELETE FROM responses WHERE key IN ("
+                "SELECT key FROM responses ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def clear(self) -> None:
+        """Delete every cached response and reset the counters."""
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM responses")
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict:
+        """Hit/miss counters for this process plus the number of stored entries."""
+        with self._connect() as conn:
+            entries = conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+        }
+
+_default_cache = None
+
+def get_response_cache() -> ResponseCache:
+    """
+    Shared ResponseCache at DEFAULT_LLM_CACHE_PATH, created on first use.
+    """
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ResponseCache()
+    return _default_cache
+
+_replay_only = False
+
+def use_replay_store(path: str, record: bool = False) -> ResponseCache:
+    """
+    Point the shared cache at a record/replay store that never expires.
+
+    In replay mode (record=False) callers must answer LLM requests from the
+    store only and never reach the network; in record mode misses go to the
+    network as usual and their parsed results are stored for later replays.
+    """
+    global _default_cache, _replay_only
+    _default_cache = ResponseCache(path, ttl=None, max_entries=2 ** 62)
+    _replay_only = not record
+    return _default_cache
+
+def replay_only() -> bool:
+    """
+    True when LLM responses must come from the replay store alone.
+    """
+    return _replay_only
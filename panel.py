@@ -0,0 +1,147 @@
+# src/panel.py
+
+import pandas as pd
+import numpy as np
+from src.seasonality import seasonal_profile, apply_seasonal_profile
+
+def iter_panel_blocks(agg_df: pd.DataFrame, series_col: str = 'series'):
+    """
+    Split a long-format aggregate into aligned blocks of series.
+
+    Series sharing the same first period and length share one date index,
+    so every block can be decomposed and adjusted as a single 2-D array.
+
+    Args:
+        agg_df: DataFrame with series_col, 'date' and 'expense' columns,
+            as returned by aggregate_expenses_by_series.
+        series_col: Name of the series id column.
+
+    Yields:
+        Tuples of (series ids, DatetimeIndex, values array of shape
+        (n_series, n_periods)).
+    """
+    agg_df = agg_df.sort_values([series_col, 'date'], kind='stable')
+    spans = agg_df.groupby(series_col, sort=False, observed=True)['date'].agg(['first', 'size'])
+    block_of = spans.groupby(['first', 'size'], sort=False).ngroup()
+    # One grouping pass over the rows; each series' rows stay in date order
+    row_blocks = block_of.reindex(agg_df[series_col].to_numpy()).to_numpy()
+    for _, rows in agg_df.groupby(row_blocks, sort=True):
+        size = int(spans.loc[rows[series_col].iloc[0], 'size'])
+        values = rows['expense'].to_numpy(dtype=float).reshape(-1, size)
+        yield rows[series_col].to_numpy()[::size], pd.DatetimeIndex(rows['date'].iloc[:size]), values
+
+def panel_seasonality(values: np.ndarray) -> np.ndarray:
+    """
+    Detect the seasonal component of many aligned series at once.
+
+    Mirrors detect_seasonality: a multiplicative decomposition with a
+    12-period cycle, normalized to be around 1, or all ones when the
+    history is shorter than two cycles or has non-positive periods.
+
+    Args:
+        values: Array of shape (n_series, n_periods).
+
+    Returns:
+        Array of seasonal multipliers with the same shape as values.
+    """
+    seasonal = np.ones_like(values)
+    if values.shape[1] < 2 * 12:
+        return seasonal
+    # A multiplicative model is undefined for zero or negative periods;
+    # those series keep neutral factors instead of failing the whole block
+    positive = (values > 0).all(axis=1)
+    if positive.any():
+        from statsmodels.tsa.seasonal import seasonal_decompose
+        decomposition = seasonal_decompose(values[positive].T, model='multiplicative', period=12, extrapolate_trend='freq')
+        fitted = np.asarray(decomposition.seasonal).reshape(values.shape[1], -1).T
+        seasonal[positive] = fitted / fitted.mean(axis=1, keepdims=True)
+    return seasonal
+
+def panel_trend(values: np.ndarray) -> np.ndarray:
+    """
+    Detect the trend component of many aligned series at once.
+
+    STL only fits one series at a time, so the batched path uses a
+    centered rolling mean over up to one year of periods instead.
+    Like detect_trend, the trend is normalized relative to its last value;
+    series whose trend ends at zero (e.g. all-zero categories) stay at 1.
+
+    Args:
+        values: Array of shape (n_series, n_periods).
+
+    Returns:
+        Array of normalized trend values with the same shape as values.
+    """
+    if values.shape[1] < 3:
+        return np.ones_like(values)
+    trend = _rolling_mean(values)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(trend[:, -1:] != 0, trend / trend[:, -1:], 1.0)
+
+def _rolling_mean(values: np.ndarray) -> np.ndarray:
+    """Centered rolling mean over up to 12 periods, in the units of values."""
+    n_periods = values.shape[1]
+    window = min(12, n_periods)
+    positions = np.arange(n_periods)
+    lo = np.clip(positions - window // 2, 0, n_periods)
+    hi = np.clip(positions - window // 2 + window, 0, n_periods)
+    cumulative = np.concatenate([np.zeros((values.shape[0], 1)), np.cumsum(values, axis=1)], axis=1)
+    return (cumulative[:, hi] - cumulative[:, lo]) / (hi - lo)
+
+def panel_holdout_errors(values: np.ndarray, seasonal: np.ndarray, period: int = 12) -> np.ndarray:
+    """
+    Out-of-sample errors of the seasonally adjusted historical-mean
+    forecast for many aligned series, for bootstrapping forecast bands.
+
+    Every period in the second half of the history is predicted by the
+    mean of the deseasonalized periods before it, so the errors include
+    the uncertainty of the level as well as the noise, unlike in-sample
+    residuals. They are centered and in deseasonalized units; the other
+    periods are NaN. Seasonal factors fitted on the same k cycles absorb
+    part of the noise and carry their own error into the forecast, so
+    series with seasonality get their errors scaled by sqrt((k+1)/(k-1)).
+
+    Args:
+        values: Array of shape (n_series, n_periods).
+        seasonal: Multipliers of the forecast's decomposition, shaped like
+            values (ones when it has no seasonality).
+        period: Seasonal period the multipliers were fitted with.
+
+    Returns:
+        Array of errors with the same shape as values.
+    """
+    errors = np.full(values.shape, np.nan)
+    n_periods = values.shape[1]
+    if n_periods < 3:
+        return errors
+    with np.errstate(divide='ignore', invalid='ignore'):
+        adjusted = np.where(seasonal != 0, values / seasonal, np.nan)
+        seen = np.cumsum(~np.isnan(adjusted), axis=1)
+        prior_mean = np.nancumsum(adjusted, axis=1) / seen
+        start = n_periods // 2
+        errors[:, start:] = adjusted[:, start:] - prior_mean[:, start - 1:-1]
+        valid = ~np.isnan(errors)
+        center = np.where(valid, errors, 0.0).sum(axis=1, keepdims=True) / valid.sum(axis=1, keepdims=True)
+    cycles = n_periods / period
+    seasonal_rows = (seasonal != 1).any(axis=1, keepdims=True)
+    scale = np.where(seasonal_rows & (cycles > 1), np.sqrt((cycles + 1) / max(cycles - 1, 1e-9)), 1.0)
+    return (errors - center) * scale
+
+def seasonal_factors(seasonal: np.ndarray, dates: pd.DatetimeIndex, forecast_dates: pd.DatetimeIndex) -> np.ndarray:
+    """
+    Look up the seasonal multiplier of every forecast date for a block.
+
+    Uses the same rule as adjust_for_seasonality: exact date, then first
+    period in the same month, then first period in the same quarter,
+    otherwise 1.
+
+    Args:
+        seasonal: Array of shape (n_series, n_periods) of multipliers.
+        dates: Period dates shared by the block.
+        forecast_dates: Dates to look up.
+
+    Returns:
+        Array of shape (n_series, len(forecast_dates)).
+    """
+    profile = seasonal_profile(pd.DataFrame(seasonal.T, index=dates))
+    return apply_seasonal_profile(pd.DatetimeIndex(forecast_dates), profile).T
@@ -0,0 +1,59 @@
+# src/prompt_budget.py
+
+import math
+import numpy as np
+import pandas as pd
+
+# Rough size of one LLM token in characters of plain English / numbers
+CHARS_PER_TOKEN = 4
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the number of LLM tokens in a piece of text.
+    """
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+def format_history_lines(df: pd.DataFrame, value_col: str = 'expense') -> pd.Series:
+    """
+    Format every row as 'YYYY-MM-DD: value' with vectorized string ops.
+    """
+    return df['date'].dt.strftime('%Y-%m-%d') + ": " + df[value_col].astype(str)
+
+def fit_recent_lines(lines: pd.Series, token_budget: int) -> int:
+    """
+    Number of most recent lines whose joined text fits in token_budget.
+    """
+    if token_budget <= 0 or lines.empty:
+        return 0
+    # Each line costs its length plus the joining newline, counted from the end
+    costs = (lines.str.len().to_numpy()[::-1] + 1).cumsum()
+    return int(np.searchsorted(costs, token_budget * CHARS_PER_TOKEN, side='right'))
+
+def summarize_history(older: pd.DataFrame, full: pd.DataFrame, freq: str = 'M') -> str:
+    """
+    Compact summary of older periods: yearly aggregates, plus the seasonal
+    profile and trend slope of the full history.
+
+    Args:
+        older: Periods being summarized ('date' and 'expense').
+        full: Whole history, used for the seasonal profile and trend.
+        freq: Frequency of the history.
+    """
+    from src.decomposition import decompose
+    from src.seasonality import seasonal_profile
+
+    lines = []
+    yearly = older.groupby(older['date'].dt.year)['expense'].agg(['sum', 'mean', 'count'])
+    for year, row in yearly.iterrows():
+        lines.append(f"{year}: total {row['sum']:.2f}, mean {row['mean']:.2f} over {int(row['count'])} periods")
+
+    seasonal = decompose(full, freq=freq).seasonal
+    if len(seasonal) and not np.allclose(seasonal.to_numpy(dtype=float), 1.0):
+        months = seasonal_profile(seasonal)['month']
+        factors = ", ".join(f"{pd.Timestamp(2000, month, 1):%b} {factor:.3f}" for month, factor in months.items())
+        lines.append(f"Seasonal factors by month: {factors}")
+
+    if len(full) >= 2:
+        slope = np.polyfit(np.arange(len(full)), full['expense'].to_numpy(dtype=float), 1)[0]
+        lines.append(f"Trend slope: {slope:+.2f} per period")
+    return "\n".join(lines)
@@ -2,73 +2,86 @@
 
 import pandas as pd
 import numpy as np
-from statsmodels.tsa.seasonal import seasonal_decompose
+from src.decomposition import Decomposition, decompose
+from src.instrument import instrumented
 
+@instrumented()
 def detect_seasonality(df: pd.DataFrame, freq: str = 'M') -> pd.Series:
     """
     Detect seasonality component in the historical expense data.
     
     Args:
-        df: DataFrame with 'date' and 'expense' columns.
+        df: DataFrame with 'date' and 'expense' columns, or a Rollup.
         freq: Frequency for resampling/aggregation ('M' for monthly, 'Q' for quarterly).
         
     Returns:
         pandas Series representing the seasonal component indexed by period.
     """
-    # Resample if needed
-    df = df.set_index('date')
-    ts = df['expense'].resample(freq).sum()
-
-    # Handle if length too short for decomposition
-    if len(ts) < 2 * 12:  # less than 2 years of monthly data approx
-        # Seasonality detection unreliable
-        return pd.Series([1] * len(ts), index=ts.index)
-    
-    decomposition = seasonal_decompose(ts, model='multiplicative', period=12, extrapolate_trend='freq')
-    seasonal = decomposition.seasonal
-    
-    # Normalize seasonal component to be around 1 (multiplicative)
-    normalized_seasonal = seasonal / seasonal.mean()
-    
-    return normalized_seasonal
+    return decompose(df, freq=freq).seasonal
 
+@instrumented()
 def adjust_for_seasonality(forecast_df: pd.DataFrame, seasonal_pattern: pd.Series) -> pd.DataFrame:
     """
     Adjust forecasted expenses using the detected seasonal pattern.
     
     Args:
         forecast_df: DataFrame with 'date' and 'predicted_expense'.
-        seasonal_pattern: Series with seasonal multipliers indexed by date.
+        seasonal_pattern: Series with seasonal multipliers indexed by date,
+            or a Decomposition whose seasonal component is used.
         
     Returns:
         Adjusted forecast DataFrame with same structure.
     """
+    if isinstance(seasonal_pattern, Decomposition):
+        seasonal_pattern = seasonal_pattern.seasonal
     adjusted_forecast = forecast_df.copy()
-    adjusted_expenses = []
-    
-    for forecast_date in adjusted_forecast['date']:
-        # Find the seasonal factor corresponding to the same month/quarter
-        if forecast_date in seasonal_pattern.index:
-            factor = seasonal_pattern.loc[forecast_date]
-        else:
-            # Match by month or quarter if exact date missing
-            factor = _find_seasonal_factor(seasonal_pattern, forecast_date)
-        adjusted_expenses.append(adjusted_forecast.loc[adjusted_forecast['date'] == forecast_date, 'predicted_expense'].values[0] * factor)
-    
-    adjusted_forecast['predicted_expense'] = adjusted_expenses
+    profile = seasonal_profile(seasonal_pattern)
+    factors = apply_seasonal_profile(pd.DatetimeIndex(adjusted_forecast['date']), profile)
+
+    # Rows sharing a date are all scaled from the first row's base value
+    base = adjusted_forecast.groupby('date', sort=False)['predicted_expense'].transform('first')
+    adjusted_forecast['predicted_expense'] = base.to_numpy() * factors
     return adjusted_forecast
 
-def _find_seasonal_factor(seasonal_pattern: pd.Series, date: pd.Timestamp) -> float:
+def seasonal_profile(seasonal_pattern) -> dict:
+    """
+    Precompute seasonal factor lookup tables from a seasonal pattern.
+
+    For each key the table holds the factor of the first period with that
+    key, which is the period a per-date scan would have matched.
+
+    Args:
+        seasonal_pattern: Series of multipliers indexed by date, or a
+            DataFrame indexed by date with one column per series.
+
+    Returns:
+        Dict with 'date', 'month' and 'quarter' lookup tables.
+    """
+    index = pd.DatetimeIndex(seasonal_pattern.index)
+    pattern = seasonal_pattern.astype(float)
+    return {
+        'date': pattern,
+        'month': pattern.groupby(index.month).first(),
+        'quarter': pattern.groupby(index.quarter).first(),
+    }
+
+def apply_seasonal_profile(dates: pd.DatetimeIndex, profile: dict, keys=('month', 'quarter')) -> np.ndarray:
     """
-    Helper to find seasonal factor by matching month or quarter if exact date is missing.
+    Look up seasonal factors for many dates in one vectorized pass.
+
+    An exact date match wins; otherwise the first key in keys that matches
+    is used ('month' or 'quarter'), and 1 when nothing matches.
+
+    Args:
+        dates: Dates to look up.
+        profile: Lookup tables from seasonal_profile.
+        keys: Calendar keys to try, in order, after the exact date.
+
+    Returns:
+        Array of factors, shaped like the pattern with dates as rows.
     """
-    # Try month match
-    for idx in seasonal_pattern.index:
-        if idx.month == date.month:
-            return seasonal_pattern.loc[idx]
-    # If quarterly, match quarter
-    for idx in seasonal_pattern.index:
-        if hasattr(idx, 'quarter') and idx.quarter == date.quarter:
-            return seasonal_pattern.loc[idx]
-    # Fallback
-    return 1.0
+    factors = profile['date'].reindex(dates).to_numpy()
+    for key in keys:
+        lookup = profile[key].reindex(getattr(dates, key)).to_numpy()
+        factors = np.where(np.isnan(factors), lookup, factors)
+    return np.where(np.isnan(factors), 1.0, factors)
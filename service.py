@@ -0,0 +1,232 @@
+# src/service.py
+
+import argparse
+import asyncio
+import io
+import json
+from collections import OrderedDict
+import pandas as pd
+from src.cache import content_hash
+from src.clean_data import load_data, clean_data, aggregate_expenses
+from src.forecast import forecast_aggregated_batch, adjust_base_forecast
+from src.ai_agent import aget_ai_forecast_batch
+
+ENGINES = ('llm', 'mean', 'ets')
+FREQS = ('M', 'Q')
+MAX_PERIODS = 24
+
+class MicroBatcher:
+    """
+    Collects requests that share a key for a short window and hands them to
+    run_batch(key, items) as one list; each caller gets its own result.
+    A batch is flushed when the window closes or max_batch items queue up.
+    When a batch fails, its items are retried one by one, so only the
+    items that fail on their own get the error.
+    """
+
+    def __init__(self, run_batch, window: float = 0.01, max_batch: int = 64):
+        self.run_batch = run_batch
+        self.window = window
+        self.max_batch = max_batch
+        self._pending = {}
+        self._timers = {}
+        self._tasks = set()
+
+    async def submit(self, key, item):
+        future = asyncio.get_running_loop().create_future()
+        items = self._pending.setdefault(key, [])
+        items.append((item, future))
+        if len(items) >= self.max_batch:
+            self._flush(key)
+        elif len(items) == 1:
+            self._timers[key] = asyncio.get_running_loop().call_later(self.window, self._flush, key)
+        return await future
+
+    def _flush(self, key) -> None:
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        items = self._pending.pop(key, None)
+        if items:
+            task = asyncio.ensure_future(self._run(key, items))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, key, items: list) -> None:
+        try:
+            results = await self.run_batch(key, [item for item, _ in items])
+        except Exception as e:
+            if len(items) > 1:
+                await asyncio.gather(*(self._run(key, [entry]) for entry in items))
+                return
+            _, future = items[0]
+            if not future.done():
+                future.set_exception(e)
+            return
+        for (_, future), result in zip(items, results):
+            if not future.done():
+                future.set_result(result)
+
+class ForecastService:
+    """
+    Async forecasting front end shared by every HTTP request.
+
+    - Aggregated inputs are cached by content hash and frequency.
+    - Identical in-flight requests are coalesced onto one computation.
+    - Requests arriving within `window` seconds with the same horizon,
+      frequency and engine are micro-batched: 'mean' and 'ets' run one
+      vectorized forecast_aggregated_batch pass, 'llm' one batched Gemini
+      request followed by the usual seasonality and trend adjustments.
+    """
+
+    def __init__(self, window: float = 0.01, max_batch: int = 64, cache_size: int = 256):
+        self.batcher = MicroBatcher(self._run_batch, window=window, max_batch=max_batch)
+        self.cache_size = cache_size
+        self._aggregates = OrderedDict()
+        self._inflight = {}
+        self.stats = {"requests": 0, "coalesced": 0, "batches": 0, "batched_requests": 0, "aggregate_cache_hits": 0}
+
+    async def forecast(self, data: bytes, kind: str, periods: int, freq: str, engine: str) -> tuple:
+        """
+        Forecast a ledger given as CSV bytes (kind='csv') or JSON records of
+        transactions (kind='json').
+
+        Returns:
+            (forecast DataFrame, metadata dict with 'source', 'batch_size'
+            and 'coalesced')
+        """
+        self.stats["requests"] += 1
+        key = (content_hash(data), freq, periods, engine)
+        task = self._inflight.get(key)
+        coalesced = task is not None
+        if coalesced:
+            self.stats["coalesced"] += 1
+        else:
+            task = asyncio.ensure_future(self._forecast(key[0], data, kind, periods, freq, engine))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        forecast_df, meta = await asyncio.shield(task)
+        return forecast_df, dict(meta, coalesced=coalesced)
+
+    async def _forecast(self, digest: str, data: bytes, kind: str, periods: int, freq: str, engine: str) -> tuple:
+        agg_df = await self._aggregate(digest, data, kind, freq)
+        return await self.batcher.submit((periods, freq, engine), agg_df)
+
+    async def _aggregate(self, digest: str, data: bytes, kind: str, freq: str) -> pd.DataFrame:
+        cache_key = (digest, freq)
+        if cache_key in self._aggregates:
+            self._aggregates.move_to_end(cache_key)
+            self.stats["aggregate_cache_hits"] += 1
+            return self._aggregates[cache_key]
+
+        agg_df = await asyncio.to_thread(parse_and_aggregate, data, kind, freq)
+        self._aggregates[cache_key] = agg_df
+        if len(self._aggregates) > self.cache_size:
+            self._aggregates.popitem(last=False)
+        return agg_df
+
+    async def _run_batch(self, key: tuple, frames: list) -> list:
+        periods, freq, engine = key
+        self.stats["batches"] += 1
+        self.stats["batched_requests"] += len(frames)
+        if engine == 'llm':
+            bases = await aget_ai_forecast_batch(frames, periods, freq)
+            forecasts = await asyncio.to_thread(
+                lambda: [adjust_base_forecast(df, base, freq) for df, (base, _) in zip(frames, bases)]
+            )
+            sources = [source for _, source in bases]
+        else:
+            forecasts = await asyncio.to_thread(forecast_frames, frames, periods, freq, engine)
+            sources = [engine] * len(frames)
+        return [(forecast_df, {"source": source, "batch_size": len(frames)}) for forecast_df, source in zip(forecasts, sources)]
+
+def parse_and_aggregate(data: bytes, kind: str, freq: str) -> pd.DataFrame:
+    """
+    Clean and aggregate a request payload with the usual pipeline.
+    Raises ValueError when no valid transactions remain.
+    """
+    df = load_data(io.BytesIO(data)) if kind == 'csv' else pd.DataFrame(json.loads(data))
+    df = clean_data(df)
+    if df.empty:
+        raise ValueError("No valid transactions in the request")
+    return aggregate_expenses(df, freq=freq)
+
+def forecast_frames(frames: list, periods: int, freq: str, engine: str) -> list:
+    """
+    Forecast several aggregated histories in one vectorized pass.
+    Returns one 'date'/'predicted_expense' frame per history, in order.
+    """
+    stacked = pd.concat([agg_df.assign(request=i) for i, agg_df in enumerate(frames)], ignore_index=True)
+    forecast_df = forecast_aggregated_batch(stacked, periods=periods, freq=freq, series_col='request', engine=engine)
+    by_request = dict(tuple(forecast_df.groupby('request')))
+    return [by_request[i][['date', 'predicted_expense']].reset_index(drop=True) for i in range(len(frames))]
+
+def create_app(service: ForecastService = None):
+    """
+    Starlette app exposing POST /forecast, GET /stats and GET /health.
+
+    POST /forecast takes either a CSV body (text/csv) with periods, freq
+    and engine as query parameters, or JSON with 'transactions' (records
+    with 'date' and 'expense') or 'csv' (text), plus optional 'periods',
+    'freq' and 'engine'.
+    """
+    from starlette.applications import Starlette
+    from starlette.responses import JSONResponse
+    from starlette.routing import Route
+
+    service = service or ForecastService()
+
+    async def forecast_endpoint(request):
+        body = await request.body()
+        params = dict(request.query_params)
+        try:
+            if 'json' in request.headers.get('content-type', ''):
+                payload = json.loads(body)
+                params.update({k: payload[k] for k in ('periods', 'freq', 'engine') if k in payload})
+                if 'csv' in payload:
+                    data, kind = payload['csv'].encode(), 'csv'
+                else:
+                    data, kind = json.dumps(payload.get('transactions', []), sort_keys=True).encode(), 'json'
+            else:
+                data, kind = body, 'csv'
+            periods = int(params.get('periods', 3))
+            freq = params.get('freq', 'M')
+            engine = params.get('engine', 'llm')
+            if not 1 <= periods <= MAX_PERIODS or freq not in FREQS or engine not in ENGINES:
+                raise ValueError(f"periods must be 1-{MAX_PERIODS}, freq one of {FREQS}, engine one of {ENGINES}")
+            forecast_df, meta = await service.forecast(data, kind, periods, freq, engine)
+        except (ValueError, KeyError, TypeError) as e:
+            return JSONResponse({"error": str(e)}, status_code=400)
+
+        records = [
+            {"date": date.strftime('%Y-%m-%d'), "predicted_expense": float(expense)}
+            for date, expense in zip(forecast_df['date'], forecast_df['predicted_expense'])
+        ]
+        return JSONResponse({"forecast": records, **meta})
+
+    async def stats_endpoint(request):
+        return JSONResponse(service.stats)
+
+    async def health_endpoint(request):
+        return JSONResponse({"status": "ok"})
+
+    return Starlette(routes=[
+        Route("/forecast", forecast_endpoint, methods=["POST"]),
+        Route("/stats", stats_endpoint),
+        Route("/health", health_endpoint),
+    ])
+
+def main(argv: list = None) -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Local expense forecasting HTTP service.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--window", type=float, default=0.01, help="Micro-batching window in seconds")
+    parser.add_argument("--max-batch", type=int, default=64, help="Largest micro-batch")
+    args = parser.parse_args(argv)
+    app = create_app(ForecastService(window=args.window, max_batch=args.max_batch))
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+# src/streaming.py
+
+import json
+import re
+import pandas as pd
+
+_decoder = json.JSONDecoder()
+_SEPARATORS = re.compile(r'[\s,]*')
+
+def parse_forecast_line(line: str):
+    """
+    One 'YYYY-MM-DD: amount' line as a forecast row dict, or None when the
+    line is not a forecast.
+    """
+    if ':' not in line:
+        return None
+    date_str, value_str = line.split(":", 1)
+    try:
+        return {"date": pd.to_datetime(date_str.strip()), "predicted_expense": float(value_str.strip())}
+    except Exception:
+        return None
+
+class ForecastLineParser:
+    """
+    Incremental version of ai_agent.parse_response: feed() text chunks as
+    they arrive and get back the rows of every forecast line they complete.
+    """
+
+    def __init__(self):
+        self.rows = []
+        self._partial = ""
+
+    def feed(self, text: str) -> list:
+        """Parse the lines completed by text; returns their new rows."""
+        lines = (self._partial + text).split("\n")
+        self._partial = lines.pop()
+        return self._parse(lines)
+
+    def close(self) -> list:
+        """Parse the last, unterminated line once the stream has ended."""
+        line, self._partial = self._partial, ""
+        return self._parse([line])
+
+    def _parse(self, lines: list) -> list:
+        rows = [row for row in map(parse_forecast_line, lines) if row is not None]
+        self.rows.extend(rows)
+        return rows
+
+    def frame(self) -> pd.DataFrame:
+        """Every row parsed so far, shaped like parse_response's result."""
+        return pd.DataFrame(self.rows)
+
+class JSONFieldParser:
+    """
+    Incremental reader of a JSON object that arrives in chunks.
+
+    feed() returns (field, value) events as soon as values are complete:
+    one per item of each of array_fields, and one per field of fields once
+    its whole value has arrived. Fields are found by their quoted key, so
+    leading text such as a ```json fence is skipped.
+    """
+
+    def __init__(self, array_fields: tuple = (), fields: tuple = ()):
+        self.text = ""
+        # Array field -> position after its last parsed item (None until found)
+        self._arrays = dict.fromkeys(array_fields)
+        self._fields = list(fields)
+
+    def feed(self, text: str) -> list:
+        self.text += text
+        events = []
+        for name in list(self._arrays):
+            events.extend(self._array_items(name))
+        for name in list(self._fields):
+            match = re.search(rf'"{re.escape(name)}"\s*:\s*', self.text)
+            value = self._decode(match.end()) if match else None
+            if value is not None:
+                self._fields.remove(name)
+                events.append((name, value[0]))
+        return events
+
+    def _array_items(self, name: str) -> list:
+        cursor = self._arrays[name]
+        if cursor is None:
+            match = re.search(rf'"{re.escape(name)}"\s*:\s*\[', self.text)
+            if not match:
+                return []
+            cursor = match.end()
+        items = []
+        while True:
+            cursor = _SEPARATORS.match(self.text, cursor).end()
+            if self.text.startswith("]", cursor):
+                del self._arrays[name]
+                return items
+            value = self._decode(cursor)
+            if value is None:
+                break
+            items.append((name, value[0]))
+            cursor = value[1]
+        self._arrays[name] = cursor
+        return items
+
+    def _decode(self, position: int):
+        """(value, end) of the JSON value at position, or None if it is incomplete."""
+        try:
+            value, end = _decoder.raw_decode(self.text, position)
+        except json.JSONDecodeError:
+            return None
+        # A number at the very end of the text may still be growing
+        if end >= len(self.text) and isinstance(value, (int, float)):
+            return None
+        return value, end
+
+    def result(self):
+        """The whole document, parsed once the stream has ended."""
+        text = self.text.strip()
+        if text.startswith("```json"):
+            text = text.replace("```json", "").replace("```", "").strip()
+        return json.loads(text)
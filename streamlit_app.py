@@ -3,23 +3,115 @@
 
 from dotenv import load_dotenv
 import os
+import time
 
 # Load .env variables
 load_dotenv()
 
+import streamlit as st
+import pandas as pd
+from src.clean_data import aggregate_expenses
+from src.cache import DataCache
+from src.decomposition import decompose
+from src.anomalies import screen_anomalies
+from src.rollup import Rollup
+from src import instrument
+from src.forecast import forecast_expenses, adjust_base_forecast, add_intervals
+from src.ai_agent import stream_ai_forecast
+from src.utils import plot_expenses, merge_historical_and_forecast, convert_freq_to_string
+
+st.set_page_config(page_title="Expense Forecaster", layout="wide")
+
 # Optional: check if API key is loaded
 if os.getenv("GEMINI_API_KEY") is None:
     st.warning("GEMINI_API_KEY not found in environment variables!")
 
+# --- Cached pipeline stages ---
+# Streamlit reruns this script on every widget change. Each stage is cached
+# on the uploaded bytes plus only the parameters it depends on, so changing
+# the horizon reuses the cleaned data, aggregate and decomposition. Cleaned
+# data also persists in the on-disk DataCache, so an upload seen before
+# (after a restart or in another session) is not parsed again. The rollup
+# is built once per upload, so switching frequency only queries it.
+# Anomalies are screened on the aggregate; capping them changes what the
+# decomposition and forecast see, so both are then built from the capped series.
 
+_stage_misses = set()
+_stage_stats = []
 
-import streamlit as st
-import pandas as pd
-from src.clean_data import load_data, clean_data, aggregate_expenses
-from src.forecast import forecast_expenses
-from src.utils import plot_expenses, merge_historical_and_forecast, convert_freq_to_string
+@st.cache_data(show_spinner=False)
+def clean_stage(data: bytes) -> pd.DataFrame:
+    _stage_misses.add('clean')
+    return DataCache().clean(data)
 
-st.set_page_config(page_title="Expense Forecaster", layout="wide")
+@st.cache_resource(show_spinner=False)
+def rollup_stage(data: bytes) -> Rollup:
+    _stage_misses.add('rollup')
+    return Rollup.from_transactions(clean_stage(data))
+
+@st.cache_data(show_spinner=False)
+def aggregate_stage(data: bytes, freq: str) -> pd.DataFrame:
+    _stage_misses.add('aggregate')
+    return aggregate_expenses(rollup_stage(data), freq=freq)
+
+@st.cache_data(show_spinner=False)
+def anomaly_stage(data: bytes, freq: str, cap: bool) -> tuple:
+    _stage_misses.add('anomalies')
+    return screen_anomalies(aggregate_stage(data, freq), cap=cap, freq=freq)
+
+@st.cache_resource(show_spinner=False)
+def decompose_stage(data: bytes, freq: str, cap: bool = False, auto: bool = False):
+    _stage_misses.add('decompose')
+    if cap:
+        return decompose(anomaly_stage(data, freq, cap)[0], freq=freq, auto=auto)
+    return decompose(rollup_stage(data), freq=freq, auto=auto)
+
+@st.cache_data(show_spinner=False)
+def forecast_stage(
+    data: bytes,
+    freq: str,
+    periods: int,
+    intervals: bool = False,
+    cap: bool = False,
+    auto: bool = False,
+    deadline: float = None
+) -> pd.DataFrame:
+    _stage_misses.add('forecast')
+    df_agg, _ = anomaly_stage(data, freq, cap)
+    return forecast_expenses(df_agg, periods=periods, freq=freq, deadline=deadline, intervals=intervals, auto_decompose=auto)
+
+def stream_forecast(df_agg: pd.DataFrame, decomposition, freq: str, periods: int, intervals: bool = False) -> pd.DataFrame:
+    """
+    Forecast with a streamed LLM response, showing each adjusted row as
+    soon as its line arrives. Not cached: every run makes a fresh request
+    (the response cache still answers repeated prompts).
+    """
+    start = time.perf_counter()
+    placeholder = st.empty()
+
+    def show(base_forecast):
+        placeholder.dataframe(adjust_base_forecast(df_agg, base_forecast, freq, decomposition))
+
+    base_forecast = stream_ai_forecast(df_agg, periods, freq, on_update=show)
+    placeholder.empty()
+    first_value = base_forecast.attrs.get('time_to_first_value')
+    st.metric("Time to first value", f"{first_value:.2f}s" if first_value is not None else "n/a")
+    forecast_df = adjust_base_forecast(df_agg, base_forecast, freq, decomposition)
+    if intervals:
+        forecast_df = add_intervals(forecast_df, base_forecast['predicted_expense'], decomposition)
+    _stage_stats.append({"stage": "forecast", "cache": "stream", "seconds": round(time.perf_counter() - start, 4)})
+    return forecast_df
+
+def run_stage(name: str, stage, *args):
+    """Run a cached stage, recording whether it hit the cache and how long it took."""
+    start = time.perf_counter()
+    result = stage(*args)
+    _stage_stats.append({
+        "stage": name,
+        "cache": "miss" if name in _stage_misses else "hit",
+        "seconds": round(time.perf_counter() - start, 4),
+    })
+    return result
 
 st.title("💰 Expense Forecaster AI")
 st.markdown(
@@ -34,30 +126,76 @@ st.sidebar.header("Forecast Settings")
 
 freq_option = st.sidebar.selectbox("Select Forecast Frequency", options=['M', 'Q'], index=0)
 periods = st.sidebar.number_input("Forecast Periods", min_value=1, max_value=24, value=3, step=1)
+show_debug = st.sidebar.checkbox("Show pipeline debug panel", value=False)
+show_timings = st.sidebar.checkbox("Record stage timings and memory", value=False)
+stream_llm = st.sidebar.checkbox("Stream the LLM forecast", value=False)
+show_intervals = st.sidebar.checkbox("Show P10/P50/P90 forecast bands", value=False)
+cap_anomalies = st.sidebar.checkbox("Cap flagged anomalies before forecasting", value=False)
+auto_decompose = st.sidebar.checkbox("Auto-select decomposition settings", value=False)
+deadline = st.sidebar.number_input(
+    "LLM deadline (seconds, 0 waits for the full timeout)", min_value=0.0, max_value=30.0, value=5.0, step=0.5,
+    help="Past the deadline the offline forecast is shown; streamed forecasts are not bounded.",
+)
+
+# Spans are recorded only while the panel is on, into a buffer of this
+# session's script run, so other sessions' reruns never touch it
+instrument.collect(show_timings)
 
 # --- Data upload ---
 uploaded_file = st.file_uploader("Upload your CSV file", type=["csv"])
 
 if uploaded_file is not None:
-    df_raw = load_data(uploaded_file)
-    df_clean = clean_data(df_raw)
-    df_agg = aggregate_expenses(df_clean, freq=freq_option)
+    data = uploaded_file.getvalue()
+    run_stage('clean', clean_stage, data)
+    run_stage('rollup', rollup_stage, data)
+    df_agg = run_stage('aggregate', aggregate_stage, data, freq_option)
+    df_screened, anomalies = run_stage('anomalies', anomaly_stage, data, freq_option, cap_anomalies)
+    decomposition = run_stage('decompose', decompose_stage, data, freq_option, cap_anomalies, auto_decompose)
 
     st.subheader("Historical Expenses")
     st.dataframe(df_agg)
-    
+
+    st.subheader("Flagged Anomalies")
+    if anomalies.empty:
+        st.caption("No anomalous periods were flagged.")
+    else:
+        st.caption(
+            f"{len(anomalies)} period(s) far from both the running median and their season's usual level were "
+            + ("capped before forecasting (periods of a season not seen before only past twice the usual level)." if cap_anomalies else "flagged and left as recorded.")
+        )
+        st.dataframe(anomalies, hide_index=True)
+
     # --- Forecasting ---
     st.subheader("Forecasted Expenses")
-    forecast_df = forecast_expenses(df_agg, periods=periods, freq=freq_option)
-    
+    config = decomposition.config
+    st.caption(
+        ("Auto-selected" if auto_decompose else "Default") + f" decomposition: {config['method']}"
+        + (f", {config['model']}, period {config['period']}" if config['method'] != 'none' else "")
+        + (f", STL smoother {config['seasonal']}{' (robust)' if config['robust'] else ''}" if config['method'] == 'stl' else "")
+    )
+    if stream_llm:
+        forecast_df = stream_forecast(df_screened, decomposition, freq_option, int(periods), show_intervals)
+    else:
+        forecast_df = run_stage(
+            'forecast', forecast_stage, data, freq_option, int(periods), show_intervals, cap_anomalies, auto_decompose, float(deadline) or None
+        )
+        provenance = forecast_df.attrs.get('provenance')
+        if provenance is not None:
+            st.caption(f"Base forecast: {provenance['source']} after {provenance['elapsed']:.2f}s.")
+            if provenance['source'] == 'offline' and os.getenv("GEMINI_API_KEY"):
+                # A late LLM answer still lands in the response cache; let the next run pick it up
+                forecast_stage.clear()
+
     st.dataframe(forecast_df)
-    
+
     # --- Combine for visualization ---
-    combined_df = merge_historical_and_forecast(df_agg.rename(columns={'expense':'expense'}), forecast_df)
-    
+    combined_df = merge_historical_and_forecast(df_agg, forecast_df)
+
     st.subheader("Historical + Forecast Visualization")
+    start = time.perf_counter()
     plot_expenses(combined_df, title=f"{convert_freq_to_string(freq_option)} Expenses Forecast")
-    
+    _stage_stats.append({"stage": "plot", "cache": "n/a", "seconds": round(time.perf_counter() - start, 4)})
+
     # --- Download option ---
     csv = combined_df.to_csv(index=False)
     st.download_button(
@@ -67,5 +205,19 @@ if uploaded_file is not None:
         mime="text/csv"
     )
 
+    if show_debug:
+        with st.expander("Pipeline debug", expanded=True):
+            st.dataframe(pd.DataFrame(_stage_stats), hide_index=True)
+
+    if show_timings:
+        with st.expander("Stage timings", expanded=True):
+            spans = instrument.records()
+            if spans:
+                st.dataframe(pd.DataFrame(spans).drop(columns=['timestamp']), hide_index=True)
+            else:
+                st.caption("Every stage was served from cache on this run.")
+            st.download_button("Download spans (JSON lines)", instrument.to_jsonl(), file_name="stage_spans.jsonl", mime="application/jsonl")
+            st.download_button("Download metrics (Prometheus)", instrument.to_prometheus(), file_name="stage_metrics.prom", mime="text/plain")
+
 else:
     st.info("Please upload a CSV file to start forecasting. You can use the sample CSV provided.")
@@ -1,27 +1,135 @@
 # src/utils.py
 
+import hashlib
+from collections import OrderedDict
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-import streamlit as st
+from src.instrument import instrumented
 
+# Points drawn per trace; larger series are downsampled first
+MAX_PLOT_POINTS = 2000
+_FIGURE_CACHE_SIZE = 32
+_figure_cache = OrderedDict()
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+
+    Keeps the first and last points and, from each of threshold - 2 equal
+    buckets in between, the point forming the largest triangle with the
+    previously kept point and the mean of the next bucket.
+
+    Returns:
+        Sorted indices of the kept points.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    # Mean of every bucket, plus the last point as the final "next bucket"
+    counts = np.diff(np.append(edges, n))
+    mean_x = np.add.reduceat(x, edges) / counts
+    mean_y = np.add.reduceat(y, edges) / counts
+
+    kept = np.empty(threshold, dtype=int)
+    kept[0], kept[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        area = np.abs(
+            (x[a] - mean_x[i + 1]) * (y[lo:hi] - y[a])
+            - (x[a] - x[lo:hi]) * (mean_y[i + 1] - y[a])
+        )
+        a = lo + int(area.argmax())
+        kept[i + 1] = a
+    return kept
+
+def minmax_downsample(y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Keep the minimum and maximum of threshold // 2 equal buckets, so spikes
+    survive downsampling. Returns sorted indices of the kept points.
+    """
+    n = len(y)
+    if threshold >= n or threshold < 2:
+        return np.arange(n)
+    y = np.asarray(y, dtype=float)
+    edges = np.linspace(0, n, threshold // 2 + 1).astype(int)[:-1]
+    bucket = np.repeat(np.arange(len(edges)), np.diff(np.append(edges, n)))
+    kept = []
+    for extreme in (np.minimum, np.maximum):
+        hits = np.flatnonzero(y == extreme.reduceat(y, edges)[bucket])
+        # First hit per bucket
+        kept.append(hits[np.unique(bucket[hits], return_index=True)[1]])
+    return np.unique(np.concatenate(kept))
+
+def _downsample(dates: pd.Series, values: pd.Series, max_points: int, method: str) -> tuple:
+    if len(values) <= max_points:
+        return dates, values
+    if method == 'minmax':
+        kept = minmax_downsample(values.to_numpy(), max_points)
+    else:
+        kept = lttb(dates.to_numpy().astype('datetime64[ns]').astype(np.int64), values.to_numpy(), max_points)
+    return dates.iloc[kept], values.iloc[kept]
+
+def expense_figure(df: pd.DataFrame, title: str = "Expenses Over Time", max_points: int = MAX_PLOT_POINTS, method: str = 'lttb'):
+    """
+    Plotly figure with history ('expense') and forecast ('predicted_expense')
+    as separate traces, each downsampled to at most max_points. Forecast
+    bands ('p10'/'p90', plus the 'p50' median) are drawn when present.
+
+    Figures are cached per content hash of df and the plot settings, so a
+    rerun with the same data skips downsampling and figure construction.
+    Every call returns its own copy, so callers may change it freely.
+
+    Args:
+        df: DataFrame with 'date' and 'expense' and/or 'predicted_expense',
+            optionally with 'p10', 'p50' and 'p90' bands.
+        title: Plot title.
+        max_points: Largest number of points drawn per trace.
+        method: 'lttb' or 'minmax' bucketing.
+    """
+    import plotly.graph_objects as go
+
+    digest = hashlib.sha1(pd.util.hash_pandas_object(df, index=False).values.tobytes()).hexdigest()
+    key = (digest, tuple(df.columns), title, max_points, method)
+    if key in _figure_cache:
+        _figure_cache.move_to_end(key)
+        return go.Figure(_figure_cache[key])
+
+    fig = go.Figure()
+    if {'p10', 'p90'} <= set(df.columns):
+        band = df[['date', 'p10', 'p90']].dropna()
+        fig.add_trace(go.Scatter(x=band['date'], y=band['p90'], mode='lines', line={"width": 0}, showlegend=False, hoverinfo='skip'))
+        fig.add_trace(go.Scatter(x=band['date'], y=band['p10'], mode='lines', line={"width": 0}, fill='tonexty', fillcolor="rgba(99, 110, 250, 0.2)", name="P10-P90"))
+    traces = (("expense", "History", {}), ("predicted_expense", "Forecast", {"dash": "dash"}), ("p50", "Median (P50)", {"dash": "dot"}))
+    for column, name, line in traces:
+        if column not in df.columns:
+            continue
+        series = df[['date', column]].dropna()
+        dates, values = _downsample(series['date'], series[column], max_points, method)
+        fig.add_trace(go.Scatter(x=dates, y=values, mode='lines+markers' if len(values) <= 100 else 'lines', name=name, line=line))
+    fig.update_layout(title=title, xaxis_title="Date", yaxis_title="Expense", hovermode="x unified")
+
+    _figure_cache[key] = fig
+    if len(_figure_cache) > _FIGURE_CACHE_SIZE:
+        _figure_cache.popitem(last=False)
+    return go.Figure(fig)
+
+@instrumented()
 def plot_expenses(df: pd.DataFrame, title: str = "Expenses Over Time") -> None:
     """
-    Plot historical or forecasted expenses.
+    Plot historical and forecasted expenses as interactive Plotly traces.
     
     Args:
-        df: DataFrame with 'date' and 'expense' or 'predicted_expense'.
+        df: DataFrame with 'date' and 'expense' and/or 'predicted_expense'.
         title: Plot title
     """
-    plt.figure(figsize=(10, 5))
-    sns.lineplot(x='date', y=df.columns[1], data=df, marker='o')
-    plt.title(title)
-    plt.xlabel("Date")
-    plt.ylabel("Expense")
-    plt.xticks(rotation=45)
-    plt.tight_layout()
-    st.pyplot(plt)
-    plt.clf()
+    # The UI stack is imported on use so headless jobs never load it
+    import streamlit as st
+
+    st.plotly_chart(expense_figure(df, title=title), use_container_width=True)
 
 def merge_historical_and_forecast(historical_df: pd.DataFrame, forecast_df: pd.DataFrame) -> pd.DataFrame:
     """
@@ -29,10 +137,12 @@ def merge_historical_and_forecast(historical_df: pd.DataFrame, forecast_df: pd.D
     
     Args:
         historical_df: DataFrame with 'date' and 'expense'
-        forecast_df: DataFrame with 'date' and 'predicted_expense'
+        forecast_df: DataFrame with 'date' and 'predicted_expense', and the
+            'p10', 'p50' and 'p90' bands of an interval forecast
     
     Returns:
         Combined DataFrame with columns: 'date', 'expense', 'predicted_expense'
+        (plus the band columns when the forecast has them)
     """
     combined_df = pd.merge(
         historical_df,